@@ -1,5 +1,8 @@
 from django.contrib import admin
-from .models import DynamicTableDefinition, DynamicTableExport
+from django.db.models import OuterRef, Subquery
+from django.utils.html import format_html, format_html_join
+from .models import DynamicTableChange, DynamicTableDefinition, DynamicTableExport, GenerationJob, GenerationShard
+from .scheduling import queue_wait_by_class
 
 @admin.register(DynamicTableDefinition)
 class DynamicTableDefinitionAdmin(admin.ModelAdmin):
@@ -10,6 +13,95 @@ class DynamicTableDefinitionAdmin(admin.ModelAdmin):
 
 @admin.register(DynamicTableExport)
 class DynamicTableExportAdmin(admin.ModelAdmin):
-    list_display = ['id', 'table_definition', 'num_records', 'status', 'created_at', 'completed_at']
+    list_display = ['id', 'table_definition', 'num_records', 'status', 'priority_class', 'queue_wait',
+                    'generation_seconds', 'ai_seconds', 'export_seconds', 'insert_seconds', 'rows_per_second',
+                    'peak_rss', 'coalesced_requests', 'created_at', 'completed_at']
     list_filter = ['status', 'created_at', 'table_definition']
-    readonly_fields = ['created_at', 'completed_at']
+    readonly_fields = ['created_at', 'completed_at', 'timings', 'stats']
+
+    def get_queryset(self, request):
+        latest_job = GenerationJob.objects.filter(export=OuterRef('pk')).order_by('-created_at')
+        return super().get_queryset(request).annotate(
+            job_priority=Subquery(latest_job.values('priority')[:1]),
+            job_wait=Subquery(latest_job.values('wait_seconds')[:1]),
+        )
+
+    @admin.display(description='Class', ordering='job_priority')
+    def priority_class(self, obj):
+        return dict(GenerationJob.PRIORITY_CHOICES).get(obj.job_priority, '-')
+
+    @admin.display(description='Queue wait (s)', ordering='job_wait')
+    def queue_wait(self, obj):
+        return '-' if obj.job_wait is None else round(obj.job_wait, 1)
+
+    @admin.display(description='Generate (s)')
+    def generation_seconds(self, obj):
+        stages = (obj.stats or {}).get('stages', {})
+        if 'generation' not in stages and 'shards' not in stages:
+            return '-'
+        return round(stages.get('generation', 0) + stages.get('shards', 0), 1)
+
+    @admin.display(description='AI (s)')
+    def ai_seconds(self, obj):
+        return self._stage(obj, 'ai')
+
+    @admin.display(description='Write (s)')
+    def export_seconds(self, obj):
+        return self._stage(obj, 'export')
+
+    @admin.display(description='Insert (s)')
+    def insert_seconds(self, obj):
+        return self._stage(obj, 'insert')
+
+    @admin.display(description='Rows/s')
+    def rows_per_second(self, obj):
+        return '-' if not obj.stats else f"{obj.stats['rows_per_second']:,.0f}"
+
+    @admin.display(description='Peak RSS during export (MiB)')
+    def peak_rss(self, obj):
+        return (obj.stats or {}).get('peak_rss_mib') or '-'
+
+    @admin.display(description='Stage timings')
+    def timings(self, obj):
+        if not obj.stats:
+            return '-'
+        total = obj.stats['total_seconds'] or 1
+        rows = list(obj.stage_timings) + [('other', obj.stats['other_seconds'])]
+        return format_html(
+            '<table><tr><th>Stage</th><th>Seconds</th><th>Share</th></tr>{}</table>'
+            '<p>{} rows in {}s ({} rows/s), {} chunks (mean {}s, max {}s)</p>',
+            format_html_join('', '<tr><td>{}</td><td>{}</td><td>{}%</td></tr>',
+                             ((name, seconds, round(seconds * 100 / total)) for name, seconds in rows)),
+            obj.stats['rows'], obj.stats['total_seconds'], obj.stats['rows_per_second'],
+            obj.stats['chunks']['count'], obj.stats['chunks']['mean_seconds'], obj.stats['chunks']['max_seconds'],
+        )
+
+    def _stage(self, obj, name):
+        seconds = (obj.stats or {}).get('stages', {}).get(name)
+        return '-' if seconds is None else round(seconds, 1)
+
+    def changelist_view(self, request, extra_context=None):
+        extra_context = {**(extra_context or {}), 'queue_wait_by_class': queue_wait_by_class()}
+        return super().changelist_view(request, extra_context)
+
+@admin.register(DynamicTableChange)
+class DynamicTableChangeAdmin(admin.ModelAdmin):
+    list_display = ['id', 'table_definition', 'status', 'summary', 'num_rows', 'rows_backfilled',
+                    'created_at', 'completed_at']
+    list_filter = ['status', 'created_at', 'table_definition']
+    readonly_fields = ['created_at', 'completed_at', 'checkpoint', 'stats']
+
+@admin.register(GenerationJob)
+class GenerationJobAdmin(admin.ModelAdmin):
+    list_display = ['id', 'export', 'table_change', 'status', 'priority', 'requester', 'attempts', 'worker', 'wait_seconds',
+                    'created_at', 'started_at', 'finished_at']
+    list_filter = ['status', 'priority', 'created_at']
+    readonly_fields = ['created_at', 'queued_at', 'started_at', 'finished_at', 'heartbeat_at',
+                       'wait_seconds', 'run_seconds']
+
+@admin.register(GenerationShard)
+class GenerationShardAdmin(admin.ModelAdmin):
+    list_display = ['id', 'job', 'index', 'status', 'start_row', 'num_rows', 'rows_done', 'worker', 'attempts',
+                    'lease_expires_at', 'finished_at']
+    list_filter = ['status', 'worker']
+    readonly_fields = ['started_at', 'finished_at', 'lease_expires_at']
@@ -0,0 +1,163 @@
+"""
+Cost-based admission control for generation requests
+
+Each request's cost is estimated from its schema, size and output format in
+worker-seconds, plus the number of AI values it would ask the LLM for. A
+request is then accepted, queued behind running work, or rejected against
+per-request, per-requester and global budgets (see the GENERATION_* settings).
+"""
+from django.conf import settings
+from django.db.models import Sum
+
+from .dynamic_models import AI_AVAILABLE
+from .models import GenerationJob
+
+# Measured single-core generation cost per value, in microseconds
+FIELD_COST_US = {
+    'string': 120,
+    'text': 80,
+    'number': 2,
+    'decimal': 3,
+    'boolean': 2,
+    'date': 20,
+    'datetime': 20,
+    'email': 210,
+    'url': 290,
+    'choice': 2,
+    'list': 75,
+}
+DEFAULT_FIELD_COST_US = 100
+
+# Cost of writing one cell in each output format, in microseconds
+FORMAT_CELL_COST_US = {
+    'xlsx': 23,
+    'sql': 1,
+    'sqlite': 1,
+    'csv': 1,
+    'jsonl': 2,
+    'parquet': 1,
+    'db': 2,
+}
+# Long text cells cost this many times more to write
+TEXT_HEAVY_TYPES = ('text', 'list')
+TEXT_CELL_MULTIPLIER = 4
+
+# Hard per-format row limits (an Excel sheet holds 1,048,576 rows including the header)
+FORMAT_MAX_ROWS = {
+    'xlsx': 1048575,
+}
+
+ACTIVE_JOB_STATUSES = ('queued',) + GenerationJob.IN_PROGRESS_STATUSES
+
+
+def ai_fields(fields_definition):
+    """Fields whose values are asked of the LLM when an API key is available"""
+    return [
+        field for field in fields_definition
+        if (field.get('options', {}).get('ai_description') or '').strip()
+    ]
+
+
+def estimate_cost(fields_definition, num_records, export_format, save_to_db=False, use_ai=True):
+    """Estimate a request's cost: worker seconds and AI values"""
+    use_ai = use_ai and AI_AVAILABLE
+    llm_fields = {field['name'] for field in ai_fields(fields_definition)} if use_ai else set()
+
+    faker_us = sum(
+        FIELD_COST_US.get(field['type'], DEFAULT_FIELD_COST_US)
+        for field in fields_definition if field['name'] not in llm_fields
+    )
+    cell_us = FORMAT_CELL_COST_US.get(export_format, 1)
+    write_us = sum(
+        cell_us * (TEXT_CELL_MULTIPLIER if field['type'] in TEXT_HEAVY_TYPES else 1)
+        for field in fields_definition
+    )
+    if save_to_db and export_format != 'db':
+        write_us += FORMAT_CELL_COST_US['db'] * len(fields_definition)
+
+    ai_values = len(llm_fields) * num_records
+    ai_seconds = ai_values * getattr(settings, 'GENERATION_AI_VALUE_SECONDS', 1.0)
+    faker_seconds = faker_us * num_records / 1e6
+    write_seconds = write_us * num_records / 1e6
+    return {
+        'seconds': round(faker_seconds + write_seconds + ai_seconds, 1),
+        'faker_seconds': round(faker_seconds, 1),
+        'write_seconds': round(write_seconds, 1),
+        'ai_seconds': round(ai_seconds, 1),
+        'ai_values': ai_values,
+    }
+
+
+def estimate_table_change_cost(fields_definition, added, num_rows, rebuild=False, use_ai=True):
+    """Estimate an edit of a table's fields: the added columns generated for every row
+
+    A table that has to be rebuilt also has every row copied.
+    """
+    estimate = estimate_cost([field for field in fields_definition if field['name'] in added], num_rows, 'db',
+                             use_ai=use_ai)
+    if rebuild:
+        copy_seconds = FORMAT_CELL_COST_US['db'] * len(fields_definition) * num_rows / 1e6
+        estimate['write_seconds'] = round(estimate['write_seconds'] + copy_seconds, 1)
+        estimate['seconds'] = round(estimate['seconds'] + copy_seconds, 1)
+    return estimate
+
+
+def requester_for(request):
+    """Key that per-requester budgets are tracked under"""
+    if getattr(request, 'user', None) is not None and request.user.is_authenticated:
+        return f'user:{request.user.pk}'
+    return f"ip:{request.META.get('REMOTE_ADDR', '')}"
+
+
+def check_admission(estimate, num_records, export_format, requester, split=False):
+    """Decide whether a request is accepted, queued or rejected
+
+    Returns (decision, reason) where decision is 'accept', 'queue' or 'reject'.
+    A budget of 0 disables that check. Split exports keep each part within
+    the format's row limit, so only single files are held to it.
+    """
+    max_rows = FORMAT_MAX_ROWS.get(export_format)
+    if max_rows and num_records > max_rows and not split:
+        return 'reject', f'{export_format} files hold at most {max_rows:,} rows'
+
+    max_seconds = getattr(settings, 'GENERATION_MAX_REQUEST_SECONDS', 3600)
+    if max_seconds and estimate['seconds'] > max_seconds:
+        return 'reject', (f'Estimated at {_duration(estimate["seconds"])} of worker time; '
+                          f'the limit per request is {_duration(max_seconds)}')
+    max_ai_values = getattr(settings, 'GENERATION_MAX_REQUEST_AI_VALUES', 2000)
+    if max_ai_values and estimate['ai_values'] > max_ai_values:
+        return 'reject', (f'Needs {estimate["ai_values"]:,} AI-generated values; '
+                          f'the limit per request is {max_ai_values:,}')
+
+    outstanding = GenerationJob.objects.filter(
+        requester=requester, status__in=ACTIVE_JOB_STATUSES
+    ).aggregate(seconds=Sum('estimated_seconds'), ai_values=Sum('estimated_ai_values'))
+    user_seconds = getattr(settings, 'GENERATION_USER_BUDGET_SECONDS', 7200)
+    if user_seconds and (outstanding['seconds'] or 0) + estimate['seconds'] > user_seconds:
+        return 'reject', (f'You already have {_duration(outstanding["seconds"] or 0)} of work queued or running; '
+                          f'wait for it to finish (budget {_duration(user_seconds)})')
+    user_ai_values = getattr(settings, 'GENERATION_USER_AI_BUDGET', 5000)
+    if user_ai_values and (outstanding['ai_values'] or 0) + estimate['ai_values'] > user_ai_values:
+        return 'reject', (f'You already have {outstanding["ai_values"] or 0:,} AI values queued or running; '
+                          f'wait for them to finish (budget {user_ai_values:,})')
+
+    running = running_cost()
+    global_seconds = getattr(settings, 'GENERATION_GLOBAL_BUDGET_SECONDS', 1800)
+    if global_seconds and running and running + estimate['seconds'] > global_seconds:
+        return 'queue', 'Waits until running jobs free up capacity'
+    return 'accept', 'Runs as soon as a worker is free'
+
+
+def running_cost():
+    """Estimated seconds of all running jobs combined"""
+    return GenerationJob.objects.filter(status__in=GenerationJob.IN_PROGRESS_STATUSES).aggregate(
+        seconds=Sum('estimated_seconds'))['seconds'] or 0
+
+
+def _duration(seconds):
+    seconds = int(round(seconds))
+    if seconds < 60:
+        return f'{seconds}s'
+    if seconds < 3600:
+        return f'{seconds // 60}m {seconds % 60}s'
+    return f'{seconds // 3600}h {seconds % 3600 // 60}m'
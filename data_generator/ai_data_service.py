@@ -57,10 +57,18 @@ class AIDataGenerator:
             raise ValueError("OpenAI API key is required. Set OPENAI_API_KEY in .env file or pass it directly.")
         
         # Initialize LangChain components
+        # A hung request must not hold a job past its deadline
+        try:
+            from django.conf import settings
+            request_timeout = getattr(settings, 'OPENAI_REQUEST_TIMEOUT', 30)
+        except Exception:
+            request_timeout = 30
         self.llm = ChatOpenAI(
             api_key=self.openai_api_key,
             model="gpt-3.5-turbo",
-            temperature=0.7
+            temperature=0.7,
+            timeout=request_timeout,
+            max_retries=1
         )
         
         # Build the LangGraph workflow
@@ -0,0 +1,36 @@
+"""
+OpenAI keys typed into a request, handed to the worker that runs its job
+
+Keys are kept in the settings.GENERATION_KEY_CACHE cache alias, never in
+the database, and expire after GENERATION_API_KEY_TTL_SECONDS even when
+the job is never finished. The cache must be shared by the web and worker
+processes.
+"""
+from django.conf import settings
+from django.core.cache import caches
+
+
+def _cache():
+    return caches[getattr(settings, 'GENERATION_KEY_CACHE', 'default')]
+
+
+def _cache_key(job_id):
+    return f'generation-job-api-key:{job_id}'
+
+
+def store_api_key(job_id, api_key):
+    """Keep a job's key until the job finishes (or the TTL runs out)"""
+    if api_key:
+        _cache().set(_cache_key(job_id), api_key, getattr(settings, 'GENERATION_API_KEY_TTL_SECONDS', 86400))
+
+
+def job_api_key(job_id):
+    """The key given with a job's request ('' if none was given or it expired)"""
+    return _cache().get(_cache_key(job_id)) or ''
+
+
+def forget_api_keys(job_ids):
+    """Drop the keys of jobs that will not run again"""
+    job_ids = list(job_ids)
+    if job_ids:
+        _cache().delete_many([_cache_key(job_id) for job_id in job_ids])
@@ -0,0 +1,190 @@
+"""
+Compression helpers for export artifacts (gzip, and zstd when available)
+"""
+import gzip
+import io
+import os
+import shutil
+import zipfile
+import zlib
+
+try:
+    import zstandard
+    ZSTD_AVAILABLE = True
+except ImportError:
+    ZSTD_AVAILABLE = False
+
+
+COMPRESSION_SUFFIXES = {
+    'gzip': '.gz',
+    'zstd': '.zst',
+}
+
+COMPRESSION_CONTENT_TYPES = {
+    'gzip': 'application/gzip',
+    'zstd': 'application/zstd',
+}
+
+CHUNK_SIZE = 64 * 1024
+
+
+def available_encodings():
+    """Return the encodings this process can read and write, in preference order"""
+    encodings = []
+    if ZSTD_AVAILABLE:
+        encodings.append('zstd')
+    encodings.append('gzip')
+    return encodings
+
+
+def open_compressed(path, encoding, mode='rb', level=None):
+    """Open a compressed file for streaming reads or writes (binary or text mode)"""
+    if encoding == 'gzip':
+        if 't' in mode:
+            return gzip.open(path, mode, compresslevel=level or 6, encoding='utf-8', newline='')
+        return gzip.open(path, mode, compresslevel=level or 6)
+
+    if encoding == 'zstd':
+        if not ZSTD_AVAILABLE:
+            raise ValueError("zstd compression requires the 'zstandard' package")
+        if 'w' in mode or 'a' in mode:
+            raw_mode = 'ab' if 'a' in mode else 'wb'
+            stream = zstandard.ZstdCompressor(level=level or 3).stream_writer(
+                open(path, raw_mode), closefd=True
+            )
+        else:
+            stream = zstandard.ZstdDecompressor().stream_reader(open(path, 'rb'), closefd=True)
+        if 't' in mode:
+            return io.TextIOWrapper(stream, encoding='utf-8', newline='')
+        return stream
+
+    raise ValueError(f"Unsupported compression: {encoding}")
+
+
+def compress_file(path, encoding, level=None, remove_source=True):
+    """Compress an artifact and return the path of the compressed copy"""
+    target = path + COMPRESSION_SUFFIXES[encoding]
+    with open(path, 'rb') as source, open_compressed(target, encoding, 'wb', level) as destination:
+        shutil.copyfileobj(source, destination, CHUNK_SIZE)
+    if remove_source:
+        os.remove(path)
+    return target
+
+
+def split_compression_suffix(path):
+    """Split ``name.xlsx.gz`` into (``name.xlsx``, ``'gzip'``); uncompressed paths get ``''``"""
+    for encoding, suffix in COMPRESSION_SUFFIXES.items():
+        if path.endswith(suffix):
+            return path[:-len(suffix)], encoding
+    return path, ''
+
+
+def iter_decompressed(path, encoding, chunk_size=CHUNK_SIZE):
+    """Yield the decompressed bytes of a stored artifact"""
+    with open_compressed(path, encoding, 'rb') as stream:
+        while True:
+            chunk = stream.read(chunk_size)
+            if not chunk:
+                break
+            yield chunk
+
+
+def iter_compressed(chunks, encoding, level=None):
+    """Compress an iterable of byte chunks on the fly"""
+    if encoding == 'gzip':
+        # wbits=31 produces a gzip container rather than a raw zlib stream
+        compressor = zlib.compressobj(level or 6, zlib.DEFLATED, 31)
+        flush = compressor.flush
+    elif encoding == 'zstd':
+        if not ZSTD_AVAILABLE:
+            raise ValueError("zstd compression requires the 'zstandard' package")
+        compressor = zstandard.ZstdCompressor(level=level or 3).compressobj()
+        flush = compressor.flush
+    else:
+        raise ValueError(f"Unsupported compression: {encoding}")
+
+    for chunk in chunks:
+        data = compressor.compress(chunk)
+        if data:
+            yield data
+    tail = flush()
+    if tail:
+        yield tail
+
+
+def iter_file(path, chunk_size=CHUNK_SIZE):
+    """Yield the raw bytes of a file"""
+    with open(path, 'rb') as f:
+        while True:
+            chunk = f.read(chunk_size)
+            if not chunk:
+                break
+            yield chunk
+
+
+def iter_zip(files, chunk_size=CHUNK_SIZE):
+    """Stream a zip archive of ``(name in archive, path)`` pairs without building it on disk
+
+    Entries are stored rather than deflated, since they are usually compressed already.
+    """
+    sink = _ZipSink()
+    with zipfile.ZipFile(sink, 'w', zipfile.ZIP_STORED, allowZip64=True) as archive:
+        for name, path in files:
+            with open(path, 'rb') as source, archive.open(name, 'w', force_zip64=True) as entry:
+                while True:
+                    chunk = source.read(chunk_size)
+                    if not chunk:
+                        break
+                    entry.write(chunk)
+                    yield sink.drain()
+            yield sink.drain()
+    yield sink.drain()
+
+
+class _ZipSink:
+    """Write-only buffer for ZipFile; without tell() ZipFile writes a streamable archive"""
+
+    def __init__(self):
+        self._chunks = []
+
+    def write(self, data):
+        self._chunks.append(bytes(data))
+        return len(data)
+
+    def flush(self):
+        pass
+
+    def drain(self):
+        data = b''.join(self._chunks)
+        self._chunks = []
+        return data
+
+
+def parse_accept_encoding(header):
+    """Parse an Accept-Encoding header into a {coding: qvalue} mapping"""
+    accepted = {}
+    for item in (header or '').split(','):
+        item = item.strip()
+        if not item:
+            continue
+        coding, _, params = item.partition(';')
+        quality = 1.0
+        params = params.strip()
+        if params.startswith('q='):
+            try:
+                quality = float(params[2:])
+            except ValueError:
+                quality = 0.0
+        accepted[coding.strip().lower()] = quality
+    return accepted
+
+
+def negotiate_encoding(header, candidates):
+    """Return the first candidate encoding the client accepts, or ``''``"""
+    accepted = parse_accept_encoding(header)
+    best, best_quality = '', 0.0
+    for encoding in candidates:
+        quality = accepted.get(encoding, accepted.get('*', 0.0))
+        if quality > best_quality:
+            best, best_quality = encoding, quality
+    return best
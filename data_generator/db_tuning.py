@@ -0,0 +1,68 @@
+"""
+SQLite tuning: the request-serving profile is applied on connect through
+DATABASES OPTIONS (see settings.SQLITE_PRAGMAS); this module applies the
+bulk-load overrides around large inserts and restores them afterwards.
+"""
+import logging
+from contextlib import contextmanager
+
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS, connections
+
+logger = logging.getLogger(__name__)
+
+# SQLite refuses to change these while a transaction is open
+TRANSACTION_SENSITIVE_PRAGMAS = {'synchronous', 'journal_mode'}
+# Set on a connection while bulk_load_profile holds it
+HELD_ATTR = '_bulk_load_profile_held'
+
+
+def current_pragmas(using=DEFAULT_DB_ALIAS, names=None):
+    """Return the live values of the given pragmas (defaults to the configured profile)"""
+    connection = connections[using]
+    if connection.vendor != 'sqlite':
+        return {}
+    names = names or list(getattr(settings, 'SQLITE_PRAGMAS', {}))
+    values = {}
+    with connection.cursor() as cursor:
+        for name in names:
+            cursor.execute(f'PRAGMA {name}')
+            row = cursor.fetchone()
+            values[name] = row[0] if row else None
+    return values
+
+
+@contextmanager
+def bulk_load_profile(using=DEFAULT_DB_ALIAS):
+    """Apply settings.SQLITE_BULK_PRAGMAS for the duration of a bulk load
+
+    Only the connection doing the load is affected; request-serving
+    connections keep the profile from settings.SQLITE_PRAGMAS. Nested uses
+    (a chunk insert inside a streaming load) leave the outer profile alone.
+    """
+    connection = connections[using]
+    pragmas = dict(getattr(settings, 'SQLITE_BULK_PRAGMAS', {}))
+    if connection.vendor != 'sqlite' or not pragmas or getattr(connection, HELD_ATTR, False):
+        yield
+        return
+
+    if connection.in_atomic_block:
+        for name in TRANSACTION_SENSITIVE_PRAGMAS & set(pragmas):
+            logger.debug("Skipping bulk pragma %s inside a transaction", name)
+            del pragmas[name]
+
+    previous = current_pragmas(using, list(pragmas))
+    _apply(connection, pragmas)
+    setattr(connection, HELD_ATTR, True)
+    try:
+        yield
+    finally:
+        setattr(connection, HELD_ATTR, False)
+        _apply(connection, previous)
+
+
+def _apply(connection, pragmas):
+    with connection.cursor() as cursor:
+        for name, value in pragmas.items():
+            if value is not None:
+                cursor.execute(f'PRAGMA {name}={value}')
@@ -1,19 +1,36 @@
 import os
+import calendar
+import csv
 import json
-from django.db import models, connection
+import re
+import hashlib
+import logging
+import threading
+import time
+from contextlib import contextmanager, nullcontext
+from functools import partial
+from itertools import islice
+from django.db import models, connection, transaction
 from django.conf import settings
-from django.core.management import call_command
-from django.core.management.base import CommandError
-from django.apps import apps
-import importlib
+from django.apps.registry import Apps
+from .db_tuning import bulk_load_profile
 from faker import Faker
 import openpyxl
 from openpyxl.styles import Font, PatternFill
-from datetime import datetime
-import random
-import string
+from datetime import date, datetime
+from decimal import Decimal
+import sqlite3
 
-fake = Faker()
+logger = logging.getLogger(__name__)
+
+# Dates and datetimes are drawn between the epoch and this fixed end (not "now"),
+# so a seed produces the same values whenever and on however many workers it runs.
+# It is in the past, as it was with "now", so no generated date is in the future.
+DATE_RANGE_END = calendar.timegm((2024, 12, 31, 23, 59, 59))
+
+# Dynamic model classes are registered here so they never collide with (or leak
+# into) the project's app registry
+dynamic_apps = Apps(installed_apps=())
 
 # Import AI data service
 try:
@@ -22,6 +39,30 @@ try:
 except ImportError:
     AI_AVAILABLE = False
 
+try:
+    import pyarrow
+    import pyarrow.parquet
+    PARQUET_AVAILABLE = True
+except ImportError:
+    PARQUET_AVAILABLE = False
+
+
+class GenerationInterrupted(Exception):
+    """Raised from inside generation when a run has to stop early
+
+    ``status`` is the export status to record: 'cancelled' when a user asked
+    for it, 'failed' for an exhausted time or AI budget.
+    """
+    def __init__(self, status, message):
+        super().__init__(message)
+        self.status = status
+
+
+class GenerationYielded(GenerationInterrupted):
+    """Raised when a running job hands its worker to queued jobs; it is requeued rather than stopped"""
+    def __init__(self, message):
+        super().__init__('pending', message)
+
 
 class DynamicModelGenerator:
     """Handle dynamic Django model creation, migration, and data generation"""
@@ -40,19 +81,125 @@ class DynamicModelGenerator:
         'choice': models.CharField,
     }
     
-    def __init__(self):
+    EXPORT_FORMATS = {
+        'xlsx': {
+            'label': 'Excel (.xlsx)',
+            'extension': 'xlsx',
+            'content_type': 'application/vnd.openxmlformats-officedocument.spreadsheetml.sheet',
+            'writer': 'create_excel_file',
+        },
+        'sql': {
+            'label': 'SQL dump (.sql)',
+            'extension': 'sql',
+            'content_type': 'application/sql',
+            'writer': 'create_sql_file',
+        },
+        'sqlite': {
+            'label': 'SQLite database (.sqlite3)',
+            'extension': 'sqlite3',
+            'content_type': 'application/vnd.sqlite3',
+            'writer': 'create_sqlite_file',
+        },
+        'csv': {
+            'label': 'CSV (.csv)',
+            'extension': 'csv',
+            'content_type': 'text/csv',
+            'writer': 'create_csv_file',
+        },
+        'jsonl': {
+            'label': 'JSON Lines (.jsonl)',
+            'extension': 'jsonl',
+            'content_type': 'application/x-ndjson',
+            'writer': 'create_jsonl_file',
+        },
+        'parquet': {
+            'label': 'Parquet (.parquet)',
+            'extension': 'parquet',
+            'content_type': 'application/vnd.apache.parquet',
+            'writer': 'create_parquet_file',
+        },
+    }
+    
+    # Writers that produce binary output (the rest write text)
+    BINARY_FORMATS = ('xlsx', 'sqlite', 'parquet')
+    
+    # faker_type option -> Faker provider method (anything else gets fake.word)
+    # Field names containing these words get the Faker provider's values, whatever the field type
+    NAME_PROVIDERS = (
+        ('name', 'name'),
+        ('email', 'email'),
+        ('phone', 'phone_number'),
+        ('address', 'address'),
+        ('city', 'city'),
+        ('country', 'country'),
+        ('company', 'company'),
+    )
+    
+    FAKER_PROVIDERS = {
+        'name': 'name',
+        'first_name': 'first_name',
+        'last_name': 'last_name',
+        'email': 'email',
+        'phone': 'phone_number',
+        'address': 'address',
+        'city': 'city',
+        'country': 'country',
+        'company': 'company',
+        'job': 'job',
+        'sentence': 'sentence',
+        'paragraph': 'paragraph',
+        'uuid': 'uuid4',
+        'credit_card': 'credit_card_number',
+        'ssn': 'ssn',
+        'color': 'color_name',
+    }
+    
+    SQL_DIALECTS = ('sqlite', 'postgresql')
+    
+    def __init__(self, seed=None):
         self.app_name = 'data_generator'
+        self.seed = seed
+        # A private, seedable Faker/RNG pair so runs are reproducible and resumable
+        self.fake = Faker()
+        self.fake.seed_instance(seed)
+        self.random = self.fake.random
+        # Values already handed out for fields declared unique
+        self._unique_values = {}
+        # Cooperative interruption: called between chunks and before every LLM call,
+        # it raises GenerationInterrupted to stop the run
+        self.interrupt_check = None
+        self.max_ai_values = None
+        self.ai_values_generated = 0
+        self.ai_seconds = 0.0
+    
+    def check_interrupted(self):
+        if self.interrupt_check:
+            self.interrupt_check()
+    
+    def get_rng_state(self):
+        """Return the generator's RNG state in a JSON-serializable form"""
+        version, internal_state, gauss_next = self.random.getstate()
+        return [version, list(internal_state), gauss_next]
+    
+    def set_rng_state(self, state):
+        """Restore an RNG state captured with get_rng_state()"""
+        version, internal_state, gauss_next = state
+        self.random.setstate((version, tuple(internal_state), gauss_next))
     
     def create_model_class(self, table_definition):
-        """Create a Django model class dynamically"""
+        """Create a Django model class dynamically (use model_registry.get() to reuse one)"""
         table_name = table_definition['table_name']
         fields_definition = table_definition['fields_definition']
         
-        # Create model attributes dictionary
+        # Create model attributes dictionary; the class lives in dynamic_apps, not the
+        # project registry, and the table itself is managed by create_table()
         attrs = {
             '__module__': f'{self.app_name}.models',
             '__tablename__': table_name,
             'Meta': type('Meta', (), {
+                'app_label': self.app_name,
+                'apps': dynamic_apps,
+                'managed': False,
                 'db_table': table_name,
                 'verbose_name': table_definition.get('display_name', table_name),
                 'verbose_name_plural': table_definition.get('display_name', table_name) + 's'
@@ -120,115 +267,57 @@ class DynamicModelGenerator:
             # Store as text field (will be JSON)
             kwargs.pop('max_length', None)
             
+        if options.get('unique'):
+            kwargs['unique'] = True
+        elif options.get('indexed'):
+            kwargs['db_index'] = True
+            
         if options.get('default') is not None:
             kwargs['default'] = options['default']
             
         return kwargs
     
-    def create_migration_file(self, table_definition, model_class):
-        """Create a migration file for the dynamic model"""
-        from django.db import connection
-        from django.core.management import call_command
-        
-        migration_name = f"create_{table_definition['table_name']}"
-        
-        # Create migrations directory if it doesn't exist
-        migrations_dir = os.path.join(settings.BASE_DIR, self.app_name, 'migrations')
-        os.makedirs(migrations_dir, exist_ok=True)
-        
-        # Get the latest migration to set as dependency
-        existing_migrations = [f for f in os.listdir(migrations_dir) 
-                             if f.endswith('.py') and f[0].isdigit()]
-        existing_migrations.sort()
-        
-        if existing_migrations:
-            latest_migration = existing_migrations[-1].split('_')[0]
-            dependency = f"('{self.app_name}', '{latest_migration}_{existing_migrations[-1].split('_', 1)[1][:-3]}')"
-        else:
-            dependency = f"('{self.app_name}', '0001_initial')"
+    def create_table(self, table_definition, schema_editor=None):
+        """Create the dynamic table and its indexes with schema_editor DDL
         
-        # Find next migration number
-        next_num = len(existing_migrations) + 1
-        migration_filename = f"{next_num:04d}_{migration_name}.py"
-        migration_path = os.path.join(migrations_dir, migration_filename)
+        Runs inside the editor's transaction, so callers that pass their own
+        editor can save the table definition atomically with the DDL.
+        """
+        if schema_editor is None:
+            with connection.schema_editor() as editor:
+                return self.create_table(table_definition, editor)
         
-        migration_content = self._generate_migration_content_improved(
-            migration_name, table_definition, model_class, dependency
+        dialect = 'postgresql' if schema_editor.connection.vendor == 'postgresql' else 'sqlite'
+        schema_editor.execute(
+            f"CREATE TABLE {table_definition['table_name']} "
+            f"({self._generate_sql_fields(table_definition['fields_definition'], dialect)})"
         )
-        
-        # Write migration file
-        with open(migration_path, 'w') as f:
-            f.write(migration_content)
-            
-        return migration_filename
+        for statement in self._generate_index_sql(table_definition):
+            schema_editor.execute(statement)
     
-    def _generate_migration_content(self, migration_name, table_definition, model_class):
-        """Generate migration file content (legacy)"""
-        return f'''# Generated migration for dynamic table: {table_definition['table_name']}
-from django.db import migrations, models
-
-
-class Migration(migrations.Migration):
-
-    dependencies = [
-        ('{self.app_name}', '0001_initial'),
-    ]
-
-    operations = [
-        migrations.RunSQL(
-            """
-            CREATE TABLE IF NOT EXISTS {table_definition['table_name']} (
-                {self._generate_sql_fields(table_definition['fields_definition'])}
-            )
-            """,
-            reverse_sql="DROP TABLE IF EXISTS {table_definition['table_name']}"
-        ),
-    ]
-'''
-
-    def _generate_migration_content_improved(self, migration_name, table_definition, model_class, dependency):
-        """Generate improved migration file content with proper dependencies"""
-        return f'''# Generated migration for dynamic table: {table_definition['table_name']}
-from django.db import migrations, models
-
-
-class Migration(migrations.Migration):
-
-    dependencies = [
-        {dependency},
-    ]
-
-    operations = [
-        migrations.RunSQL(
-            """
-            CREATE TABLE IF NOT EXISTS {table_definition['table_name']} (
-                {self._generate_sql_fields(table_definition['fields_definition'])}
-            )
-            """,
-            reverse_sql="DROP TABLE IF EXISTS {table_definition['table_name']}"
-        ),
-    ]
-'''
-    
-    def _generate_sql_fields(self, fields_definition):
+    def _generate_sql_fields(self, fields_definition, dialect='sqlite'):
         """Generate SQL field definitions"""
-        sql_fields = ['id INTEGER PRIMARY KEY AUTOINCREMENT']
+        if dialect == 'postgresql':
+            sql_fields = ['id BIGSERIAL PRIMARY KEY']
+        else:
+            sql_fields = ['id INTEGER PRIMARY KEY AUTOINCREMENT']
         
         for field_def in fields_definition:
-            field_name = field_def['name']
-            field_type = field_def['type']
-            options = field_def.get('options', {})
-            
-            sql_type = self._get_sql_type(field_type, options)
-            nullable = 'NULL' if options.get('nullable', False) else 'NOT NULL'
-            
-            sql_fields.append(f'{field_name} {sql_type} {nullable}')
+            sql_fields.append(self._column_sql(field_def, dialect))
         
-        sql_fields.append('created_at DATETIME NOT NULL DEFAULT CURRENT_TIMESTAMP')
+        timestamp_type = 'TIMESTAMP' if dialect == 'postgresql' else 'DATETIME'
+        sql_fields.append(f'created_at {timestamp_type} NOT NULL DEFAULT CURRENT_TIMESTAMP')
         
         return ',\n                '.join(sql_fields)
     
-    def _get_sql_type(self, field_type, options):
+    def _column_sql(self, field_def, dialect='sqlite'):
+        """Generate the column definition for one field"""
+        options = field_def.get('options', {})
+        sql_type = self._get_sql_type(field_def['type'], options, dialect)
+        nullable = 'NULL' if options.get('nullable', False) else 'NOT NULL'
+        return f"{field_def['name']} {sql_type} {nullable}"
+    
+    def _get_sql_type(self, field_type, options, dialect='sqlite'):
         """Get SQL type for field"""
         sql_types = {
             'string': f"VARCHAR({options.get('max_length', 255)})",
@@ -237,7 +326,7 @@ class Migration(migrations.Migration):
             'decimal': f"DECIMAL({options.get('max_digits', 10)}, {options.get('decimal_places', 2)})",
             'boolean': 'BOOLEAN',
             'date': 'DATE',
-            'datetime': 'DATETIME',
+            'datetime': 'TIMESTAMP' if dialect == 'postgresql' else 'DATETIME',
             'email': f"VARCHAR({options.get('max_length', 255)})",
             'url': f"VARCHAR({options.get('max_length', 500)})",
             'list': 'TEXT',
@@ -245,166 +334,338 @@ class Migration(migrations.Migration):
         }
         return sql_types.get(field_type, 'VARCHAR(255)')
     
-    def run_migration(self, migration_filename):
-        """Run the migration"""
-        try:
-            call_command('migrate', verbosity=0)
-            return True
-        except CommandError as e:
-            print(f"Migration error: {e}")
-            return False
-    
-    def run_migration_with_feedback(self, migration_filename):
-        """Run the migration with detailed error feedback"""
-        try:
-            call_command('migrate', verbosity=1)
-            return True, None
-        except CommandError as e:
-            error_msg = str(e)
-            print(f"Migration error: {error_msg}")
-            
-            # Check for common migration issues
-            if "Conflicting migrations detected" in error_msg:
-                return False, "Migration conflict detected. Please try again or contact administrator."
-            elif "relation already exists" in error_msg:
-                return False, "Table already exists in database. Please choose a different table name."
-            elif "syntax error" in error_msg.lower():
-                return False, "SQL syntax error. Please check your field definitions."
+    def diff_fields(self, old_fields, new_fields, renames=None, dialect='sqlite'):
+        """Compare two fields_definition lists; ``renames`` maps old column names to new ones"""
+        old_by_name = {field['name']: field for field in old_fields}
+        new_by_name = {field['name']: field for field in new_fields}
+        renames = {
+            old: new for old, new in (renames or {}).items()
+            if old != new and old in old_by_name and new in new_by_name
+        }
+        
+        removed = [name for name in old_by_name if renames.get(name, name) not in new_by_name]
+        kept = [name for name in old_by_name if name not in removed]
+        targets = {renames.get(name, name) for name in kept}
+        added = [field for field in new_fields if field['name'] not in targets]
+        changed = [
+            name for name in kept
+            if self._column_signature(old_by_name[name], dialect)
+            != self._column_signature(new_by_name[renames.get(name, name)], dialect)
+        ]
+        return {'added': added, 'removed': removed, 'renamed': renames, 'changed': changed}
+    
+    def _column_signature(self, field_def, dialect):
+        """Column type and nullability as the database enforces them"""
+        signature = self._column_sql(dict(field_def, name=''), dialect)
+        if dialect == 'sqlite':
+            # SQLite ignores VARCHAR/DECIMAL sizes, so changing them needs no rebuild
+            signature = re.sub(r'\([\d, ]+\)', '', signature)
+        return signature
+    
+    def needs_rebuild(self, old_fields, diff):
+        """Whether a diff_fields() result can only be applied by copying the rows into a new table"""
+        # A rename onto a column that is itself being renamed away (a swap) can't be done in place
+        old_names = {field['name'] for field in old_fields}
+        return bool(diff['changed']) or any(new in old_names for new in diff['renamed'].values())
+    
+    def alter_table(self, old_definition, new_definition, renames=None, schema_editor=None):
+        """Evolve a dynamic table in place to match ``new_definition``
+        
+        Renames, drops and additions use ALTER TABLE; only type or nullability
+        changes fall back to copying the rows into a shadow table. Returns the
+        diff plus the indexes left for after the added columns are backfilled.
+        """
+        if schema_editor is None:
+            with connection.schema_editor() as editor:
+                return self.alter_table(old_definition, new_definition, renames, editor)
+        
+        table_name = old_definition['table_name']
+        dialect = 'postgresql' if schema_editor.connection.vendor == 'postgresql' else 'sqlite'
+        diff = self.diff_fields(
+            old_definition['fields_definition'], new_definition['fields_definition'], renames, dialect
+        )
+        old_indexes = {index['name']: index for index in self._index_definitions(old_definition)}
+        new_indexes = {index['name']: index for index in self._index_definitions(new_definition)}
+        added_names = {field['name'] for field in diff['added']}
+        
+        rebuild = self.needs_rebuild(old_definition['fields_definition'], diff)
+        
+        if rebuild:
+            self._rebuild_table(old_definition, new_definition, diff, dialect, schema_editor)
+            pending = list(new_indexes.values())
+        else:
+            for name in old_indexes.keys() - new_indexes.keys():
+                schema_editor.execute(f"DROP INDEX IF EXISTS {name}")
+            for old, new in diff['renamed'].items():
+                schema_editor.execute(f"ALTER TABLE {table_name} RENAME COLUMN {old} TO {new}")
+            for name in diff['removed']:
+                schema_editor.execute(f"ALTER TABLE {table_name} DROP COLUMN {name}")
+            for field_def in diff['added']:
+                # A constant default keeps ADD COLUMN a metadata-only change; the backfill overwrites it
+                schema_editor.execute(
+                    f"ALTER TABLE {table_name} ADD COLUMN {self._column_sql(field_def, dialect)} "
+                    f"DEFAULT {self._sql_literal(self._column_default(field_def))}"
+                )
+            pending = [new_indexes[name] for name in new_indexes.keys() - old_indexes.keys()]
+        
+        diff['deferred_indexes'] = [index for index in pending if added_names & set(index['fields'])]
+        for index in pending:
+            if index not in diff['deferred_indexes']:
+                schema_editor.execute(self._index_sql(table_name, index))
+        diff['rebuilt'] = rebuild
+        return diff
+    
+    def _rebuild_table(self, old_definition, new_definition, diff, dialect, schema_editor):
+        """Copy the rows into a table with the new schema and swap it in"""
+        table_name = old_definition['table_name']
+        shadow = f"{table_name}__shadow"
+        added_names = {field['name'] for field in diff['added']}
+        sources = {new: old for old, new in diff['renamed'].items()}
+        
+        columns, selects = ['id', 'created_at'], ['id', 'created_at']
+        for field_def in new_definition['fields_definition']:
+            name = field_def['name']
+            default = self._sql_literal(self._column_default(field_def))
+            columns.append(name)
+            if name in added_names:
+                selects.append(default)
+            elif field_def.get('options', {}).get('nullable'):
+                selects.append(sources.get(name, name))
             else:
-                return False, f"Migration failed: {error_msg}"
-        except Exception as e:
-            error_msg = str(e)
-            print(f"Unexpected migration error: {error_msg}")
-            return False, f"Unexpected error: {error_msg}"
+                selects.append(f"COALESCE({sources.get(name, name)}, {default})")
+        
+        schema_editor.execute(f"DROP TABLE IF EXISTS {shadow}")
+        schema_editor.execute(
+            f"CREATE TABLE {shadow} ({self._generate_sql_fields(new_definition['fields_definition'], dialect)})"
+        )
+        schema_editor.execute(
+            f"INSERT INTO {shadow} ({', '.join(columns)}) SELECT {', '.join(selects)} FROM {table_name}"
+        )
+        schema_editor.execute(f"DROP TABLE {table_name}")
+        schema_editor.execute(f"ALTER TABLE {shadow} RENAME TO {table_name}")
+        if dialect == 'postgresql':
+            schema_editor.execute(
+                f"SELECT setval(pg_get_serial_sequence('{table_name}', 'id'), "
+                f"COALESCE(MAX(id), 1)) FROM {table_name}"
+            )
+        logger.info("Rebuilt %s through a shadow table for changed columns %s", table_name, diff['changed'])
+    
+    def _column_default(self, field_def):
+        """Placeholder value for a column until it is backfilled"""
+        options = field_def.get('options', {})
+        if options.get('default') is not None:
+            return options['default']
+        defaults = {
+            'number': 0,
+            'decimal': 0,
+            'boolean': False,
+            'date': '1970-01-01',
+            'datetime': '1970-01-01 00:00:00',
+        }
+        return defaults.get(field_def['type'], '')
+    
+    def create_indexes(self, table_definition, indexes):
+        """Build the given index definitions (e.g. the ones deferred by alter_table)"""
+        with connection.cursor() as cursor:
+            for index in indexes:
+                cursor.execute(self._index_sql(table_definition['table_name'], index))
     
     def generate_synthetic_data(self, table_definition, num_records=5, openai_api_key=None):
         """Generate synthetic data for the dynamic table"""
-        table_name = table_definition['table_name']
+        data = []
+        for chunk in self.iter_synthetic_data(table_definition, num_records, openai_api_key):
+            data.extend(chunk)
+        return data
+    
+    def iter_synthetic_data(self, table_definition, num_records=5, openai_api_key=None, chunk_size=1000):
+        """Yield synthetic records in chunks of at most ``chunk_size`` rows"""
         fields_definition = table_definition['fields_definition']
+        ai_generator = self._get_ai_generator(fields_definition, openai_api_key)
+        plan = self.compile_plan(fields_definition)
         
+        remaining = num_records
+        while remaining > 0:
+            self.check_interrupted()
+            size = min(chunk_size, remaining)
+            yield [self._generate_record(fields_definition, ai_generator, plan) for _ in range(size)]
+            remaining -= size
+    
+    def _get_ai_generator(self, fields_definition, openai_api_key):
+        """Return the AI generator when any field asks for it, otherwise None"""
         # Check if AI should be used
         use_ai = AI_AVAILABLE and openai_api_key and any(
             field_def.get('options', {}).get('ai_description') 
             for field_def in fields_definition
         )
+        if not use_ai:
+            return None
+        
+        try:
+            return get_ai_generator(openai_api_key)
+        except Exception as e:
+            print(f"Failed to initialize AI generator: {e}")
+            return None
+    
+    def compile_plan(self, fields_definition):
+        """Resolve each field's value generator once, instead of re-deciding it for every value
+        
+        Returns (field_def, value_fn) pairs; the functions draw from this
+        generator's Faker/RNG, so a plan produces exactly what per-value
+        generation would.
+        """
+        plan = []
+        for field_def in fields_definition:
+            options = field_def.get('options', {})
+            plan.append((field_def, self._field_generator(
+                field_def['type'], field_def['name'], options, options.get('faker_type')
+            )))
+        return plan
+    
+    def sample_records(self, plan, num_records, seed):
+        """Reseed and generate records from a compiled plan, forgetting earlier unique values"""
+        self.fake.seed_instance(seed)
+        self._unique_values = {}
+        return [self._generate_record(None, plan=plan) for _ in range(num_records)]
+    
+    def _generate_record(self, fields_definition, ai_generator=None, plan=None):
+        """Generate a single record"""
+        if plan is None:
+            plan = self.compile_plan(fields_definition)
+        record = {}
+        for field_def, value_fn in plan:
+            field_name = field_def['name']
+            value = self._generate_value(field_def, ai_generator, value_fn)
+            if field_def.get('options', {}).get('unique'):
+                value = self._make_unique(field_def, value, ai_generator, value_fn=value_fn)
+            record[field_name] = value
+        return record
+    
+    def _generate_value(self, field_def, ai_generator=None, value_fn=None):
+        """Generate one value for a field, using AI when it is configured"""
+        field_name = field_def['name']
+        field_type = field_def['type']
+        options = field_def.get('options', {})
+        ai_description = options.get('ai_description')
+        faker_type = options.get('faker_type')  # Keep for backward compatibility
         
-        ai_generator = None
-        if use_ai:
+        # Use AI generation if available and description provided
+        if ai_generator and ai_description and ai_description.strip():
+            self.check_interrupted()
+            if self.max_ai_values is not None and self.ai_values_generated >= self.max_ai_values:
+                raise GenerationInterrupted('failed', f'AI budget of {self.max_ai_values} values exhausted')
+            self.ai_values_generated += 1
+            started = time.perf_counter()
             try:
-                ai_generator = get_ai_generator(openai_api_key)
+                return ai_generator.generate_field_value(
+                    field_name, field_type, ai_description
+                )
             except Exception as e:
-                print(f"Failed to initialize AI generator: {e}")
-                use_ai = False
+                print(f"AI generation failed for {field_name}: {e}, falling back to traditional method")
+            finally:
+                self.ai_seconds += time.perf_counter() - started
         
-        data = []
-        for _ in range(num_records):
-            record = {}
-            for field_def in fields_definition:
-                field_name = field_def['name']
-                field_type = field_def['type']
-                options = field_def.get('options', {})
-                ai_description = options.get('ai_description')
-                faker_type = options.get('faker_type')  # Keep for backward compatibility
-                
-                # Use AI generation if available and description provided
-                if use_ai and ai_description and ai_description.strip():
-                    try:
-                        record[field_name] = ai_generator.generate_field_value(
-                            field_name, field_type, ai_description
-                        )
-                    except Exception as e:
-                        print(f"AI generation failed for {field_name}: {e}, falling back to traditional method")
-                        record[field_name] = self._generate_field_value(
-                            field_type, field_name, options, faker_type
-                        )
-                else:
-                    # Use traditional generation
-                    record[field_name] = self._generate_field_value(
-                        field_type, field_name, options, faker_type
-                    )
-            data.append(record)
+        # Use traditional generation
+        if value_fn is not None:
+            return value_fn()
+        return self._generate_field_value(
+            field_type, field_name, options, faker_type
+        )
+    
+    def _make_unique(self, field_def, value, ai_generator=None, max_attempts=50, value_fn=None):
+        """Regenerate (or, for free-form strings, suffix) a value until it is unused"""
+        field_name = field_def['name']
+        seen = self._unique_values.setdefault(field_name, set())
         
-        return data
+        attempts = 0
+        while value in seen and attempts < max_attempts:
+            value = self._generate_value(field_def, ai_generator, value_fn)
+            attempts += 1
+        
+        if value in seen:
+            if field_def['type'] == 'email' and '@' in str(value):
+                local, domain = str(value).split('@', 1)
+                value = f"{local}{len(seen)}@{domain}"
+            elif field_def['type'] in ('string', 'text', 'url'):
+                value = f"{value}-{len(seen)}"
+            else:
+                raise ValueError(f"Could not generate another unique value for field '{field_name}'")
+        
+        seen.add(value)
+        return value
+    
+    def load_unique_values(self, table_definition):
+        """Treat the values already in the table's unique columns as used, before appending rows
+        
+        Does nothing for definitions without unique fields or an empty table.
+        """
+        unique_fields = [field for field in table_definition['fields_definition']
+                         if field.get('options', {}).get('unique')]
+        if not unique_fields:
+            return
+        quote_name = connection.ops.quote_name
+        table_name = quote_name(table_definition['table_name'])
+        with connection.cursor() as cursor:
+            cursor.execute(f"SELECT 1 FROM {table_name} LIMIT 1")
+            if cursor.fetchone() is None:
+                return
+        for field_def in unique_fields:
+            column = quote_name(field_def['name'])
+            with connection.cursor() as cursor:
+                cursor.execute(f"SELECT {column} FROM {table_name} WHERE {column} IS NOT NULL")
+                self._unique_values.setdefault(field_def['name'], set()).update(row[0] for row in cursor.fetchall())
     
     def _generate_field_value(self, field_type, field_name, options, faker_type=None):
         """Generate a single field value"""
+        return self._field_generator(field_type, field_name, options, faker_type)()
+    
+    def _field_generator(self, field_type, field_name, options, faker_type=None):
+        """Return a function producing values for a field (see compile_plan)"""
+        fake, rng = self.fake, self.random
+        
         # Use specific faker if provided
         if faker_type:
-            return self._get_faker_value(faker_type, options)
+            return getattr(fake, self.FAKER_PROVIDERS.get(faker_type, 'word'))
         
         # Generate based on field name heuristics
-        field_name_lower = field_name.lower()
-        
-        if 'name' in field_name_lower:
-            return fake.name()
-        elif 'email' in field_name_lower:
-            return fake.email()
-        elif 'phone' in field_name_lower:
-            return fake.phone_number()
-        elif 'address' in field_name_lower:
-            return fake.address()
-        elif 'city' in field_name_lower:
-            return fake.city()
-        elif 'country' in field_name_lower:
-            return fake.country()
-        elif 'company' in field_name_lower:
-            return fake.company()
+        provider = self._name_provider(field_name)
+        if provider:
+            return getattr(fake, provider)
         
         # Generate based on field type
         if field_type == 'string':
-            return fake.text(max_nb_chars=options.get('max_length', 50))
+            return partial(fake.text, max_nb_chars=options.get('max_length', 50))
         elif field_type == 'text':
-            return fake.paragraph(nb_sentences=random.randint(2, 5))
+            return lambda: fake.paragraph(nb_sentences=rng.randint(2, 5))
         elif field_type == 'number':
-            min_val = options.get('min_value', 1)
-            max_val = options.get('max_value', 1000)
-            return random.randint(min_val, max_val)
+            return partial(rng.randint, options.get('min_value', 1), options.get('max_value', 1000))
         elif field_type == 'decimal':
-            return round(random.uniform(0, 1000), options.get('decimal_places', 2))
+            decimal_places = options.get('decimal_places', 2)
+            return lambda: round(rng.uniform(0, 1000), decimal_places)
         elif field_type == 'boolean':
-            return random.choice([True, False])
+            return partial(rng.choice, [True, False])
         elif field_type == 'date':
-            return fake.date()
+            return partial(fake.date, end_datetime=DATE_RANGE_END)
         elif field_type == 'datetime':
-            return fake.date_time()
+            return partial(fake.date_time, end_datetime=DATE_RANGE_END)
         elif field_type == 'email':
-            return fake.email()
+            return fake.email
         elif field_type == 'url':
-            return fake.url()
+            return fake.url
         elif field_type == 'choice':
-            choices = options.get('choices', ['Option A', 'Option B', 'Option C'])
-            return random.choice(choices)
+            return partial(rng.choice, options.get('choices', ['Option A', 'Option B', 'Option C']))
         elif field_type == 'list':
             # Generate a list as JSON string
-            list_items = [fake.word() for _ in range(random.randint(1, 5))]
-            return json.dumps(list_items)
+            return lambda: json.dumps([fake.word() for _ in range(rng.randint(1, 5))])
         else:
-            return fake.word()
-    
-    def _get_faker_value(self, faker_type, options):
-        """Get value from faker based on type"""
-        faker_methods = {
-            'name': fake.name,
-            'first_name': fake.first_name,
-            'last_name': fake.last_name,
-            'email': fake.email,
-            'phone': fake.phone_number,
-            'address': fake.address,
-            'city': fake.city,
-            'country': fake.country,
-            'company': fake.company,
-            'job': fake.job,
-            'sentence': fake.sentence,
-            'paragraph': fake.paragraph,
-            'uuid': fake.uuid4,
-            'credit_card': fake.credit_card_number,
-            'ssn': fake.ssn,
-            'color': fake.color_name,
-        }
-        
-        if faker_type in faker_methods:
-            return faker_methods[faker_type]()
-        return fake.word()
+            return fake.word
+    
+    def _name_provider(self, field_name):
+        """The Faker provider a field's name calls for (see NAME_PROVIDERS), or None"""
+        field_name_lower = field_name.lower()
+        for word, provider in self.NAME_PROVIDERS:
+            if word in field_name_lower:
+                return provider
+        return None
     
     def create_excel_file(self, table_definition, data, output_path):
         """Create Excel file with synthetic data"""
@@ -450,23 +711,526 @@ class Migration(migrations.Migration):
         workbook.save(output_path)
         return output_path
     
-    def insert_data_to_db(self, table_definition, data):
-        """Insert synthetic data directly into the database"""
+    def create_export_file(self, export_format, table_definition, data, output_path, **options):
+        """Write records to ``output_path`` using the writer registered for ``export_format``"""
+        try:
+            writer = getattr(self, self.EXPORT_FORMATS[export_format]['writer'])
+        except KeyError:
+            raise ValueError(f"Unsupported export format: {export_format}")
+        return writer(table_definition, data, output_path, **options)
+    
+    def create_sql_file(self, table_definition, data, output_path, style='insert', dialect=None, batch_size=500):
+        """Create a SQL dump: CREATE TABLE plus batched multi-row INSERTs or PostgreSQL COPY blocks"""
+        if style not in ('insert', 'copy'):
+            raise ValueError(f"Unsupported SQL style: {style}")
+        # COPY ... FROM stdin is PostgreSQL-only, so it implies that dialect
+        dialect = 'postgresql' if style == 'copy' else (dialect or 'sqlite')
+        if dialect not in self.SQL_DIALECTS:
+            raise ValueError(f"Unsupported SQL dialect: {dialect}")
+        batch_size = max(1, int(batch_size))
+        
         table_name = table_definition['table_name']
+        field_names = [field['name'] for field in table_definition['fields_definition']]
+        columns = ', '.join(field_names)
         
-        if not data:
-            return
+        with self._open_output(output_path, 'w', encoding='utf-8', newline='\n') as f:
+            f.write(f"-- Synthetic data for table {table_name}\n")
+            f.write(f"-- Generated {datetime.now().isoformat(timespec='seconds')} ({dialect}, {style})\n")
+            f.write("BEGIN;\n\n")
+            f.write(f"CREATE TABLE IF NOT EXISTS {table_name} (\n    ")
+            f.write(self._generate_sql_fields(table_definition['fields_definition'], dialect).replace(
+                ',\n                ', ',\n    '
+            ))
+            f.write("\n);\n\n")
+            
+            batch = []
+            
+            def flush():
+                if style == 'copy':
+                    f.write(f"COPY {table_name} ({columns}) FROM stdin;\n")
+                    f.writelines(row + '\n' for row in batch)
+                    f.write("\\.\n\n")
+                else:
+                    f.write(f"INSERT INTO {table_name} ({columns}) VALUES\n")
+                    f.write(',\n'.join(batch))
+                    f.write(";\n\n")
+                batch.clear()
+            
+            for record in data:
+                values = [record.get(field) for field in field_names]
+                if style == 'copy':
+                    batch.append('\t'.join(self._copy_value(value) for value in values))
+                else:
+                    batch.append('(' + ', '.join(self._sql_literal(value) for value in values) + ')')
+                if len(batch) >= batch_size:
+                    flush()
+            if batch:
+                flush()
+            
+            # Built after the data, as the sqlite export does, so loading the dump doesn't maintain them per row
+            for index_sql in self._generate_index_sql(table_definition):
+                f.write(f"{index_sql};\n")
+            f.write("\nCOMMIT;\n")
         
-        # Get field names
+        return output_path
+    
+    def create_csv_file(self, table_definition, data, output_path):
+        """Create a CSV file with a header row"""
+        field_names = [field['name'] for field in table_definition['fields_definition']]
+        with self._open_output(output_path, 'w', encoding='utf-8', newline='') as f:
+            writer = csv.writer(f)
+            writer.writerow(field_names)
+            writer.writerows([record.get(field) for field in field_names] for record in data)
+        return output_path
+    
+    def create_jsonl_file(self, table_definition, data, output_path):
+        """Create a JSON Lines file, one object per record"""
         field_names = [field['name'] for field in table_definition['fields_definition']]
+        with self._open_output(output_path, 'w', encoding='utf-8') as f:
+            f.writelines(
+                json.dumps({field: record.get(field) for field in field_names}, default=str) + '\n'
+                for record in data
+            )
+        return output_path
+    
+    def create_parquet_file(self, table_definition, data, output_path, row_group_size=50000):
+        """Create a Parquet file, one row group at a time, with column types from the field definitions"""
+        if not PARQUET_AVAILABLE:
+            raise ValueError("Parquet export requires the 'pyarrow' package")
+        fields = table_definition['fields_definition']
+        schema = self._parquet_schema(fields)
+        # Values of string columns may come from Faker or the LLM in other types
+        text_fields = [field['name'] for field in fields if schema.field(field['name']).type == pyarrow.string()]
+        with pyarrow.parquet.ParquetWriter(output_path, schema) as writer:
+            for chunk in self._chunked(data, row_group_size):
+                rows = [{field: record.get(field) for field in schema.names} for record in chunk]
+                for row in rows:
+                    for field in text_fields:
+                        if row[field] is not None and not isinstance(row[field], str):
+                            row[field] = str(self._db_value(row[field]))
+                writer.write_table(pyarrow.Table.from_pylist(rows, schema=schema))
+        return output_path
+    
+    def _parquet_schema(self, fields_definition):
+        """Arrow schema for the fields, by the Django field each type maps to (see FIELD_TYPE_MAPPING)
         
-        # Prepare SQL
-        placeholders = ', '.join(['?' for _ in field_names])
-        fields_str = ', '.join(field_names)
-        sql = f"INSERT INTO {table_name} ({fields_str}) VALUES ({placeholders})"
+        Declared up front rather than inferred, so a column that is all None in
+        the first row group doesn't get a null type later row groups can't be
+        written with. Fields whose values come from a Faker provider (by
+        faker_type or name) or the LLM are strings whatever their type.
+        """
+        arrow_types = {
+            models.IntegerField: pyarrow.int64(),
+            models.DecimalField: pyarrow.float64(),
+            models.BooleanField: pyarrow.bool_(),
+            models.DateTimeField: pyarrow.timestamp('us'),
+        }
+        schema = []
+        for field_def in fields_definition:
+            options = field_def.get('options', {})
+            if options.get('faker_type') or options.get('ai_description') or self._name_provider(field_def['name']):
+                arrow_type = pyarrow.string()
+            else:
+                arrow_type = arrow_types.get(self.FIELD_TYPE_MAPPING.get(field_def['type']), pyarrow.string())
+            schema.append((field_def['name'], arrow_type))
+        return pyarrow.schema(schema)
+    
+    @contextmanager
+    def _open_output(self, output, mode, **kwargs):
+        """Open ``output`` if it is a path; a file object (e.g. stdout) is written as-is and left open"""
+        if hasattr(output, 'write'):
+            yield output
+        else:
+            with open(output, mode, **kwargs) as f:
+                yield f
+    
+    def create_sqlite_file(self, table_definition, data, output_path, batch_size=50000):
+        """Create a standalone SQLite database file holding the synthetic data"""
+        if os.path.exists(output_path):
+            os.remove(output_path)
         
-        # Insert data
-        with connection.cursor() as cursor:
+        table_name = table_definition['table_name']
+        field_names = [field['name'] for field in table_definition['fields_definition']]
+        placeholders = ', '.join('?' for _ in field_names)
+        sql = f"INSERT INTO {table_name} ({', '.join(field_names)}) VALUES ({placeholders})"
+        
+        # The file is private until we hand it out, so durability can be traded for load speed
+        conn = sqlite3.connect(output_path, isolation_level=None)
+        try:
+            conn.execute('PRAGMA journal_mode=OFF')
+            conn.execute('PRAGMA synchronous=OFF')
+            conn.execute('PRAGMA locking_mode=EXCLUSIVE')
+            conn.execute('PRAGMA temp_store=MEMORY')
+            conn.execute(f"CREATE TABLE {table_name} ({self._generate_sql_fields(table_definition['fields_definition'])})")
+            
+            batch = []
             for record in data:
-                values = [record.get(field, None) for field in field_names]
-                cursor.execute(sql, values)
+                batch.append([self._db_value(record.get(field)) for field in field_names])
+                if len(batch) >= batch_size:
+                    self._sqlite_load_batch(conn, sql, batch)
+                    batch = []
+            if batch:
+                self._sqlite_load_batch(conn, sql, batch)
+            
+            # Indexes are cheaper to build once over the loaded rows than to maintain per insert
+            for index_sql in self._generate_index_sql(table_definition):
+                conn.execute(index_sql)
+            conn.execute('ANALYZE')
+            conn.execute('PRAGMA journal_mode=DELETE')
+            conn.execute('VACUUM')
+        finally:
+            conn.close()
+        
+        return output_path
+    
+    def _sqlite_load_batch(self, conn, sql, rows):
+        """Insert a batch of rows inside a single transaction"""
+        conn.execute('BEGIN')
+        try:
+            conn.executemany(sql, rows)
+        except Exception:
+            conn.execute('ROLLBACK')
+            raise
+        conn.execute('COMMIT')
+    
+    def _index_definitions(self, table_definition):
+        """Return declared indexes (per-field indexed/unique plus composite ones) with their names"""
+        table_name = table_definition['table_name']
+        indexes = []
+        for field_def in table_definition['fields_definition']:
+            options = field_def.get('options', {})
+            if options.get('unique') or options.get('indexed'):
+                indexes.append({'fields': [field_def['name']], 'unique': bool(options.get('unique'))})
+        for index in table_definition.get('indexes') or []:
+            indexes.append({'fields': list(index['fields']), 'unique': bool(index.get('unique'))})
+        
+        for index in indexes:
+            prefix = 'uniq' if index['unique'] else 'idx'
+            index['name'] = f"{prefix}_{table_name}_{'_'.join(index['fields'])}"
+        return indexes
+    
+    def _index_sql(self, table_name, index):
+        """Generate the CREATE INDEX statement for one index definition"""
+        unique = 'UNIQUE ' if index['unique'] else ''
+        return (f"CREATE {unique}INDEX IF NOT EXISTS {index['name']} "
+                f"ON {table_name} ({', '.join(index['fields'])})")
+    
+    def _generate_index_sql(self, table_definition):
+        """Generate CREATE INDEX statements for the table's declared indexes"""
+        return [
+            self._index_sql(table_definition['table_name'], index)
+            for index in self._index_definitions(table_definition)
+        ]
+    
+    @contextmanager
+    def deferred_indexes(self, table_definition):
+        """Drop the table's non-unique indexes during a bulk load and rebuild them afterwards
+        
+        Unique indexes stay in place: they enforce a constraint, and rebuilding them
+        after the load would only move the failure to the end.
+        """
+        deferred = [index for index in self._index_definitions(table_definition) if not index['unique']]
+        if deferred:
+            with connection.cursor() as cursor:
+                for index in deferred:
+                    cursor.execute(f"DROP INDEX IF EXISTS {index['name']}")
+        try:
+            yield
+        finally:
+            if deferred:
+                started = time.monotonic()
+                with connection.cursor() as cursor:
+                    for index in deferred:
+                        cursor.execute(self._index_sql(table_definition['table_name'], index))
+                logger.info("Rebuilt %s index(es) on %s in %.2fs",
+                            len(deferred), table_definition['table_name'], time.monotonic() - started)
+    
+    def _should_defer_indexes(self, num_rows):
+        """Whether a load is large enough that rebuilding indexes beats maintaining them"""
+        return num_rows >= getattr(settings, 'BULK_INDEX_REBUILD_THRESHOLD', 50000)
+    
+    def _db_value(self, value):
+        """Convert a generated value into something the database driver can bind"""
+        if isinstance(value, (list, dict)):
+            return json.dumps(value)
+        if isinstance(value, datetime):
+            return value.isoformat(sep=' ')
+        if isinstance(value, date):
+            return value.isoformat()
+        if isinstance(value, Decimal):
+            return str(value)
+        return value
+    
+    def _sql_literal(self, value):
+        """Render a Python value as a SQL literal"""
+        if value is None:
+            return 'NULL'
+        if isinstance(value, bool):
+            return 'TRUE' if value else 'FALSE'
+        if isinstance(value, (int, float, Decimal)):
+            return str(value)
+        if isinstance(value, (list, dict)):
+            value = json.dumps(value)
+        elif isinstance(value, datetime):
+            value = value.isoformat(sep=' ')
+        elif isinstance(value, date):
+            value = value.isoformat()
+        return "'" + str(value).replace("'", "''") + "'"
+    
+    def _copy_value(self, value):
+        """Render a Python value in PostgreSQL COPY text format"""
+        if value is None:
+            return '\\N'
+        if isinstance(value, bool):
+            return 't' if value else 'f'
+        if isinstance(value, (list, dict)):
+            value = json.dumps(value)
+        elif isinstance(value, datetime):
+            value = value.isoformat(sep=' ')
+        elif isinstance(value, date):
+            value = value.isoformat()
+        return (str(value).replace('\\', '\\\\').replace('\t', '\\t')
+                .replace('\n', '\\n').replace('\r', '\\r'))
+    
+    def insert_data_to_db(self, table_definition, data, chunk_size=None, multi_row=None, defer_indexes=None,
+                          on_chunk=None):
+        """Insert synthetic data into the dynamic table in chunked bulk transactions
+        
+        ``on_chunk(rows_inserted)`` runs after each committed chunk.
+        """
+        table_name = table_definition['table_name']
+        field_names = [field['name'] for field in table_definition['fields_definition']]
+        
+        if chunk_size is None:
+            chunk_size = getattr(settings, 'BULK_INSERT_CHUNK_SIZE', 5000)
+        if multi_row is None:
+            multi_row = getattr(settings, 'BULK_INSERT_MULTI_ROW', False)
+        if defer_indexes is None:
+            defer_indexes = hasattr(data, '__len__') and self._should_defer_indexes(len(data))
+        
+        # The statement comes from the cached model; bulk_create() would run every value
+        # through the field's get_db_prep_save(), several times slower than executemany
+        insert_prefix, row_placeholder = self._insert_sql(model_registry.get(table_definition), field_names)
+        # Multi-row statements must stay under the backend's bound-parameter limit
+        rows_per_statement = max(1, self._max_query_params() // max(1, len(field_names)))
+        
+        total = 0
+        started = time.monotonic()
+        index_context = self.deferred_indexes(table_definition) if defer_indexes else nullcontext()
+        with bulk_load_profile(), index_context:
+            for chunk in self._chunked(data, chunk_size):
+                rows = [[self._db_value(record.get(field)) for field in field_names] for record in chunk]
+                # One transaction per chunk instead of one implicit (fsync'd) transaction per row
+                with transaction.atomic(), connection.cursor() as cursor:
+                    if multi_row:
+                        for start in range(0, len(rows), rows_per_statement):
+                            group = rows[start:start + rows_per_statement]
+                            cursor.execute(
+                                insert_prefix + ', '.join([row_placeholder] * len(group)),
+                                [value for row in group for value in row]
+                            )
+                    else:
+                        cursor.executemany(insert_prefix + row_placeholder, rows)
+                total += len(rows)
+                if on_chunk:
+                    on_chunk(total)
+        
+        elapsed = time.monotonic() - started
+        stats = {
+            'rows': total,
+            'seconds': round(elapsed, 3),
+            'rows_per_second': round(total / elapsed, 1) if elapsed > 0 else float(total),
+        }
+        logger.info("Inserted %(rows)s rows into %(table)s in %(seconds)ss (%(rows_per_second)s rows/s)",
+                    {**stats, 'table': table_name})
+        return stats
+    
+    def generate_into_db(self, table_definition, num_records, openai_api_key=None, start_row=0,
+                         chunk_size=None, on_chunk=None, stats=None):
+        """Stream generated chunks straight into the dynamic table, committing one chunk at a time
+        
+        ``on_chunk(rows_committed, rng_state)`` runs inside each chunk's transaction, so a
+        checkpoint written there commits atomically with the rows it describes.
+        ``stats`` (an ExportStats) times the generation and insert of each chunk.
+        """
+        if chunk_size is None:
+            chunk_size = getattr(settings, 'BULK_INSERT_CHUNK_SIZE', 5000)
+        
+        rows_committed = start_row
+        chunks = self.iter_synthetic_data(
+            table_definition, num_records - start_row, openai_api_key, chunk_size
+        )
+        if stats is not None:
+            chunks = stats.timed(chunks)
+        defer = self._should_defer_indexes(num_records - start_row)
+        index_context = self.deferred_indexes(table_definition) if defer else nullcontext()
+        # Entered outside the per-chunk transactions so synchronous can be relaxed
+        with bulk_load_profile(), index_context:
+            for chunk in chunks:
+                # The span includes the commit
+                with stats.span('insert') if stats else nullcontext(), transaction.atomic():
+                    self.insert_data_to_db(table_definition, chunk, chunk_size=len(chunk),
+                                           defer_indexes=False)
+                    rows_committed += len(chunk)
+                    if on_chunk:
+                        on_chunk(rows_committed, self.get_rng_state())
+        return rows_committed
+    
+    def backfill_columns(self, table_definition, field_names, openai_api_key=None, chunk_size=None,
+                         start_id=0, on_chunk=None):
+        """Fill the given (newly added) columns of every row past ``start_id`` with generated values
+        
+        ``on_chunk(rows_done, last_id)`` runs inside each chunk's transaction, so a
+        checkpoint written there commits with the rows it describes.
+        """
+        table_name = table_definition['table_name']
+        fields = [field for field in table_definition['fields_definition'] if field['name'] in field_names]
+        if not fields:
+            return {'rows': 0, 'seconds': 0.0, 'rows_per_second': 0}
+        if chunk_size is None:
+            chunk_size = getattr(settings, 'BULK_INSERT_CHUNK_SIZE', 5000)
+        
+        ai_generator = self._get_ai_generator(fields, openai_api_key)
+        model_class = model_registry.get(table_definition)
+        update_sql = self._update_sql(model_class, [field['name'] for field in fields])
+        rows_after = model_class.objects.order_by('pk').values_list('pk', flat=True)
+        
+        total, last_id = 0, start_id
+        started = time.monotonic()
+        with bulk_load_profile():
+            while True:
+                self.check_interrupted()
+                ids = list(rows_after.filter(pk__gt=last_id)[:chunk_size])
+                if not ids:
+                    break
+                rows = []
+                for row_id in ids:
+                    values = []
+                    for field_def in fields:
+                        value = self._generate_value(field_def, ai_generator)
+                        if field_def.get('options', {}).get('unique'):
+                            value = self._make_unique(field_def, value, ai_generator)
+                        values.append(self._db_value(value))
+                    rows.append(values + [row_id])
+                total += len(ids)
+                last_id = ids[-1]
+                with transaction.atomic():
+                    with connection.cursor() as cursor:
+                        cursor.executemany(update_sql, rows)
+                    if on_chunk:
+                        on_chunk(total, last_id)
+        
+        elapsed = time.monotonic() - started
+        stats = {
+            'rows': total,
+            'seconds': round(elapsed, 3),
+            'rows_per_second': int(total / elapsed) if elapsed > 0 else total,
+        }
+        logger.info("Backfilled %s on %s rows of %s in %.2fs (%s rows/s)",
+                    ', '.join(field_names), total, table_name, elapsed, stats['rows_per_second'])
+        return stats
+    
+    def _insert_sql(self, model_class, field_names):
+        """Return the INSERT prefix and one row's placeholder for a model's given fields"""
+        quote_name = connection.ops.quote_name
+        opts = model_class._meta
+        columns = ', '.join(quote_name(opts.get_field(name).column) for name in field_names)
+        row_placeholder = '(' + ', '.join(['%s'] * len(field_names)) + ')'
+        return f"INSERT INTO {quote_name(opts.db_table)} ({columns}) VALUES ", row_placeholder
+    
+    def _update_sql(self, model_class, field_names):
+        """Return an UPDATE of a model's given fields for one row, bound as (*values, pk)"""
+        quote_name = connection.ops.quote_name
+        opts = model_class._meta
+        assignments = ', '.join(f"{quote_name(opts.get_field(name).column)} = %s" for name in field_names)
+        return f"UPDATE {quote_name(opts.db_table)} SET {assignments} WHERE {quote_name(opts.pk.column)} = %s"
+    
+    def _max_query_params(self):
+        """Return how many bound parameters a single statement may use"""
+        if connection.vendor == 'sqlite':
+            connection.ensure_connection()
+            # Connection.getlimit() is available from Python 3.11
+            getlimit = getattr(connection.connection, 'getlimit', None)
+            if getlimit is not None:
+                return getlimit(sqlite3.SQLITE_LIMIT_VARIABLE_NUMBER)
+        return connection.features.max_query_params or 65535
+    
+    def _chunked(self, records, chunk_size):
+        """Yield lists of at most ``chunk_size`` records from any iterable"""
+        iterator = iter(records)
+        while True:
+            chunk = list(islice(iterator, chunk_size))
+            if not chunk:
+                return
+            yield chunk
+
+
+def schema_hash(table_definition):
+    """Return a short, stable hash of the parts of a definition that shape the model"""
+    schema = {
+        'fields_definition': table_definition['fields_definition'],
+        'indexes': table_definition.get('indexes') or [],
+    }
+    payload = json.dumps(schema, sort_keys=True, default=str)
+    return hashlib.sha256(payload.encode('utf-8')).hexdigest()[:16]
+
+
+class DynamicModelRegistry:
+    """Process-wide cache of dynamic model classes keyed by (table_name, schema hash)"""
+    
+    def __init__(self, apps_registry):
+        self.apps = apps_registry
+        self._models = {}
+        self._lock = threading.Lock()
+    
+    def get(self, table_definition):
+        """Return the model class for a definition, building it only when the schema changed"""
+        table_name = table_definition['table_name']
+        key = (table_name, schema_hash(table_definition))
+        with self._lock:
+            cached = self._models.get(table_name)
+            if cached is not None and cached[0] == key:
+                return cached[1]
+            if cached is not None:
+                self._unregister(cached[1])
+            model_class = DynamicModelGenerator().create_model_class(table_definition)
+            self._models[table_name] = (key, model_class)
+            return model_class
+    
+    def evict(self, table_name):
+        """Drop and unregister the cached model for a table, if there is one"""
+        with self._lock:
+            cached = self._models.pop(table_name, None)
+            if cached is not None:
+                self._unregister(cached[1])
+    
+    def clear(self):
+        """Drop every cached model"""
+        with self._lock:
+            for _, model_class in self._models.values():
+                self._unregister(model_class)
+            self._models.clear()
+    
+    def _unregister(self, model_class):
+        opts = model_class._meta
+        self.apps.all_models[opts.app_label].pop(opts.model_name, None)
+        self.apps.clear_cache()
+
+
+model_registry = DynamicModelRegistry(dynamic_apps)
+
+
+def ensure_dynamic_tables(apps, schema_editor):
+    """Migration step: create any dynamic table whose stored definition has no table yet"""
+    DynamicTableDefinition = apps.get_model('data_generator', 'DynamicTableDefinition')
+    existing = set(schema_editor.connection.introspection.table_names())
+    generator = DynamicModelGenerator()
+    for table_def in DynamicTableDefinition.objects.all():
+        if table_def.table_name in existing:
+            continue
+        generator.create_table({
+            'table_name': table_def.table_name,
+            'display_name': table_def.display_name,
+            'fields_definition': table_def.fields_definition,
+            'indexes': getattr(table_def, 'indexes', None) or [],
+        }, schema_editor)
@@ -0,0 +1,410 @@
+"""
+DB-backed generation queue: views enqueue exports and table changes, run_generation_worker processes claim and run them
+"""
+import hashlib
+import json
+import logging
+import os
+import socket
+import threading
+import time
+from contextlib import contextmanager
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import IntegrityError, connection, transaction
+from django.db.models import Exists, F, Q, Subquery, Sum, Value
+from django.db.models.functions import Coalesce
+from django.utils import timezone
+
+from .api_keys import forget_api_keys, job_api_key, store_api_key
+from .dynamic_models import GenerationInterrupted, GenerationYielded, schema_hash
+from .models import DynamicTableChange, DynamicTableExport, GenerationJob, GenerationProgress
+from .pipeline import build_table_definition, run_export, run_table_change
+from .scheduling import priority_for, schedule, within_llm_limit
+from .shards import (abort_sharded_job, claim_shard, discard_shard_files, next_shard_priority, read_shards,
+                     shard_parts, shard_size, shard_timings, split_job)
+from .stats import ExportStats
+
+logger = logging.getLogger(__name__)
+
+# How many queued jobs a worker looks at per claim attempt before giving up
+CLAIM_BATCH = 5
+# Tries at creating an export whose identical in-flight request keeps finishing under it
+CREATE_ATTEMPTS = 3
+
+
+def default_worker_id():
+    """Identify a worker process by host and pid"""
+    return f"{socket.gethostname()}:{os.getpid()}"
+
+
+def request_fingerprint(table_def, num_records, export_format, compression, seed, options, use_ai):
+    """Identify a generation request by everything that shapes its result
+
+    ``seed`` is the seed as submitted ('' when the server picks one), so
+    repeated seedless submissions of the same form match each other.
+    """
+    payload = json.dumps({
+        'table': table_def.pk,
+        'schema': schema_hash(build_table_definition(table_def)),
+        'num_records': num_records,
+        'export_format': export_format,
+        'compression': compression,
+        'seed': seed,
+        'options': options,
+        'use_ai': use_ai,
+    }, sort_keys=True, default=str)
+    return hashlib.sha256(payload.encode('utf-8')).hexdigest()
+
+
+def attach_to_inflight(fingerprint):
+    """Return the pending or processing export for an identical request, counting the attachment"""
+    export = DynamicTableExport.objects.filter(inflight_key=fingerprint).first()
+    if export is not None:
+        DynamicTableExport.objects.filter(pk=export.pk).update(coalesced_requests=F('coalesced_requests') + 1)
+    return export
+
+
+def create_or_attach_export(fingerprint, **fields):
+    """Create the export for a request unless an identical one got there first
+
+    The unique inflight_key makes this single-flight: of N concurrent identical
+    requests one creates the export and the rest attach to it. If the export
+    that got there first finishes before this request can attach to it, the
+    create is tried again. Returns (export, created).
+    """
+    for attempt in range(CREATE_ATTEMPTS):
+        try:
+            with transaction.atomic():
+                return DynamicTableExport.objects.create(inflight_key=fingerprint, **fields), True
+        except IntegrityError:
+            export = attach_to_inflight(fingerprint)
+            if export is not None:
+                return export, False
+            if attempt == CREATE_ATTEMPTS - 1:
+                raise
+
+
+def enqueue_export(export, options=None, openai_api_key='', requester='', estimate=None, priority=None):
+    """Queue an export for a worker and return the job
+
+    ``estimate`` is the admission cost estimate (see data_generator.admission);
+    it is charged to ``requester`` while the job is queued or running and, unless
+    ``priority`` is given, picks the job's priority class.
+    With settings.GENERATION_INLINE_JOBS the job is run right away in this
+    process instead (useful in development without a worker).
+    """
+    return _enqueue({'export': export}, export.num_records, options, openai_api_key, requester, estimate, priority)
+
+
+def enqueue_table_change(change, requester='', estimate=None):
+    """Queue a table change for a worker and return the job, admitted and scheduled like an export"""
+    return _enqueue({'table_change': change}, change.num_rows, None, '', requester, estimate, None)
+
+
+def _enqueue(target, rows_total, options, openai_api_key, requester, estimate, priority):
+    """Create the job for ``target`` ({'export': ...} or {'table_change': ...}) and reset its progress"""
+    estimate = estimate or {}
+    if priority is None:
+        priority = priority_for(estimate)
+    # Workers can't see the job before its key is stored
+    with transaction.atomic():
+        job = GenerationJob.objects.create(
+            **target, options=options or {}, requester=requester,
+            estimated_seconds=estimate.get('seconds', 0), estimated_ai_values=estimate.get('ai_values', 0),
+            priority=priority, queued_at=timezone.now(),
+        )
+        store_api_key(job.pk, openai_api_key)
+    GenerationProgress.objects.update_or_create(**target, defaults={
+        'current_step': 'queued',
+        'progress_percentage': 0,
+        'message': 'Waiting for a worker...',
+        'rows_done': 0,
+        'rows_total': rows_total,
+        'rows_per_second': 0,
+    })
+    [obj] = target.values()
+    type(obj).objects.filter(pk=obj.pk).update(status='pending')
+
+    if getattr(settings, 'GENERATION_INLINE_JOBS', False):
+        claimed = claim_job('inline', job_id=job.pk)
+        if claimed:
+            run_job(claimed)
+    return job
+
+
+def claim_job(worker_id, job_id=None):
+    """Atomically move the next queued job to running and return it (None if nothing can run)
+
+    Jobs are tried in data_generator.scheduling order. The claim is a
+    compare-and-set UPDATE on status, so concurrent workers can never both win
+    the same job. It also only succeeds while the estimated cost of running
+    jobs stays within settings.GENERATION_GLOBAL_BUDGET_SECONDS (a job that
+    exceeds the budget on its own runs once nothing else is running) and the
+    LLM concurrency limit allows it.
+    """
+    candidates = GenerationJob.objects.filter(status='queued')
+    if job_id is not None:
+        candidates = candidates.filter(pk=job_id)
+    now = timezone.now()
+    tried = 0
+    for pk in schedule(candidates):
+        claimable = within_llm_limit(_within_budget(GenerationJob.objects.filter(pk=pk, status='queued')))
+        if claimable.update(status='running', worker=worker_id, attempts=F('attempts') + 1,
+                            started_at=now, heartbeat_at=now):
+            return _start(pk, now)
+        tried += 1
+        if tried >= CLAIM_BATCH:
+            break
+    return None
+
+
+def claim_work(worker_id):
+    """Claim the next job or shard, whichever belongs to the more urgent priority class
+
+    Shards win ties: they finish exports that are already under way.
+    """
+    shard_priority = next_shard_priority()
+    if shard_priority is not None:
+        job_priority = GenerationJob.objects.filter(status='queued').order_by('priority').values_list(
+            'priority', flat=True).first()
+        if job_priority is None or shard_priority <= job_priority:
+            shard = claim_shard(worker_id)
+            if shard is not None:
+                return shard
+    return claim_job(worker_id) or claim_shard(worker_id)
+
+
+def _start(pk, now):
+    """Record queue wait and set the deadline of a just-claimed job"""
+    job = GenerationJob.objects.select_related('export__table_definition', 'table_change__table_definition').get(pk=pk)
+    job.wait_seconds += max(0.0, (now - (job.queued_at or job.created_at)).total_seconds())
+    # Time used in earlier slices counts against the job's time limit
+    timeout = job.options.get('timeout_seconds') or getattr(settings, 'GENERATION_JOB_TIMEOUT_SECONDS', 3600)
+    job.deadline_at = now + timedelta(seconds=max(0.0, int(timeout) - job.run_seconds))
+    job.save(update_fields=['wait_seconds', 'deadline_at'])
+    return job
+
+
+def _within_budget(jobs):
+    """Narrow ``jobs`` to those that fit next to the running jobs' estimated cost"""
+    budget = getattr(settings, 'GENERATION_GLOBAL_BUDGET_SECONDS', 1800)
+    if not budget:
+        return jobs
+    running = GenerationJob.objects.filter(status__in=GenerationJob.IN_PROGRESS_STATUSES)
+    # Group on a constant so the subquery sums every in-progress status into one row
+    running_seconds = Coalesce(
+        Subquery(running.order_by().annotate(grp=Value(1)).values('grp')
+                 .annotate(total=Sum('estimated_seconds')).values('total')),
+        Value(0.0),
+    )
+    return jobs.filter(Q(estimated_seconds__lte=Value(float(budget)) - running_seconds) | ~Exists(running))
+
+
+def run_job(job):
+    """Run a claimed job to completion, recording the outcome on the job
+
+    Large file exports are split into shards instead (see data_generator.shards);
+    once those are all generated the job comes back here to merge them.
+    """
+    openai_api_key = job_api_key(job.pk) or getattr(settings, 'OPENAI_API_KEY', '')
+    merging = job.export_id is not None and job.shards.exists()
+    shard_rows = None if merging or job.export_id is None else shard_size(job)
+    if shard_rows:
+        split_job(job, shard_rows)
+        return None
+    target = f'export #{job.export_id}' if job.export_id is not None else f'change #{job.table_change_id}'
+    logger.info("Worker %s %s job #%s (%s, attempt %s)", job.worker,
+                'merging shards of' if merging else 'running', job.pk, target, job.attempts)
+    try:
+        with heartbeat(job):
+            summary = _run_target(job, openai_api_key, merging)
+    except GenerationYielded:
+        logger.info("Job #%s yielded its worker after a time slice", job.pk)
+        _requeue(job)
+        return None
+    except GenerationInterrupted as e:
+        logger.info("Job #%s stopped early: %s", job.pk, e)
+        _finish(job, e.status, str(e))
+        return None
+    except Exception as e:
+        logger.exception("Job #%s failed", job.pk)
+        _finish(job, 'failed', str(e))
+        return None
+    finally:
+        if merging:
+            discard_shard_files(job)
+    _finish(job, 'completed')
+    return summary
+
+
+def _run_target(job, openai_api_key, merging):
+    """Run the job's table change, or its export (from the shards' output when ``merging``)"""
+    if job.export_id is None:
+        return run_table_change(job.table_change, openai_api_key, interrupt_check=JobInterruptCheck(job))
+    if merging and job.options.get('split'):
+        # Shards wrote the part files themselves; only the manifest is left to write
+        sharded = {'parts': shard_parts(job)}
+    else:
+        sharded = {'chunks': read_shards(job)} if merging else {}
+    if merging:
+        sharded['stats'] = ExportStats()
+        sharded['stats'].add_shards(*shard_timings(job))
+    return run_export(job.export, openai_api_key, job.options, interrupt_check=JobInterruptCheck(job), **sharded)
+
+
+def _finish(job, status, error_message=''):
+    # A job already failed by the timeout sweep keeps that outcome
+    GenerationJob.objects.filter(pk=job.pk, status='running').update(
+        status=status, error_message=error_message, finished_at=timezone.now(),
+    )
+    forget_api_keys([job.pk])
+
+
+def _requeue(job):
+    """Put a job that yielded back in the queue, behind the jobs already waiting"""
+    now = timezone.now()
+    GenerationJob.objects.filter(pk=job.pk, status='running').update(
+        status='queued', worker='', attempts=F('attempts') - 1, queued_at=now,
+        run_seconds=F('run_seconds') + (now - job.started_at).total_seconds(),
+    )
+
+
+class JobInterruptCheck:
+    """Stops a running job cooperatively once it is cancelled, past its deadline, or its time slice is up
+
+    Called by the generator between chunks and before every LLM call. The
+    cancel flag is read from the database at most every
+    settings.GENERATION_CANCEL_POLL_SECONDS. Resumable database loads also
+    yield their worker every GENERATION_JOB_SLICE_SECONDS while other jobs are
+    queued, so large loads run as a series of slices that small jobs slot between.
+    """
+
+    def __init__(self, job):
+        self.job_id = job.pk
+        self.deadline_at = job.deadline_at
+        self.poll_seconds = getattr(settings, 'GENERATION_CANCEL_POLL_SECONDS', 1.0)
+        self._next_poll = 0
+        self.slice_seconds = (
+            getattr(settings, 'GENERATION_JOB_SLICE_SECONDS', 60)
+            if job.export_id is not None and job.export.export_format == 'db' else 0
+        )
+        self._slice_ends = time.monotonic() + self.slice_seconds
+
+    def __call__(self):
+        if self.deadline_at and timezone.now() >= self.deadline_at:
+            raise GenerationInterrupted('failed', 'Timed out')
+        now = time.monotonic()
+        if now >= self._next_poll:
+            self._next_poll = now + self.poll_seconds
+            if GenerationJob.objects.filter(pk=self.job_id, cancel_requested=True).exists():
+                raise GenerationInterrupted('cancelled', 'Cancelled')
+        if self.slice_seconds and now >= self._slice_ends:
+            self._slice_ends = now + self.slice_seconds
+            if GenerationJob.objects.filter(status='queued').exists():
+                raise GenerationYielded('Paused to let other queued jobs run')
+
+
+def request_cancellation(target):
+    """Cancel the active job of an export or a table change
+
+    A queued or sharded job is cancelled on the spot (running shards stop at
+    their next check); a running one is flagged and stops at its worker's next
+    check. Returns 'cancelled', 'requested', or None when nothing was active.
+    """
+    now = timezone.now()
+    lookup = {'table_change': target} if isinstance(target, DynamicTableChange) else {'export': target}
+    jobs = GenerationJob.objects.filter(**lookup)
+    sharded = jobs.filter(status='sharded').first()
+    if sharded is not None and abort_sharded_job(sharded, 'cancelled', 'Cancelled'):
+        return 'cancelled'
+    queued = list(jobs.filter(status='queued').values_list('pk', flat=True))
+    if jobs.filter(pk__in=queued, status='queued').update(
+        status='cancelled', cancel_requested=True, finished_at=now,
+    ):
+        forget_api_keys(queued)
+        cancelled = {'status': 'cancelled', 'error_message': 'Cancelled before it started'}
+        if 'export' in lookup:
+            cancelled['inflight_key'] = None
+        type(target).objects.filter(pk=target.pk).update(**cancelled)
+        GenerationProgress.objects.filter(**lookup).update(
+            current_step='cancelled', message='Cancelled before it started', updated_at=now,
+        )
+        return 'cancelled'
+    if jobs.filter(status='running').update(cancel_requested=True):
+        return 'requested'
+    return None
+
+
+@contextmanager
+def heartbeat(job):
+    """Refresh the job's heartbeat from a background thread while it runs"""
+    interval = _lease_seconds() / 3
+    stop = threading.Event()
+
+    def beat():
+        try:
+            while not stop.wait(interval):
+                try:
+                    GenerationJob.objects.filter(pk=job.pk, status='running').update(heartbeat_at=timezone.now())
+                except Exception:
+                    logger.warning("Could not refresh heartbeat for job #%s", job.pk, exc_info=True)
+        finally:
+            connection.close()
+
+    thread = threading.Thread(target=beat, name=f'job-{job.pk}-heartbeat', daemon=True)
+    thread.start()
+    try:
+        yield
+    finally:
+        stop.set()
+        thread.join()
+
+
+def requeue_stale_jobs():
+    """Requeue running jobs whose worker stopped heartbeating; fail them after max attempts
+
+    Jobs still running a lease past their deadline (a worker stuck outside the
+    cooperative checks) are failed as timed out.
+
+    Returns (requeued, failed) counts.
+    """
+    now = timezone.now()
+    timed_out = list(GenerationJob.objects.filter(
+        status='running', deadline_at__lt=now - timedelta(seconds=_lease_seconds())
+    ).values_list('pk', 'export_id', 'table_change_id'))
+    _fail_jobs(timed_out, 'Timed out', now)
+
+    stale = GenerationJob.objects.filter(
+        status='running', heartbeat_at__lt=now - timedelta(seconds=_lease_seconds())
+    )
+    max_attempts = getattr(settings, 'GENERATION_JOB_MAX_ATTEMPTS', 3)
+
+    exhausted = list(stale.filter(attempts__gte=max_attempts).values_list('pk', 'export_id', 'table_change_id'))
+    failed = _fail_jobs(exhausted, 'Worker stopped responding', now) + len(timed_out)
+    requeued = stale.filter(attempts__lt=max_attempts).update(status='queued', worker='', queued_at=now)
+    if requeued or failed:
+        logger.warning("Requeued %s and failed %s stale or timed-out generation job(s)", requeued, failed)
+    return requeued, failed
+
+
+def _fail_jobs(jobs, message, now):
+    """Fail running jobs given as (pk, export_id, table_change_id) along with their exports or changes"""
+    if not jobs:
+        return 0
+    failed = GenerationJob.objects.filter(pk__in=[pk for pk, _, _ in jobs], status='running').update(
+        status='failed', error_message=message, finished_at=now,
+    )
+    forget_api_keys(pk for pk, _, _ in jobs)
+    DynamicTableExport.objects.filter(pk__in=[export_id for _, export_id, _ in jobs if export_id]).update(
+        status='failed', error_message=message, inflight_key=None,
+    )
+    DynamicTableChange.objects.filter(pk__in=[change_id for _, _, change_id in jobs if change_id]).update(
+        status='failed', error_message=message,
+    )
+    return failed
+
+
+def _lease_seconds():
+    return getattr(settings, 'GENERATION_JOB_LEASE_SECONDS', 120)
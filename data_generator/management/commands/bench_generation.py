@@ -0,0 +1,272 @@
+"""
+Generation benchmark suite: rows/s and peak memory for each part of the pipeline.
+
+Cases cover value generation per field type and per Faker provider, narrow
+versus wide schemas, every export writer, insert_data_to_db (on a throwaway
+test database) and the AI path against a local fake model, so no API key or
+network is needed. --save writes the results as a JSON baseline; --compare
+fails when a case's throughput falls more than --max-regression below it.
+"""
+import json
+import platform
+import statistics
+import tempfile
+import time
+import tracemalloc
+from datetime import datetime
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+
+from data_generator.dynamic_models import PARQUET_AVAILABLE, DynamicModelGenerator
+
+SUITES = ('fields', 'faker', 'schemas', 'exporters', 'insert', 'ai')
+
+# A field name no name heuristic matches, so the field's type decides its generator
+VALUE_FIELD = 'value'
+NARROW_FIELDS = [
+    {'name': 'title', 'type': 'string', 'options': {}},
+    {'name': 'amount', 'type': 'decimal', 'options': {}},
+    {'name': 'sold_on', 'type': 'date', 'options': {}},
+]
+MIXED_FIELDS = [
+    {'name': 'full_name', 'type': 'string', 'options': {}},
+    {'name': 'email', 'type': 'email', 'options': {}},
+    {'name': 'quantity', 'type': 'number', 'options': {}},
+    {'name': 'price', 'type': 'decimal', 'options': {}},
+    {'name': 'active', 'type': 'boolean', 'options': {}},
+    {'name': 'created', 'type': 'datetime', 'options': {}},
+    {'name': 'tier', 'type': 'choice', 'options': {'choices': ['bronze', 'silver', 'gold']}},
+    {'name': 'notes', 'type': 'text', 'options': {}},
+]
+WIDE_COLUMNS = 60
+# The wide schema generates this fraction of --rows, to keep its run time near the other cases'
+WIDE_ROWS_FRACTION = 0.1
+AI_FIELD = {'name': 'tagline', 'type': 'string', 'options': {'ai_description': 'A short marketing tagline'}}
+
+
+class FakeAIModel:
+    """Stands in for the LLM-backed AIDataGenerator: typed values after a fixed latency"""
+
+    def __init__(self, latency_seconds=0.0):
+        self.latency_seconds = latency_seconds
+        self.calls = 0
+
+    def generate_field_value(self, field_name, field_type, ai_description):
+        self.calls += 1
+        if self.latency_seconds:
+            time.sleep(self.latency_seconds)
+        if field_type in ('number', 'decimal'):
+            return self.calls
+        if field_type == 'boolean':
+            return self.calls % 2 == 0
+        return f'{field_name} {self.calls}'
+
+
+class BenchGenerator(DynamicModelGenerator):
+    """Generator whose AI path talks to a FakeAIModel"""
+
+    def __init__(self, seed=None, ai_model=None):
+        super().__init__(seed=seed)
+        self.ai_model = ai_model
+
+    def _get_ai_generator(self, fields_definition, openai_api_key):
+        if self.ai_model and any(field.get('options', {}).get('ai_description') for field in fields_definition):
+            return self.ai_model
+        return None
+
+
+def table(name, fields):
+    return {'table_name': name, 'display_name': name, 'fields_definition': fields, 'indexes': []}
+
+
+def wide_fields(columns=WIDE_COLUMNS):
+    types = list(DynamicModelGenerator.FIELD_TYPE_MAPPING)
+    return [{'name': f'col_{index}', 'type': types[index % len(types)], 'options': {}} for index in range(columns)]
+
+
+class Command(BaseCommand):
+    help = "Benchmark data generation, export writers and inserts; compare against a saved baseline"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--rows', type=int, default=5000, help='Rows per case')
+        parser.add_argument('--repeat', type=int, default=3, help='Timed runs per case (the median is reported)')
+        parser.add_argument('--suites', default=','.join(SUITES),
+                            help=f"Comma-separated suites to run ({', '.join(SUITES)})")
+        parser.add_argument('--seed', type=int, default=0)
+        parser.add_argument('--ai-rows', type=int, default=2000, help='Rows for the AI case')
+        parser.add_argument('--ai-latency-ms', type=float, default=0.0,
+                            help='Simulated latency of each fake model call')
+        parser.add_argument('--save', metavar='PATH', help='Write the results to PATH as a JSON baseline')
+        parser.add_argument('--compare', metavar='PATH', help='Compare against the JSON baseline at PATH')
+        parser.add_argument('--max-regression', type=float, default=0.2,
+                            help='With --compare, fail if a case is this fraction slower than its baseline')
+
+    def handle(self, *args, **options):
+        suites = [suite.strip() for suite in options['suites'].split(',') if suite.strip()]
+        unknown = set(suites) - set(SUITES)
+        if unknown:
+            raise CommandError(f"Unknown suite(s): {', '.join(sorted(unknown))}")
+        if options['rows'] < 1 or options['repeat'] < 1:
+            raise CommandError("--rows and --repeat must be at least 1")
+        baseline = self._load(options['compare']) if options['compare'] else None
+
+        self.rows = options['rows']
+        self.repeat = options['repeat']
+        self.seed = options['seed']
+        self.results = {}
+        for suite in suites:
+            getattr(self, f'_bench_{suite}')(options)
+
+        report = {
+            'created_at': datetime.now().isoformat(timespec='seconds'),
+            'python': platform.python_version(),
+            'rows': self.rows,
+            'repeat': self.repeat,
+            'cases': self.results,
+        }
+        regressions = self._print(report, baseline, options['max_regression'])
+        if options['save']:
+            with open(options['save'], 'w', encoding='utf-8') as f:
+                json.dump(report, f, indent=2)
+            self.stdout.write(f"Baseline written to {options['save']}")
+        if regressions:
+            raise CommandError(
+                f"{len(regressions)} case(s) slower than the baseline by more than "
+                f"{options['max_regression']:.0%}: {', '.join(regressions)}"
+            )
+        if baseline:
+            self.stdout.write(self.style.SUCCESS("No regressions against the baseline"))
+
+    # Suites
+
+    def _bench_fields(self, options):
+        for field_type in DynamicModelGenerator.FIELD_TYPE_MAPPING:
+            fields = [{'name': VALUE_FIELD, 'type': field_type, 'options': {}}]
+            self._measure(f'fields/{field_type}', self.rows, self._generate(table('bench', fields)))
+
+    def _bench_faker(self, options):
+        for faker_type in DynamicModelGenerator.FAKER_PROVIDERS:
+            fields = [{'name': VALUE_FIELD, 'type': 'string', 'options': {'faker_type': faker_type}}]
+            self._measure(f'faker/{faker_type}', self.rows, self._generate(table('bench', fields)))
+
+    def _bench_schemas(self, options):
+        for name, fields, rows in (('narrow', NARROW_FIELDS, self.rows), ('mixed', MIXED_FIELDS, self.rows),
+                                   ('wide', wide_fields(), max(1, int(self.rows * WIDE_ROWS_FRACTION)))):
+            self._measure(f'schemas/{name}_{len(fields)}', rows, self._generate(table('bench', fields), rows))
+
+    def _bench_exporters(self, options):
+        definition = table('bench_export', MIXED_FIELDS)
+        data = DynamicModelGenerator(seed=self.seed).generate_synthetic_data(definition, self.rows)
+        formats = [name for name in DynamicModelGenerator.EXPORT_FORMATS if name != 'parquet' or PARQUET_AVAILABLE]
+        with tempfile.TemporaryDirectory() as tmp:
+            for export_format in formats:
+                extension = DynamicModelGenerator.EXPORT_FORMATS[export_format]['extension']
+                path = f'{tmp}/bench.{extension}'
+
+                def write(export_format=export_format, path=path):
+                    DynamicModelGenerator(seed=self.seed).create_export_file(export_format, definition, data, path)
+
+                self._measure(f'exporters/{export_format}', self.rows, write)
+
+    def _bench_insert(self, options):
+        definition = table('bench_insert', MIXED_FIELDS)
+        generator = DynamicModelGenerator(seed=self.seed)
+        data = generator.generate_synthetic_data(definition, self.rows)
+        quoted_table = connection.ops.quote_name(definition['table_name'])
+
+        def insert():
+            with connection.cursor() as cursor:
+                cursor.execute(f"DELETE FROM {quoted_table}")
+            generator.insert_data_to_db(definition, data)
+
+        old_name = connection.settings_dict['NAME']
+        connection.creation.create_test_db(verbosity=0, autoclobber=True, serialize=False)
+        try:
+            with connection.schema_editor() as editor:
+                generator.create_table(definition, editor)
+            self._measure('insert/insert_data_to_db', self.rows, insert)
+        finally:
+            connection.creation.destroy_test_db(old_name, verbosity=0)
+
+    def _bench_ai(self, options):
+        rows = max(1, options['ai_rows'])
+        definition = table('bench_ai', MIXED_FIELDS + [AI_FIELD])
+        model = FakeAIModel(options['ai_latency_ms'] / 1000)
+
+        def generate():
+            generator = BenchGenerator(seed=self.seed, ai_model=model)
+            for _ in generator.iter_synthetic_data(definition, rows, openai_api_key='fake'):
+                pass
+
+        self._measure('ai/fake_model', rows, generate)
+
+    # Measurement
+
+    def _generate(self, definition, rows=None):
+        rows = rows or self.rows
+
+        def generate():
+            for _ in DynamicModelGenerator(seed=self.seed).iter_synthetic_data(definition, rows):
+                pass
+        return generate
+
+    def _measure(self, name, rows, run):
+        """Time ``run`` (median of --repeat runs), then run it once more under tracemalloc for peak memory"""
+        timings = []
+        for _ in range(self.repeat):
+            started = time.perf_counter()
+            run()
+            timings.append(time.perf_counter() - started)
+        seconds = statistics.median(timings)
+
+        tracemalloc.start()
+        try:
+            run()
+            _, peak = tracemalloc.get_traced_memory()
+        finally:
+            tracemalloc.stop()
+
+        self.results[name] = {
+            'rows': rows,
+            'seconds': round(seconds, 4),
+            'rows_per_second': round(rows / seconds, 1) if seconds > 0 else float(rows),
+            'peak_mib': round(peak / (1024 * 1024), 2),
+        }
+        self.stderr.write(f"  {name}: {self.results[name]['rows_per_second']:,.0f} rows/s")
+
+    # Reporting
+
+    def _load(self, path):
+        try:
+            with open(path, encoding='utf-8') as f:
+                return json.load(f)
+        except (OSError, ValueError) as e:
+            raise CommandError(f"Could not read baseline {path}: {e}")
+
+    def _print(self, report, baseline, max_regression):
+        """Print the results table; returns the names of cases that regressed"""
+        base_cases = baseline['cases'] if baseline else {}
+        if baseline and baseline.get('rows') != report['rows']:
+            self.stderr.write(self.style.WARNING(
+                f"Baseline was measured with --rows {baseline.get('rows')}, this run with {report['rows']}"
+            ))
+
+        regressions = []
+        header = f"{'case':<28} {'rows/s':>12} {'peak MiB':>9}"
+        if baseline:
+            header += f" {'baseline':>12} {'change':>8}"
+        self.stdout.write(header)
+        for name, result in report['cases'].items():
+            line = f"{name:<28} {result['rows_per_second']:>12,.0f} {result['peak_mib']:>9.2f}"
+            base = base_cases.get(name)
+            if base:
+                change = result['rows_per_second'] / base['rows_per_second'] - 1 if base['rows_per_second'] else 0
+                line += f" {base['rows_per_second']:>12,.0f} {change:>+8.1%}"
+                if change < -max_regression:
+                    regressions.append(name)
+                    line = self.style.ERROR(line)
+            elif baseline:
+                line += f" {'-':>12} {'new':>8}"
+            self.stdout.write(line)
+        return regressions
@@ -0,0 +1,171 @@
+"""
+Regression benchmark: ``migrate`` time must stay flat as dynamic tables accumulate.
+
+Runs against a throwaway test database with a temporary app whose migrations
+grow the way data_generator's used to: one RunSQL migration per dynamic table.
+At each step the chain is extended to the next table count and applied, a
+no-op ``migrate`` (graph load + plan) is timed, the chain is consolidated with
+consolidate_dynamic_migrations, migrated, finalized and ``migrate`` is timed again.
+"""
+import importlib
+import io
+import os
+import statistics
+import sys
+import tempfile
+import time
+from contextlib import contextmanager
+
+from django.conf import settings
+from django.core.management import call_command
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.db.migrations.loader import MigrationLoader
+from django.test.utils import override_settings
+
+from data_generator.dynamic_models import DynamicModelGenerator
+
+BENCH_APP = 'bench_dynamic_migrations'
+
+BENCH_FIELDS = [
+    {'name': 'name', 'type': 'string', 'options': {'indexed': True}},
+    {'name': 'amount', 'type': 'decimal', 'options': {}},
+    {'name': 'sold_on', 'type': 'date', 'options': {}},
+]
+
+# Laid out like the per-table migrations in data_generator/migrations (e.g. 0003_create_sell)
+MIGRATION_TEMPLATE = '''# Generated migration for dynamic table: {table_name}
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        {dependency!r},
+    ]
+
+    operations = [
+{operations}
+    ]
+'''
+OPERATION_TEMPLATE = '''        migrations.RunSQL(
+            {sql!r},
+            reverse_sql={reverse_sql}
+        ),'''
+
+
+class Command(BaseCommand):
+    help = "Check that migrate time stays flat as the number of dynamic tables grows"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--tables', default='10,100,1000',
+                            help='Comma-separated dynamic table counts to measure at')
+        parser.add_argument('--repeat', type=int, default=3,
+                            help='migrate runs per step (the median is reported)')
+        parser.add_argument('--max-growth', type=float, default=2.0,
+                            help='Fail if migrate after consolidating at the largest count is slower '
+                                 'than at the smallest by this factor')
+
+    def handle(self, *args, **options):
+        counts = sorted({int(count) for count in options['tables'].split(',') if count.strip()})
+        if not counts or counts[0] < 1:
+            raise CommandError("--tables needs at least one positive count")
+
+        old_name = connection.settings_dict['NAME']
+        connection.creation.create_test_db(verbosity=0, autoclobber=True, serialize=False)
+        try:
+            with tempfile.TemporaryDirectory() as tmp, self._bench_app(tmp) as migrations_dir:
+                results = self._run(counts, max(1, options['repeat']), migrations_dir)
+        finally:
+            connection.creation.destroy_test_db(old_name, verbosity=0)
+
+        self.stdout.write(f"{'tables':>8} {'chain nodes':>12} {'chain ms':>9} "
+                          f"{'snapshot nodes':>15} {'snapshot ms':>12}")
+        for count, chain, snapshot in results:
+            self.stdout.write(f"{count:>8} {chain[0]:>12} {chain[1] * 1000:>9.1f} "
+                              f"{snapshot[0]:>15} {snapshot[1] * 1000:>12.1f}")
+
+        first, last = results[0][2][1], results[-1][2][1]
+        growth = last / first if first else 1.0
+        if growth > options['max_growth']:
+            raise CommandError(
+                f"migrate after consolidating slowed down {growth:.2f}x from {counts[0]} to {counts[-1]} "
+                f"tables (limit {options['max_growth']}x)"
+            )
+        self.stdout.write(self.style.SUCCESS(f"migrate time growth after consolidating {growth:.2f}x"))
+
+    @contextmanager
+    def _bench_app(self, root):
+        """Install an empty app under ``root`` for the duration; yields its migrations directory"""
+        migrations_dir = os.path.join(root, BENCH_APP, 'migrations')
+        os.makedirs(migrations_dir)
+        for package in (os.path.dirname(migrations_dir), migrations_dir):
+            open(os.path.join(package, '__init__.py'), 'w').close()
+
+        sys.path.insert(0, root)
+        try:
+            with override_settings(INSTALLED_APPS=[*settings.INSTALLED_APPS, BENCH_APP]):
+                yield migrations_dir
+        finally:
+            sys.path.remove(root)
+            for module in [name for name in sys.modules if name.split('.')[0] == BENCH_APP]:
+                del sys.modules[module]
+
+    def _run(self, counts, repeat, migrations_dir):
+        generator = DynamicModelGenerator()
+        created = 0
+        results = []
+        for count in counts:
+            # Each new table is another link after the current leaf, as makemigrations would write it
+            leaf = MigrationLoader(None, ignore_no_migrations=True).graph.leaf_nodes(BENCH_APP)
+            dependency = leaf[0] if leaf else MigrationLoader(None).graph.leaf_nodes('data_generator')[0]
+            for index in range(created, count):
+                dependency = self._write_migration(generator, migrations_dir, index, dependency)
+            created = count
+            self._forget_migrations()
+            call_command('migrate', verbosity=0, interactive=False)
+            chain = self._time_migrate(repeat)
+
+            call_command('consolidate_dynamic_migrations', BENCH_APP, stdout=io.StringIO())
+            self._forget_migrations()
+            call_command('migrate', verbosity=0, interactive=False)
+            call_command('consolidate_dynamic_migrations', BENCH_APP, finalize=True, stdout=io.StringIO())
+            self._forget_migrations()
+            snapshot = self._time_migrate(repeat)
+            results.append((count, chain, snapshot))
+        return results
+
+    def _forget_migrations(self):
+        """Make the next MigrationLoader read the bench app's migration files from disk again"""
+        importlib.invalidate_caches()
+        prefix = f'{BENCH_APP}.migrations.'
+        for module in [name for name in sys.modules if name.startswith(prefix)]:
+            del sys.modules[module]
+
+    def _write_migration(self, generator, migrations_dir, index, dependency):
+        """Write the per-table migration for bench table ``index``; returns its graph key"""
+        table_name = f'bench_table_{index}'
+        definition = {'table_name': table_name, 'fields_definition': BENCH_FIELDS}
+        operations = [OPERATION_TEMPLATE.format(
+            sql=f"CREATE TABLE IF NOT EXISTS {table_name} ({generator._generate_sql_fields(BENCH_FIELDS)})",
+            reverse_sql=repr(f"DROP TABLE IF EXISTS {table_name}"),
+        )] + [
+            # Dropping the table drops its indexes
+            OPERATION_TEMPLATE.format(sql=statement, reverse_sql='migrations.RunSQL.noop')
+            for statement in generator._generate_index_sql(definition)
+        ]
+        name = f'{index + 1:04d}_create_{table_name}'
+        with open(os.path.join(migrations_dir, f'{name}.py'), 'w', encoding='utf-8') as f:
+            f.write(MIGRATION_TEMPLATE.format(table_name=table_name, dependency=dependency,
+                                              operations='\n'.join(operations)))
+        return (BENCH_APP, name)
+
+    def _time_migrate(self, repeat):
+        """Median seconds of a no-op migrate, and the number of nodes in the migration graph"""
+        timings = []
+        for _ in range(repeat):
+            started = time.perf_counter()
+            call_command('migrate', verbosity=0, interactive=False)
+            timings.append(time.perf_counter() - started)
+        nodes = len(MigrationLoader(connection).graph.nodes)
+        return nodes, statistics.median(timings)
@@ -0,0 +1,200 @@
+"""
+Squash data_generator's migration chain into one snapshot migration.
+
+The per-table ``RunSQL`` migrations written before tables were created with
+schema_editor DDL are dropped from the snapshot; a single ``RunPython`` step
+creates whatever tables the stored definitions describe instead.
+"""
+import os
+import re
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import DEFAULT_DB_ALIAS, connections, migrations
+from django.db.migrations.loader import MigrationLoader
+from django.db.migrations.migration import SwappableTuple
+from django.db.migrations.operations.fields import FieldOperation
+from django.db.migrations.operations.models import ModelOperation
+from django.db.migrations.optimizer import MigrationOptimizer
+from django.db.migrations.recorder import MigrationRecorder
+from django.db.migrations.writer import MigrationWriter
+
+from data_generator.dynamic_models import ensure_dynamic_tables
+
+APP_LABEL = 'data_generator'
+
+DROP_TABLE_RE = re.compile(r'^DROP TABLE (?:IF EXISTS )?"?(\w+)"?$', re.IGNORECASE)
+
+
+def is_dynamic_table_operation(operation):
+    """Whether an operation only creates a dynamic table (or its indexes)"""
+    if isinstance(operation, migrations.RunPython):
+        return operation.code is ensure_dynamic_tables
+    if isinstance(operation, migrations.RunSQL):
+        sql = operation.sql if isinstance(operation.sql, str) else ' '.join(map(str, operation.sql))
+        statement = ' '.join(sql.split()).upper()
+        return statement.startswith(('CREATE TABLE', 'CREATE INDEX', 'CREATE UNIQUE INDEX'))
+    return False
+
+
+def dropped_tables(operation):
+    """Tables a RunSQL operation drops, if dropping tables is all it does"""
+    if not isinstance(operation, migrations.RunSQL) or not isinstance(operation.sql, str):
+        return set()
+    statements = [' '.join(statement.split()) for statement in operation.sql.split(';') if statement.strip()]
+    matches = [DROP_TABLE_RE.match(statement) for statement in statements]
+    if not matches or not all(matches):
+        return set()
+    return {match.group(1).lower() for match in matches}
+
+
+def state_only_dropped_models(operations, app_label):
+    """Turn models whose tables are later dropped with raw SQL into state-only operations
+
+    In a single snapshot migration the schema editor would still try to run the
+    deferred SQL (e.g. FK indexes) of those models after their tables are gone.
+    """
+    created = {}
+    for operation in operations:
+        if isinstance(operation, migrations.CreateModel):
+            db_table = operation.options.get('db_table') or f'{app_label}_{operation.name_lower}'
+            created[db_table.lower()] = operation.name_lower
+
+    dropped = set()
+    for operation in operations:
+        dropped.update(created[table] for table in dropped_tables(operation) if table in created)
+    if not dropped:
+        return operations
+
+    result = []
+    for operation in operations:
+        tables = dropped_tables(operation)
+        if tables and all(created.get(table) in dropped for table in tables):
+            continue
+        if isinstance(operation, (ModelOperation, FieldOperation)) and any(
+            operation.references_model(name, app_label) for name in dropped
+        ):
+            operation = migrations.SeparateDatabaseAndState(state_operations=[operation])
+        result.append(operation)
+    return result
+
+
+class Command(BaseCommand):
+    help = "Consolidate data_generator migrations (including per-table RunSQL ones) into one snapshot"
+
+    def add_arguments(self, parser):
+        parser.add_argument('app_label', nargs='?', default=APP_LABEL,
+                            help='App whose migrations to consolidate')
+        parser.add_argument('--name', default='dynamic_snapshot',
+                            help='Suffix for the snapshot migration name')
+        parser.add_argument('--dry-run', action='store_true',
+                            help='Report what would be consolidated without writing anything')
+        parser.add_argument('--delete-replaced', action='store_true',
+                            help='Delete the replaced migration files (only once every database has migrated)')
+        parser.add_argument('--finalize', action='store_true',
+                            help='Turn an applied snapshot into a plain migration: delete the replaced files, '
+                                 'drop its replaces list and their history rows (once every database has migrated)')
+        parser.add_argument('--database', default=DEFAULT_DB_ALIAS,
+                            help='Database whose applied migrations are used to resolve the graph')
+
+    def handle(self, *args, **options):
+        app_label = options['app_label']
+        loader = MigrationLoader(connections[options['database']])
+        leaves = loader.graph.leaf_nodes(app_label)
+        if len(leaves) != 1:
+            raise CommandError(
+                f"{app_label} has {len(leaves)} leaf migrations; run 'makemigrations --merge' first"
+            )
+        leaf = leaves[0]
+
+        to_squash = [
+            loader.get_migration(label, name)
+            for label, name in loader.graph.forwards_plan(leaf)
+            if label == app_label
+        ]
+        if len(to_squash) < 2:
+            self.stdout.write("Nothing to consolidate.")
+            if to_squash and to_squash[0].replaces:
+                if options['delete_replaced'] or options['finalize']:
+                    self._delete_replaced(to_squash[0])
+                if options['finalize']:
+                    self._finalize(to_squash[0], connections[options['database']])
+            return
+        if options['finalize']:
+            raise CommandError(f"{leaf[1]} is not a snapshot yet; consolidate and migrate before --finalize")
+
+        replaces, operations, dependencies = [], [], set()
+        dynamic_count = 0
+        for migration in to_squash:
+            replaces.extend(migration.replaces or [(migration.app_label, migration.name)])
+            for operation in migration.operations:
+                if is_dynamic_table_operation(operation):
+                    dynamic_count += 1
+                else:
+                    operations.append(operation)
+            for dependency in migration.dependencies:
+                if isinstance(dependency, SwappableTuple):
+                    if settings.AUTH_USER_MODEL == dependency.setting:
+                        dependencies.add(('__setting__', 'AUTH_USER_MODEL'))
+                    else:
+                        dependencies.add(dependency)
+                elif dependency[0] != app_label:
+                    dependencies.add(dependency)
+
+        optimized = state_only_dropped_models(MigrationOptimizer().optimize(operations, app_label), app_label)
+        optimized.append(migrations.RunPython(ensure_dynamic_tables, migrations.RunPython.noop))
+
+        number = leaf[1].split('_', 1)[0]
+        name = f"0001_squashed_{number}_{options['name']}"
+        snapshot = type('Migration', (migrations.Migration,), {
+            'dependencies': sorted(dependencies),
+            'operations': optimized,
+            'replaces': replaces,
+            'initial': True,
+        })(name, app_label)
+        writer = MigrationWriter(snapshot)
+
+        self.stdout.write(
+            f"{len(to_squash)} migrations ({dynamic_count} dynamic-table operations, "
+            f"{len(operations)} model operations optimized to {len(optimized) - 1}) -> {name}"
+        )
+        if options['dry_run']:
+            return
+
+        with open(writer.path, 'w', encoding='utf-8') as f:
+            f.write(writer.as_string())
+        self.stdout.write(self.style.SUCCESS(f"Wrote {writer.path}"))
+
+        if options['delete_replaced']:
+            # An earlier snapshot folded into this one goes too; its replaces carried over
+            earlier = [migration.name for migration in to_squash if migration.replaces]
+            self._delete_replaced(snapshot, earlier)
+
+    def _delete_replaced(self, snapshot, earlier_snapshots=()):
+        """Remove the files of the migrations a snapshot replaces"""
+        migrations_dir = os.path.dirname(MigrationWriter(snapshot).path)
+        deleted = 0
+        for name in [name for _, name in snapshot.replaces] + list(earlier_snapshots):
+            path = os.path.join(migrations_dir, f'{name}.py')
+            if os.path.exists(path):
+                os.remove(path)
+                deleted += 1
+        self.stdout.write(f"Deleted {deleted} replaced migration files")
+
+    def _finalize(self, snapshot, connection):
+        """Drop a snapshot's replaces list and the replaced migrations' rows from django_migrations
+
+        Every migrate otherwise reads one history row per replaced migration, so
+        migrate time keeps growing with the number of tables ever created.
+        """
+        recorder = MigrationRecorder(connection)
+        if (snapshot.app_label, snapshot.name) not in recorder.applied_migrations():
+            raise CommandError(f"{snapshot.name} is not applied on this database; run migrate first")
+
+        replaced = [name for app_label, name in snapshot.replaces if app_label == snapshot.app_label]
+        snapshot.replaces = []
+        writer = MigrationWriter(snapshot)
+        with open(writer.path, 'w', encoding='utf-8') as f:
+            f.write(writer.as_string())
+        deleted, _ = recorder.migration_qs.filter(app=snapshot.app_label, name__in=replaced).delete()
+        self.stdout.write(f"{snapshot.name} is now a plain migration; removed {deleted} history rows")
@@ -0,0 +1,168 @@
+"""
+Headless generation: stream a dynamic table's synthetic rows to a file or stdout.
+
+Runs the generator directly, without exports, progress rows or the request
+limits. Rows are generated in blocks of BLOCK_ROWS, each with a seed derived
+from --seed, so --workers processes can generate blocks in parallel while the
+output stays in order and identical for any worker count.
+"""
+import os
+import sys
+import time
+from collections import deque
+from itertools import chain
+from multiprocessing import Pool
+
+import django
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from data_generator.admission import FORMAT_MAX_ROWS
+from data_generator.dynamic_models import PARQUET_AVAILABLE, DynamicModelGenerator
+from data_generator.models import DynamicTableDefinition
+from data_generator.pipeline import build_table_definition, new_seed
+from data_generator.shards import shard_seed
+
+FORMATS = ('csv', 'jsonl', 'parquet', 'xlsx', 'sql', 'sqlite')
+# Written by reopening the file, so they can't go to stdout
+PATH_ONLY_FORMATS = ('sqlite',)
+BLOCK_ROWS = 10000
+
+
+def generate_block(table_definition, num_rows, seed):
+    """Generate one block of rows (runs in a worker process)"""
+    return DynamicModelGenerator(seed=seed).generate_synthetic_data(table_definition, num_rows)
+
+
+class Command(BaseCommand):
+    help = "Generate synthetic rows for a dynamic table to a file or stdout, without the web UI"
+
+    def add_arguments(self, parser):
+        parser.add_argument('table', help='Table name or id')
+        parser.add_argument('--rows', type=int, required=True, help='Number of rows to generate')
+        parser.add_argument('--format', choices=FORMATS, default='csv')
+        parser.add_argument('--workers', type=int, default=1, help='Processes generating rows in parallel')
+        parser.add_argument('--seed', type=int, default=None,
+                            help='Seed for reproducible output (a random one is used and reported when omitted)')
+        parser.add_argument('--out', default='-', help="Output file, or '-' for stdout")
+        parser.add_argument('--ai', action='store_true',
+                            help='Ask the LLM (OPENAI_API_KEY) for fields with an AI description; runs in one process')
+        parser.add_argument('--quiet', action='store_true', help='No progress on stderr')
+
+    def handle(self, *args, **options):
+        table_def = self._get_table(options['table'])
+        num_rows, export_format, out = options['rows'], options['format'], options['out']
+        if num_rows < 1:
+            raise CommandError("--rows must be at least 1")
+        if out == '-' and export_format in PATH_ONLY_FORMATS:
+            raise CommandError(f"{export_format} output needs --out PATH")
+        max_rows = FORMAT_MAX_ROWS.get(export_format)
+        if max_rows and num_rows > max_rows:
+            raise CommandError(f"{export_format} files hold at most {max_rows:,} rows")
+        if export_format == 'parquet' and not PARQUET_AVAILABLE:
+            raise CommandError("parquet output requires the 'pyarrow' package")
+
+        table_definition = build_table_definition(table_def)
+        seed = options['seed'] if options['seed'] is not None else new_seed()
+        openai_api_key = getattr(settings, 'OPENAI_API_KEY', '') if options['ai'] else None
+        if options['ai'] and not openai_api_key:
+            raise CommandError("--ai needs OPENAI_API_KEY to be set")
+        workers = max(1, options['workers'])
+
+        # Unique fields need one generator to keep values distinct, and LLM calls stay sequential
+        single_stream = bool(openai_api_key) or any(
+            field.get('options', {}).get('unique') for field in table_definition['fields_definition']
+        )
+        if single_stream:
+            if workers > 1:
+                self.stderr.write("Unique or AI fields: generating in a single process")
+            chunks = DynamicModelGenerator(seed=seed).iter_synthetic_data(table_definition, num_rows, openai_api_key)
+        else:
+            chunks = self._blocks(table_definition, num_rows, seed, workers)
+
+        throughput = Throughput(self.stderr, num_rows, quiet=options['quiet'])
+        data = chain.from_iterable(throughput.track(chunks))
+        if out == '-':
+            binary = export_format in DynamicModelGenerator.BINARY_FORMATS
+            output = sys.stdout.buffer if binary else sys.stdout
+        else:
+            output = out
+
+        try:
+            DynamicModelGenerator(seed=seed).create_export_file(export_format, table_definition, data, output)
+            if out == '-':
+                output.flush()
+        except BrokenPipeError:
+            # The reader went away (e.g. piped into head); not an error. Point stdout at
+            # devnull so the interpreter's final flush doesn't raise again.
+            os.dup2(os.open(os.devnull, os.O_WRONLY), sys.stdout.fileno())
+            return
+        throughput.finish(seed, out)
+
+    def _get_table(self, name_or_id):
+        lookup = {'pk': int(name_or_id)} if name_or_id.isdigit() else {'table_name': name_or_id}
+        try:
+            return DynamicTableDefinition.objects.get(**lookup)
+        except DynamicTableDefinition.DoesNotExist:
+            raise CommandError(f"No dynamic table {name_or_id!r}")
+
+    def _blocks(self, table_definition, num_rows, seed, workers):
+        """Yield row blocks in order, generated in ``workers`` processes"""
+        blocks = [
+            (table_definition, min(BLOCK_ROWS, num_rows - start), shard_seed(seed, index))
+            for index, start in enumerate(range(0, num_rows, BLOCK_ROWS))
+        ]
+        if workers == 1:
+            for block in blocks:
+                yield generate_block(*block)
+            return
+
+        # Keep a bounded number of blocks in flight so a slow writer doesn't buffer the whole output
+        with Pool(workers, initializer=django.setup) as pool:
+            pending = deque()
+            for block in blocks:
+                pending.append(pool.apply_async(generate_block, block))
+                if len(pending) >= workers * 2:
+                    yield pending.popleft().get()
+            while pending:
+                yield pending.popleft().get()
+
+
+class Throughput:
+    """Rows written, rows/s and ETA on stderr: redrawn in place on a terminal, a line every few seconds otherwise"""
+
+    def __init__(self, stderr, total, quiet=False):
+        self.stderr = stderr
+        self.total = total
+        self.quiet = quiet
+        self.interactive = stderr.isatty()
+        self.interval = 0.5 if self.interactive else 5.0
+        self.rows = 0
+        self.started = self._last = time.monotonic()
+
+    def track(self, chunks):
+        for chunk in chunks:
+            yield chunk
+            self.rows += len(chunk)
+            if not self.quiet and time.monotonic() - self._last >= self.interval:
+                self._report()
+
+    def _report(self):
+        self._last = time.monotonic()
+        rate = self.rows / (self._last - self.started) if self._last > self.started else 0
+        eta = f"{(self.total - self.rows) / rate:.0f}s" if rate else '?'
+        line = f"{self.rows:,}/{self.total:,} rows  {rate:,.0f} rows/s  ETA {eta}"
+        if self.interactive:
+            self.stderr.write(f"\r{line}", ending='')
+        else:
+            self.stderr.write(line)
+
+    def finish(self, seed, out):
+        if self.quiet:
+            return
+        elapsed = time.monotonic() - self.started
+        rate = self.rows / elapsed if elapsed else 0
+        if self.interactive:
+            self.stderr.write('\r', ending='')
+        self.stderr.write(f"{self.rows:,} rows in {elapsed:.1f}s ({rate:,.0f} rows/s), seed {seed}"
+                          + ('' if out == '-' else f", written to {out}"))
@@ -0,0 +1,62 @@
+"""
+Worker process for the generation queue (see data_generator.jobs).
+"""
+import signal
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.db import close_old_connections
+
+from data_generator.jobs import claim_work, default_worker_id, requeue_stale_jobs, run_job
+from data_generator.models import GenerationShard
+from data_generator.shards import requeue_stale_shards, run_shard
+
+
+class Command(BaseCommand):
+    help = "Claim and run queued generation jobs and shards"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--worker-id', default=None,
+                            help='Name recorded on claimed jobs (defaults to host:pid)')
+        parser.add_argument('--poll', type=float, default=None,
+                            help='Seconds to sleep when the queue is empty')
+        parser.add_argument('--once', action='store_true',
+                            help='Run at most one job or shard, then exit')
+        parser.add_argument('--burst', action='store_true',
+                            help='Exit as soon as the queue is empty')
+
+    def handle(self, *args, **options):
+        worker_id = options['worker_id'] or default_worker_id()
+        poll = options['poll'] or getattr(settings, 'GENERATION_WORKER_POLL_SECONDS', 1.0)
+        self.stopping = False
+        signal.signal(signal.SIGTERM, self._stop)
+        signal.signal(signal.SIGINT, self._stop)
+
+        self.stdout.write(f"Generation worker {worker_id} started")
+        processed = 0
+        while not self.stopping:
+            close_old_connections()
+            requeue_stale_jobs()
+            requeue_stale_shards()
+            work = claim_work(worker_id)
+            if work is None:
+                if options['once'] or options['burst']:
+                    break
+                time.sleep(poll)
+                continue
+
+            if isinstance(work, GenerationShard):
+                run_shard(work)
+            else:
+                run_job(work)
+            processed += 1
+            if options['once']:
+                break
+
+        close_old_connections()
+        self.stdout.write(f"Generation worker {worker_id} stopped after {processed} job(s) and shard(s)")
+
+    def _stop(self, signum, frame):
+        # Finish the current job or shard, then exit
+        self.stopping = True
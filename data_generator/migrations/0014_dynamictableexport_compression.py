@@ -0,0 +1,18 @@
+# Generated by Django 5.2.5 on 2026-10-19 12:41
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('data_generator', '0013_create_testcars'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='dynamictableexport',
+            name='compression',
+            field=models.CharField(blank=True, choices=[('', 'None'), ('gzip', 'gzip'), ('zstd', 'zstd')], default='', max_length=10),
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.2.5 on 2026-10-19 12:43
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('data_generator', '0014_dynamictableexport_compression'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='dynamictableexport',
+            name='export_format',
+            field=models.CharField(choices=[('xlsx', 'Excel (.xlsx)'), ('sql', 'SQL dump (.sql)')], default='xlsx', max_length=10),
+        ),
+    ]
@@ -0,0 +1,33 @@
+# Generated by Django 5.2.5 on 2026-10-19 12:45
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('data_generator', '0016_alter_dynamictableexport_export_format'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='dynamictableexport',
+            name='checkpoint',
+            field=models.JSONField(blank=True, help_text='Last committed row and RNG state', null=True),
+        ),
+        migrations.AddField(
+            model_name='dynamictableexport',
+            name='rows_committed',
+            field=models.PositiveBigIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='dynamictableexport',
+            name='seed',
+            field=models.BigIntegerField(blank=True, null=True),
+        ),
+        migrations.AlterField(
+            model_name='dynamictableexport',
+            name='export_format',
+            field=models.CharField(choices=[('xlsx', 'Excel (.xlsx)'), ('sql', 'SQL dump (.sql)'), ('sqlite', 'SQLite database (.sqlite3)'), ('db', 'Database only (no file)')], default='xlsx', max_length=10),
+        ),
+    ]
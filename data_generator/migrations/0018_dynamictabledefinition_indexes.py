@@ -0,0 +1,18 @@
+# Generated by Django 5.2.5 on 2026-10-19 12:48
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('data_generator', '0017_dynamictableexport_checkpoint'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='dynamictabledefinition',
+            name='indexes',
+            field=models.JSONField(blank=True, default=list, help_text="Composite indexes: [{'fields': [...], 'unique': bool}]"),
+        ),
+    ]
@@ -0,0 +1,38 @@
+# Generated by Django 5.2.5 on 2026-10-19 13:01
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('data_generator', '0018_dynamictabledefinition_indexes'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='GenerationJob',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('status', models.CharField(choices=[('queued', 'Queued'), ('running', 'Running'), ('completed', 'Completed'), ('failed', 'Failed')], default='queued', max_length=20)),
+                ('options', models.JSONField(blank=True, default=dict, help_text='Options passed to run_export')),
+                ('api_key', models.CharField(blank=True, help_text='OpenAI key given with the request; cleared when the job finishes', max_length=255)),
+                ('attempts', models.PositiveIntegerField(default=0)),
+                ('worker', models.CharField(blank=True, max_length=100)),
+                ('heartbeat_at', models.DateTimeField(blank=True, null=True)),
+                ('error_message', models.TextField(blank=True)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('started_at', models.DateTimeField(blank=True, null=True)),
+                ('finished_at', models.DateTimeField(blank=True, null=True)),
+                ('export', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='jobs', to='data_generator.dynamictableexport')),
+            ],
+            options={
+                'ordering': ['created_at'],
+            },
+        ),
+        migrations.AddIndex(
+            model_name='generationjob',
+            index=models.Index(fields=['status', 'created_at'], name='data_genera_status_279664_idx'),
+        ),
+    ]
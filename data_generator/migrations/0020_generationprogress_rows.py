@@ -0,0 +1,28 @@
+# Generated by Django 5.2.5 on 2026-10-19 13:05
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('data_generator', '0019_generationjob'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='generationprogress',
+            name='rows_done',
+            field=models.PositiveBigIntegerField(default=0, help_text='Rows finished in the current step'),
+        ),
+        migrations.AddField(
+            model_name='generationprogress',
+            name='rows_per_second',
+            field=models.FloatField(default=0),
+        ),
+        migrations.AddField(
+            model_name='generationprogress',
+            name='rows_total',
+            field=models.PositiveBigIntegerField(default=0),
+        ),
+    ]
@@ -0,0 +1,28 @@
+# Generated by Django 5.2.5 on 2026-10-19 13:08
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('data_generator', '0020_generationprogress_rows'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='generationjob',
+            name='estimated_ai_values',
+            field=models.PositiveIntegerField(default=0, help_text='Admission estimate of LLM-generated values'),
+        ),
+        migrations.AddField(
+            model_name='generationjob',
+            name='estimated_seconds',
+            field=models.FloatField(default=0, help_text='Admission estimate of worker time'),
+        ),
+        migrations.AddField(
+            model_name='generationjob',
+            name='requester',
+            field=models.CharField(blank=True, db_index=True, help_text="User or client the job's cost is charged to", max_length=100),
+        ),
+    ]
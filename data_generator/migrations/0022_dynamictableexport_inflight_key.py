@@ -0,0 +1,23 @@
+# Generated by Django 5.2.5 on 2026-10-19 13:09
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('data_generator', '0021_generationjob_cost'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='dynamictableexport',
+            name='coalesced_requests',
+            field=models.PositiveIntegerField(default=0, help_text='Identical requests attached to this export'),
+        ),
+        migrations.AddField(
+            model_name='dynamictableexport',
+            name='inflight_key',
+            field=models.CharField(blank=True, help_text='Request fingerprint while the export is pending or processing', max_length=64, null=True, unique=True),
+        ),
+    ]
@@ -0,0 +1,33 @@
+# Generated by Django 5.2.5 on 2026-10-19 13:11
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('data_generator', '0022_dynamictableexport_inflight_key'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='generationjob',
+            name='cancel_requested',
+            field=models.BooleanField(default=False, help_text='Set by the cancel endpoint; the worker stops at its next check'),
+        ),
+        migrations.AddField(
+            model_name='generationjob',
+            name='deadline_at',
+            field=models.DateTimeField(blank=True, help_text='Wall-clock limit for a running job', null=True),
+        ),
+        migrations.AlterField(
+            model_name='dynamictableexport',
+            name='status',
+            field=models.CharField(choices=[('pending', 'Pending'), ('processing', 'Processing'), ('completed', 'Completed'), ('failed', 'Failed'), ('cancelled', 'Cancelled')], default='pending', max_length=20),
+        ),
+        migrations.AlterField(
+            model_name='generationjob',
+            name='status',
+            field=models.CharField(choices=[('queued', 'Queued'), ('running', 'Running'), ('completed', 'Completed'), ('failed', 'Failed'), ('cancelled', 'Cancelled')], default='queued', max_length=20),
+        ),
+    ]
@@ -0,0 +1,37 @@
+# Generated by Django 5.2.5 on 2026-10-19 13:13
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('data_generator', '0023_generationjob_cancel'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='generationjob',
+            name='priority',
+            field=models.PositiveSmallIntegerField(choices=[(0, 'Interactive'), (1, 'Standard'), (2, 'Bulk')], default=1, help_text='Lower classes are always scheduled first'),
+        ),
+        migrations.AddField(
+            model_name='generationjob',
+            name='queued_at',
+            field=models.DateTimeField(blank=True, help_text='When the job last entered the queue', null=True),
+        ),
+        migrations.AddField(
+            model_name='generationjob',
+            name='run_seconds',
+            field=models.FloatField(default=0, help_text='Time spent running in earlier time slices'),
+        ),
+        migrations.AddField(
+            model_name='generationjob',
+            name='wait_seconds',
+            field=models.FloatField(default=0, help_text='Total time spent queued, over all time slices'),
+        ),
+        migrations.AddIndex(
+            model_name='generationjob',
+            index=models.Index(fields=['status', 'priority', 'created_at'], name='data_genera_status_c4d2b7_idx'),
+        ),
+    ]
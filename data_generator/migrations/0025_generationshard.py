@@ -0,0 +1,50 @@
+# Generated by Django 5.2.5 on 2026-10-19 13:19
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('data_generator', '0024_generationjob_scheduling'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='generationjob',
+            name='status',
+            field=models.CharField(choices=[('queued', 'Queued'), ('running', 'Running'), ('sharded', 'Split into shards'), ('completed', 'Completed'), ('failed', 'Failed'), ('cancelled', 'Cancelled')], default='queued', max_length=20),
+        ),
+        migrations.CreateModel(
+            name='GenerationShard',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('index', models.PositiveIntegerField()),
+                ('start_row', models.PositiveBigIntegerField()),
+                ('num_rows', models.PositiveIntegerField()),
+                ('seed', models.BigIntegerField(blank=True, null=True)),
+                ('status', models.CharField(choices=[('pending', 'Pending'), ('running', 'Running'), ('completed', 'Completed'), ('failed', 'Failed'), ('cancelled', 'Cancelled')], default='pending', max_length=20)),
+                ('attempts', models.PositiveIntegerField(default=0)),
+                ('worker', models.CharField(blank=True, max_length=100)),
+                ('lease_expires_at', models.DateTimeField(blank=True, help_text='Renewed while the worker runs; an expired lease returns the shard to pending', null=True)),
+                ('rows_done', models.PositiveIntegerField(default=0)),
+                ('file_path', models.CharField(blank=True, help_text='Generated rows, kept until the shards are merged', max_length=500)),
+                ('error_message', models.TextField(blank=True)),
+                ('started_at', models.DateTimeField(blank=True, null=True)),
+                ('finished_at', models.DateTimeField(blank=True, null=True)),
+                ('job', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='shards', to='data_generator.generationjob')),
+            ],
+            options={
+                'ordering': ['job', 'index'],
+            },
+        ),
+        migrations.AddIndex(
+            model_name='generationshard',
+            index=models.Index(fields=['status', 'lease_expires_at'], name='data_genera_status_1cda13_idx'),
+        ),
+        migrations.AlterUniqueTogether(
+            name='generationshard',
+            unique_together={('job', 'index')},
+        ),
+    ]
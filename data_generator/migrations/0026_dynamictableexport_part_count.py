@@ -0,0 +1,23 @@
+# Generated by Django 5.2.5 on 2026-10-19 13:33
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('data_generator', '0025_generationshard'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='dynamictableexport',
+            name='part_count',
+            field=models.PositiveIntegerField(default=0, help_text='Part files of a split export; file_path is then its manifest'),
+        ),
+        migrations.AlterField(
+            model_name='dynamictableexport',
+            name='export_format',
+            field=models.CharField(choices=[('xlsx', 'Excel (.xlsx)'), ('sql', 'SQL dump (.sql)'), ('sqlite', 'SQLite database (.sqlite3)'), ('csv', 'CSV (.csv)'), ('jsonl', 'JSON Lines (.jsonl)'), ('parquet', 'Parquet (.parquet)'), ('db', 'Database only (no file)')], default='xlsx', max_length=10),
+        ),
+    ]
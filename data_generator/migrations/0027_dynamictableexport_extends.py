@@ -0,0 +1,24 @@
+# Generated by Django 5.2.5 on 2026-10-19 13:37
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('data_generator', '0026_dynamictableexport_part_count'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='dynamictableexport',
+            name='extends',
+            field=models.ForeignKey(blank=True, help_text='Completed export whose rows this one continues', null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='extensions', to='data_generator.dynamictableexport'),
+        ),
+        migrations.AddField(
+            model_name='dynamictableexport',
+            name='start_row',
+            field=models.PositiveBigIntegerField(default=0, help_text='Position of the first row in the extended series'),
+        ),
+    ]
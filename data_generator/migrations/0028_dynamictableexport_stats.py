@@ -0,0 +1,18 @@
+# Generated by Django 5.2.5 on 2026-10-19 13:44
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('data_generator', '0027_dynamictableexport_extends'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='dynamictableexport',
+            name='stats',
+            field=models.JSONField(blank=True, help_text='Seconds per stage, throughput and peak memory (see data_generator.stats)', null=True),
+        ),
+    ]
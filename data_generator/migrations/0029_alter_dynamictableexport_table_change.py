@@ -0,0 +1,18 @@
+# Generated by Django 5.2.5 on 2026-10-19 13:57
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('data_generator', '0028_dynamictableexport_stats'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='dynamictableexport',
+            name='export_format',
+            field=models.CharField(choices=[('xlsx', 'Excel (.xlsx)'), ('sql', 'SQL dump (.sql)'), ('sqlite', 'SQLite database (.sqlite3)'), ('csv', 'CSV (.csv)'), ('jsonl', 'JSON Lines (.jsonl)'), ('parquet', 'Parquet (.parquet)'), ('db', 'Database only (no file)'), ('alter', 'Table change')], default='xlsx', max_length=10),
+        ),
+    ]
@@ -0,0 +1,98 @@
+# Generated by Django 5.2.5 on 2026-10-19 14:28
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+def move_table_changes(apps, schema_editor):
+    """Turn the 'alter' export rows that recorded table changes into DynamicTableChange rows
+
+    Their jobs and progress move over to the change; the change itself was
+    kept in the job's options.
+    """
+    DynamicTableExport = apps.get_model('data_generator', 'DynamicTableExport')
+    DynamicTableChange = apps.get_model('data_generator', 'DynamicTableChange')
+    GenerationJob = apps.get_model('data_generator', 'GenerationJob')
+    GenerationProgress = apps.get_model('data_generator', 'GenerationProgress')
+    for export in DynamicTableExport.objects.filter(export_format='alter').select_related('table_definition'):
+        job = GenerationJob.objects.filter(export=export).order_by('-created_at').first()
+        requested = (job.options if job else {}).get('table_change') or {}
+        table_def = export.table_definition
+        change = DynamicTableChange.objects.create(
+            table_definition=table_def,
+            status=export.status,
+            fields_definition=requested.get('fields_definition', table_def.fields_definition),
+            indexes=requested.get('indexes', table_def.indexes),
+            description=requested.get('description', table_def.description),
+            renames=requested.get('renames', {}),
+            num_rows=export.num_records,
+            checkpoint=export.checkpoint,
+            stats=export.stats,
+            error_message=export.error_message,
+            completed_at=export.completed_at,
+        )
+        DynamicTableChange.objects.filter(pk=change.pk).update(created_at=export.created_at)
+        GenerationJob.objects.filter(export=export).update(export=None, table_change=change, options={})
+        GenerationProgress.objects.filter(export=export).update(export=None, table_change=change)
+        export.delete()
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('data_generator', '0029_alter_dynamictableexport_table_change'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='DynamicTableChange',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('status', models.CharField(choices=[('pending', 'Pending'), ('processing', 'Processing'), ('completed', 'Completed'), ('failed', 'Failed'), ('cancelled', 'Cancelled')], default='pending', max_length=20)),
+                ('fields_definition', models.JSONField(help_text="The table's fields after the change")),
+                ('indexes', models.JSONField(blank=True, default=list, help_text="The table's composite indexes after the change")),
+                ('description', models.TextField(blank=True)),
+                ('renames', models.JSONField(blank=True, default=dict, help_text='Old field name to new name')),
+                ('num_rows', models.PositiveBigIntegerField(default=0, help_text='Rows in the table when the change was requested')),
+                ('checkpoint', models.JSONField(blank=True, help_text='Columns left to backfill and the last row filled, once the DDL committed', null=True)),
+                ('stats', models.JSONField(blank=True, help_text='Seconds per stage (see data_generator.stats)', null=True)),
+                ('error_message', models.TextField(blank=True)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('completed_at', models.DateTimeField(blank=True, null=True)),
+                ('table_definition', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='changes', to='data_generator.dynamictabledefinition')),
+            ],
+            options={
+                'ordering': ['-created_at'],
+            },
+        ),
+        migrations.AddField(
+            model_name='generationjob',
+            name='table_change',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='jobs', to='data_generator.dynamictablechange'),
+        ),
+        migrations.AddField(
+            model_name='generationprogress',
+            name='table_change',
+            field=models.OneToOneField(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='progress', to='data_generator.dynamictablechange'),
+        ),
+        migrations.AlterField(
+            model_name='generationjob',
+            name='export',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='jobs', to='data_generator.dynamictableexport'),
+        ),
+        migrations.AlterField(
+            model_name='generationprogress',
+            name='export',
+            field=models.OneToOneField(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='progress', to='data_generator.dynamictableexport'),
+        ),
+        migrations.RunPython(move_table_changes, migrations.RunPython.noop),
+        migrations.AlterField(
+            model_name='dynamictableexport',
+            name='export_format',
+            field=models.CharField(choices=[('xlsx', 'Excel (.xlsx)'), ('sql', 'SQL dump (.sql)'), ('sqlite', 'SQLite database (.sqlite3)'), ('csv', 'CSV (.csv)'), ('jsonl', 'JSON Lines (.jsonl)'), ('parquet', 'Parquet (.parquet)'), ('db', 'Database only (no file)')], default='xlsx', max_length=10),
+        ),
+        migrations.AddConstraint(
+            model_name='generationjob',
+            constraint=models.CheckConstraint(condition=models.Q(models.Q(('export__isnull', False), ('table_change__isnull', True)), models.Q(('export__isnull', True), ('table_change__isnull', False)), _connector='OR'), name='generationjob_export_or_table_change'),
+        ),
+    ]
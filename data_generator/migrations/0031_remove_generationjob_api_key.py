@@ -0,0 +1,17 @@
+# Generated by Django 5.2.5 on 2026-10-19 14:30
+
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('data_generator', '0030_dynamictablechange'),
+    ]
+
+    operations = [
+        migrations.RemoveField(
+            model_name='generationjob',
+            name='api_key',
+        ),
+    ]
@@ -0,0 +1,35 @@
+from django.db import migrations
+
+
+def shard_continuations(apps, schema_editor):
+    """Give completed sharded exports the shard their extensions continue from
+
+    They recorded the merging worker's RNG state, which never generated their
+    rows. Their shards were numbered from the first whole shard at start_row.
+    """
+    GenerationJob = apps.get_model('data_generator', 'GenerationJob')
+    GenerationShard = apps.get_model('data_generator', 'GenerationShard')
+    sharded = GenerationJob.objects.filter(
+        export__status='completed', shards__isnull=False,
+    ).select_related('export').distinct().order_by('created_at')
+    for job in sharded:
+        export = job.export
+        shards = list(GenerationShard.objects.filter(job=job).order_by('index').values_list('num_rows', flat=True))
+        shard_rows = shards[0]
+        export.checkpoint = {
+            'row': export.num_records,
+            'shard_rows': shard_rows,
+            'next_shard': -(-export.start_row // shard_rows) + len(shards),
+        }
+        export.save(update_fields=['checkpoint'])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('data_generator', '0031_remove_generationjob_api_key'),
+    ]
+
+    operations = [
+        migrations.RunPython(shard_continuations, migrations.RunPython.noop),
+    ]
@@ -9,6 +9,7 @@ class DynamicTableDefinition(models.Model):
     display_name = models.CharField(max_length=200)
     description = models.TextField(blank=True)
     fields_definition = models.JSONField(help_text="JSON containing field definitions")
+    indexes = models.JSONField(default=list, blank=True, help_text="Composite indexes: [{'fields': [...], 'unique': bool}]")
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
     is_migrated = models.BooleanField(default=False)
@@ -28,31 +29,255 @@ class DynamicTableExport(models.Model):
         ('processing', 'Processing'),
         ('completed', 'Completed'),
         ('failed', 'Failed'),
+        ('cancelled', 'Cancelled'),
+    ]
+
+    FORMAT_CHOICES = [
+        ('xlsx', 'Excel (.xlsx)'),
+        ('sql', 'SQL dump (.sql)'),
+        ('sqlite', 'SQLite database (.sqlite3)'),
+        ('csv', 'CSV (.csv)'),
+        ('jsonl', 'JSON Lines (.jsonl)'),
+        ('parquet', 'Parquet (.parquet)'),
+        ('db', 'Database only (no file)'),
+    ]
+
+    COMPRESSION_CHOICES = [
+        ('', 'None'),
+        ('gzip', 'gzip'),
+        ('zstd', 'zstd'),
     ]
 
     table_definition = models.ForeignKey(DynamicTableDefinition, on_delete=models.CASCADE, related_name='exports')
     num_records = models.PositiveIntegerField()
     status = models.CharField(max_length=20, choices=STATUS_CHOICES, default='pending')
+    export_format = models.CharField(max_length=10, choices=FORMAT_CHOICES, default='xlsx')
     file_path = models.CharField(max_length=500, blank=True)
+    compression = models.CharField(max_length=10, choices=COMPRESSION_CHOICES, blank=True, default='')
     created_at = models.DateTimeField(auto_now_add=True)
     completed_at = models.DateTimeField(blank=True, null=True)
     error_message = models.TextField(blank=True)
+    seed = models.BigIntegerField(blank=True, null=True)
+    rows_committed = models.PositiveBigIntegerField(default=0)
+    checkpoint = models.JSONField(blank=True, null=True, help_text="Last committed row and RNG state")
+    inflight_key = models.CharField(max_length=64, blank=True, null=True, unique=True,
+                                    help_text="Request fingerprint while the export is pending or processing")
+    coalesced_requests = models.PositiveIntegerField(default=0, help_text="Identical requests attached to this export")
+    part_count = models.PositiveIntegerField(default=0,
+                                             help_text="Part files of a split export; file_path is then its manifest")
+    extends = models.ForeignKey('self', on_delete=models.SET_NULL, blank=True, null=True, related_name='extensions',
+                                help_text="Completed export whose rows this one continues")
+    start_row = models.PositiveBigIntegerField(default=0, help_text="Position of the first row in the extended series")
+    stats = models.JSONField(blank=True, null=True,
+                             help_text="Seconds per stage, throughput and peak memory (see data_generator.stats)")
 
     class Meta:
         ordering = ['-created_at']
 
+    @property
+    def is_resumable(self):
+        """Database-only loads can continue from their last committed chunk"""
+        return (
+            self.export_format == 'db'
+            and self.status in ('processing', 'failed', 'cancelled')
+            and self.rows_committed < self.num_records
+        )
+
+    @property
+    def is_extendable(self):
+        """Completed exports (not partial ones) can grow by more rows continuing their random stream"""
+        return (
+            self.status == 'completed'
+            and self.continuation is not None
+            and (self.export_format != 'db' or self.rows_committed >= self.num_records)
+        )
+
+    @property
+    def continuation(self):
+        """Checkpoint an extension of this export starts from, or None if it has no continuation point
+
+        An export generated in one stream is continued from the RNG state it
+        finished with; a sharded one from the shard after its last, with shards
+        of the same size (see data_generator.shards).
+        """
+        checkpoint = self.checkpoint or {}
+        if 'next_shard' in checkpoint:
+            return {'row': 0, 'shard_rows': checkpoint['shard_rows'], 'first_shard': checkpoint['next_shard']}
+        if checkpoint.get('rng_state'):
+            return {'row': 0, 'rng_state': checkpoint['rng_state']}
+        return None
+
+    @property
+    def stage_timings(self):
+        """(stage, seconds) pairs from the export's stats, slowest first"""
+        stages = (self.stats or {}).get('stages', {})
+        return sorted(stages.items(), key=lambda item: item[1], reverse=True)
+
+    @property
+    def end_row(self):
+        """Position just past this export's last row, where an extension starts"""
+        return self.start_row + self.num_records
+
+    @property
+    def is_downloadable(self):
+        """Finished exports with a file, including partial files kept from a stopped run"""
+        return bool(self.file_path) and self.status in ('completed', 'cancelled', 'failed')
+
     def __str__(self):
         return f"Export #{self.id} - {self.table_definition.display_name} ({self.num_records} records)"
 
 
+class DynamicTableChange(models.Model):
+    """An edit of a dynamic table's fields, applied and backfilled by a queued job (see pipeline.run_table_change)"""
+    STATUS_CHOICES = DynamicTableExport.STATUS_CHOICES
+
+    table_definition = models.ForeignKey(DynamicTableDefinition, on_delete=models.CASCADE, related_name='changes')
+    status = models.CharField(max_length=20, choices=STATUS_CHOICES, default='pending')
+    fields_definition = models.JSONField(help_text="The table's fields after the change")
+    indexes = models.JSONField(default=list, blank=True, help_text="The table's composite indexes after the change")
+    description = models.TextField(blank=True)
+    renames = models.JSONField(default=dict, blank=True, help_text="Old field name to new name")
+    num_rows = models.PositiveBigIntegerField(default=0, help_text="Rows in the table when the change was requested")
+    checkpoint = models.JSONField(blank=True, null=True,
+                                  help_text="Columns left to backfill and the last row filled, once the DDL committed")
+    stats = models.JSONField(blank=True, null=True, help_text="Seconds per stage (see data_generator.stats)")
+    error_message = models.TextField(blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    completed_at = models.DateTimeField(blank=True, null=True)
+
+    class Meta:
+        ordering = ['-created_at']
+
+    @property
+    def summary(self):
+        """What the change did to the table's columns, once its DDL has run"""
+        return (self.checkpoint or {}).get('summary', '')
+
+    @property
+    def rows_backfilled(self):
+        return (self.checkpoint or {}).get('rows', 0)
+
+    def __str__(self):
+        return f"Change #{self.id} - {self.table_definition.display_name} ({self.status})"
+
+
 class GenerationProgress(models.Model):
-    """Model to track progress of data generation"""
-    export = models.OneToOneField(DynamicTableExport, on_delete=models.CASCADE, related_name='progress')
+    """Model to track progress of data generation (an export's, or a table change's backfill)"""
+    export = models.OneToOneField(DynamicTableExport, on_delete=models.CASCADE, related_name='progress',
+                                  null=True, blank=True)
+    table_change = models.OneToOneField(DynamicTableChange, on_delete=models.CASCADE, related_name='progress',
+                                        null=True, blank=True)
     current_step = models.CharField(max_length=50, default='initializing')
     progress_percentage = models.IntegerField(default=0)
     message = models.TextField(blank=True)
+    rows_done = models.PositiveBigIntegerField(default=0, help_text="Rows finished in the current step")
+    rows_total = models.PositiveBigIntegerField(default=0)
+    rows_per_second = models.FloatField(default=0)
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
 
     def __str__(self):
-        return f"Progress for Export #{self.export.id} - {self.progress_percentage}%"
+        return f"Progress for {self.export or self.table_change} - {self.progress_percentage}%"
+
+
+class GenerationJob(models.Model):
+    """A queued export run or table change, claimed and executed by a run_generation_worker process"""
+    STATUS_CHOICES = [
+        ('queued', 'Queued'),
+        ('running', 'Running'),
+        ('sharded', 'Split into shards'),
+        ('completed', 'Completed'),
+        ('failed', 'Failed'),
+        ('cancelled', 'Cancelled'),
+    ]
+    # Statuses whose work is under way, on one worker or spread over shards
+    IN_PROGRESS_STATUSES = ('running', 'sharded')
+
+    PRIORITY_INTERACTIVE = 0
+    PRIORITY_STANDARD = 1
+    PRIORITY_BULK = 2
+    PRIORITY_CHOICES = [
+        (PRIORITY_INTERACTIVE, 'Interactive'),
+        (PRIORITY_STANDARD, 'Standard'),
+        (PRIORITY_BULK, 'Bulk'),
+    ]
+
+    # Exactly one of these is set: what the job produces
+    export = models.ForeignKey(DynamicTableExport, on_delete=models.CASCADE, related_name='jobs',
+                               null=True, blank=True)
+    table_change = models.ForeignKey(DynamicTableChange, on_delete=models.CASCADE, related_name='jobs',
+                                     null=True, blank=True)
+    status = models.CharField(max_length=20, choices=STATUS_CHOICES, default='queued')
+    priority = models.PositiveSmallIntegerField(choices=PRIORITY_CHOICES, default=PRIORITY_STANDARD,
+                                                help_text="Lower classes are always scheduled first")
+    options = models.JSONField(default=dict, blank=True, help_text="Options passed to run_export")
+    attempts = models.PositiveIntegerField(default=0)
+    worker = models.CharField(max_length=100, blank=True)
+    requester = models.CharField(max_length=100, blank=True, db_index=True, help_text="User or client the job's cost is charged to")
+    estimated_seconds = models.FloatField(default=0, help_text="Admission estimate of worker time")
+    estimated_ai_values = models.PositiveIntegerField(default=0, help_text="Admission estimate of LLM-generated values")
+    heartbeat_at = models.DateTimeField(null=True, blank=True)
+    cancel_requested = models.BooleanField(default=False, help_text="Set by the cancel endpoint; the worker stops at its next check")
+    deadline_at = models.DateTimeField(null=True, blank=True, help_text="Wall-clock limit for a running job")
+    error_message = models.TextField(blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    queued_at = models.DateTimeField(null=True, blank=True, help_text="When the job last entered the queue")
+    wait_seconds = models.FloatField(default=0, help_text="Total time spent queued, over all time slices")
+    run_seconds = models.FloatField(default=0, help_text="Time spent running in earlier time slices")
+    started_at = models.DateTimeField(null=True, blank=True)
+    finished_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        ordering = ['created_at']
+        indexes = [
+            models.Index(fields=['status', 'created_at']),
+            models.Index(fields=['status', 'priority', 'created_at']),
+        ]
+        constraints = [
+            models.CheckConstraint(
+                condition=models.Q(export__isnull=False, table_change__isnull=True)
+                | models.Q(export__isnull=True, table_change__isnull=False),
+                name='generationjob_export_or_table_change',
+            ),
+        ]
+
+    def __str__(self):
+        if self.export_id is None:
+            return f"Job #{self.id} for Change #{self.table_change_id} ({self.status})"
+        return f"Job #{self.id} for Export #{self.export_id} ({self.status})"
+
+
+class GenerationShard(models.Model):
+    """A row range of a large file export, leased and generated by any worker sharing the database"""
+    STATUS_CHOICES = [
+        ('pending', 'Pending'),
+        ('running', 'Running'),
+        ('completed', 'Completed'),
+        ('failed', 'Failed'),
+        ('cancelled', 'Cancelled'),
+    ]
+
+    job = models.ForeignKey(GenerationJob, on_delete=models.CASCADE, related_name='shards')
+    index = models.PositiveIntegerField()
+    start_row = models.PositiveBigIntegerField()
+    num_rows = models.PositiveIntegerField()
+    seed = models.BigIntegerField(blank=True, null=True)
+    status = models.CharField(max_length=20, choices=STATUS_CHOICES, default='pending')
+    attempts = models.PositiveIntegerField(default=0)
+    worker = models.CharField(max_length=100, blank=True)
+    lease_expires_at = models.DateTimeField(null=True, blank=True, help_text="Renewed while the worker runs; an expired lease returns the shard to pending")
+    rows_done = models.PositiveIntegerField(default=0)
+    file_path = models.CharField(max_length=500, blank=True, help_text="Generated rows, kept until the shards are merged")
+    error_message = models.TextField(blank=True)
+    started_at = models.DateTimeField(null=True, blank=True)
+    finished_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        ordering = ['job', 'index']
+        unique_together = [('job', 'index')]
+        indexes = [
+            models.Index(fields=['status', 'lease_expires_at']),
+        ]
+
+    def __str__(self):
+        return f"Shard {self.index} of Job #{self.job_id} ({self.status})"
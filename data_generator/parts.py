@@ -0,0 +1,153 @@
+"""
+Split exports: an export written as several part files with a JSON manifest
+
+With options['split'] set to {'rows': N} or {'bytes': N}, a file export is
+written into its own directory as part files of about that size, in the
+export's format, next to a manifest.json listing each part's path, row range,
+size and sha256 so downstream loaders can read the parts in parallel. Sharded
+exports (see data_generator.shards) write one part per shard on whichever
+worker generated it, so nothing is merged. The set downloads as one zip archive.
+"""
+import hashlib
+import json
+import os
+import shutil
+import tempfile
+from itertools import chain, islice
+
+from django.utils import timezone
+
+from .admission import FORMAT_MAX_ROWS
+from .compression import CHUNK_SIZE, compress_file
+from .dynamic_models import DynamicModelGenerator
+
+MANIFEST_NAME = 'manifest.json'
+# Rows written in the export's format to turn a target part size into rows
+SAMPLE_ROWS = 1000
+
+
+def rows_per_part(export, table_definition, options):
+    """Rows in each part file of a split export, or None when it is written as a single file
+
+    A target byte size is converted using a sample written in the export's
+    format (and compression), so parts come out close to that size, not exactly it.
+    """
+    split = options.get('split') or {}
+    if export.export_format == 'db' or not (split.get('rows') or split.get('bytes')):
+        return None
+    if split.get('rows'):
+        rows = int(split['rows'])
+    else:
+        sample_rows = min(SAMPLE_ROWS, export.num_records)
+        sample = DynamicModelGenerator(seed=export.seed).generate_synthetic_data(table_definition, sample_rows)
+        with tempfile.TemporaryDirectory() as tmp:
+            path = write_part(export, table_definition, sample, os.path.join(tmp, 'sample'), options)
+            rows = int(split['bytes']) * sample_rows // max(1, os.path.getsize(path))
+    max_rows = FORMAT_MAX_ROWS.get(export.export_format)
+    if max_rows:
+        rows = min(rows, max_rows)
+    return max(1, rows)
+
+
+def part_name(export, index):
+    """File name of a part, before any compression suffix"""
+    extension = DynamicModelGenerator.EXPORT_FORMATS[export.export_format]['extension']
+    return f'part-{index:05d}.{extension}'
+
+
+def write_part(export, table_definition, rows, path, options, generator=None):
+    """Write rows to one file in the export's format and compression; returns the final path"""
+    generator = generator or DynamicModelGenerator(seed=export.seed)
+    generator.create_export_file(export.export_format, table_definition, rows, path,
+                                 **options.get('format_options', {}))
+    if export.compression:
+        path = compress_file(path, export.compression)
+    return path
+
+
+def write_parts(export, generator, table_definition, data, part_rows, directory, options):
+    """Write a row stream as consecutive part files of ``part_rows`` rows
+
+    Returns the parts written as dicts with path, start_row and rows; a stream
+    that ends early (a kept partial export) just has a short last part.
+    """
+    os.makedirs(directory, exist_ok=True)
+    rows = iter(data)
+    parts = []
+    start_row = 0
+    while True:
+        first = next(rows, None)
+        if first is None:
+            break
+        counted = {'rows': 0}
+        part_data = _counting(chain([first], islice(rows, part_rows - 1)), counted)
+        path = write_part(export, table_definition, part_data,
+                          os.path.join(directory, part_name(export, len(parts))), options, generator)
+        parts.append({'path': path, 'start_row': start_row, 'rows': counted['rows']})
+        start_row += counted['rows']
+    return parts
+
+
+def collect_parts(parts, directory):
+    """Move part files written elsewhere (by shard workers) into the export's directory"""
+    os.makedirs(directory, exist_ok=True)
+    collected = []
+    for part in parts:
+        path = os.path.join(directory, os.path.basename(part['path']))
+        shutil.move(part['path'], path)
+        collected.append(dict(part, path=path))
+    return collected
+
+
+def write_manifest(export, table_definition, directory, parts):
+    """Write the manifest listing the parts; returns its path
+
+    Row ranges are half-open: a part holds rows start_row to end_row - 1.
+    They continue the original's for an extension (export.extends).
+    """
+    entries = [{
+        'path': os.path.basename(part['path']),
+        'start_row': export.start_row + part['start_row'],
+        'end_row': export.start_row + part['start_row'] + part['rows'],
+        'rows': part['rows'],
+        'bytes': os.path.getsize(part['path']),
+        'sha256': file_sha256(part['path']),
+    } for part in parts]
+    manifest = {
+        'export_id': export.pk,
+        'table': table_definition['table_name'],
+        'format': export.export_format,
+        'compression': export.compression or None,
+        'seed': export.seed,
+        'extends': export.extends_id,
+        'rows': sum(entry['rows'] for entry in entries),
+        'created_at': timezone.now().isoformat(),
+        'parts': entries,
+    }
+    path = os.path.join(directory, MANIFEST_NAME)
+    with open(f'{path}.tmp', 'w', encoding='utf-8') as f:
+        json.dump(manifest, f, indent=2)
+    os.replace(f'{path}.tmp', path)
+    return path
+
+
+def read_manifest(path):
+    with open(path, encoding='utf-8') as f:
+        return json.load(f)
+
+
+def file_sha256(path):
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        while True:
+            chunk = f.read(CHUNK_SIZE)
+            if not chunk:
+                break
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def _counting(rows, counted):
+    for row in rows:
+        counted['rows'] += 1
+        yield row
@@ -0,0 +1,395 @@
+"""
+Export pipeline: runs a DynamicTableExport from data generation to finished artifact,
+and a DynamicTableChange from DDL to backfilled columns
+"""
+import logging
+import os
+import secrets
+import shutil
+from datetime import datetime
+from itertools import chain
+
+from django.conf import settings
+from django.db import connection, transaction
+from django.utils import timezone
+
+from .compression import compress_file
+from .dynamic_models import DynamicModelGenerator, GenerationInterrupted, GenerationYielded
+from .models import DynamicTableChange, DynamicTableExport, GenerationProgress
+from .parts import collect_parts, rows_per_part, write_manifest, write_parts
+from .progress import ProgressReporter
+from .stats import ExportStats
+
+logger = logging.getLogger(__name__)
+
+
+def new_seed():
+    """Return a fresh seed for exports that did not ask for one"""
+    return secrets.randbelow(2 ** 31)
+
+
+def build_table_definition(table_def):
+    """Return the plain-dict table definition the generator works with"""
+    return {
+        'table_name': table_def.table_name,
+        'display_name': table_def.display_name,
+        'fields_definition': table_def.fields_definition,
+        'indexes': table_def.indexes,
+    }
+
+
+def export_stages(export, options, sharded=False):
+    """The row-processing steps of an export, in order (see ProgressReporter)"""
+    if export.export_format == 'db':
+        return ['saving_to_db']
+    stages = ['generating_shards', 'merging_shards'] if sharded else ['generating_data']
+    return stages + (['saving_to_db'] if options.get('save_to_db') else [])
+
+
+def run_export(export, openai_api_key=None, options=None, interrupt_check=None, chunks=None, parts=None,
+               stats=None):
+    """Generate the data for an export and produce its artifact (a file, table rows, or both)
+
+    Returns a summary dict; on error the export is marked failed and the exception re-raised.
+    ``interrupt_check`` is handed to the generator (see GenerationInterrupted); an
+    interrupted export is marked cancelled or failed, keeping partial output
+    when options['keep_partial'] is set. ``chunks`` are rows generated
+    elsewhere (the shards of a sharded export) to write instead of generating them;
+    ``parts`` are part files written by the shards of a split export (see data_generator.parts).
+    An extension (export.extends) starts from its original's continuation
+    point, so it continues the same random stream. Stage timings
+    are saved as export.stats whatever the outcome; pass ``stats`` to
+    include time measured elsewhere (e.g. by shard workers).
+    """
+    options = options or {}
+    progress, _ = GenerationProgress.objects.get_or_create(export=export)
+    table_definition_data = build_table_definition(export.table_definition)
+    stages = export_stages(export, options, sharded=chunks is not None or parts is not None)
+    reporter = ProgressReporter(progress, export.num_records, stages)
+
+    generator = DynamicModelGenerator(seed=export.seed)
+    generator.interrupt_check = interrupt_check
+    generator.max_ai_values = options.get('max_ai_values') or getattr(settings, 'GENERATION_JOB_MAX_AI_VALUES', None)
+    if export.checkpoint and export.checkpoint.get('rng_state'):
+        generator.set_rng_state(export.checkpoint['rng_state'])
+    stats = stats or ExportStats()
+    if export.export_format == 'db' and export.rows_committed:
+        # Resumed or time-sliced load: keep adding to the earlier runs' timings
+        stats.resume_from(export.stats)
+
+    export.status = 'processing'
+    export.error_message = ''
+    export.save(update_fields=['status', 'error_message'])
+
+    try:
+        if export.export_format == 'db':
+            summary = _run_db_export(export, reporter, generator, table_definition_data, openai_api_key, stats)
+        else:
+            summary = _run_file_export(export, reporter, generator, table_definition_data, openai_api_key, options,
+                                       stats, chunks, parts)
+    except GenerationYielded as e:
+        # Back in the queue; identical requests can still attach to it
+        reporter.finish('queued', reporter.percentage, str(e))
+        export.status = e.status
+        export.stats = _stats(export, stats, generator, reporter)
+        export.save(update_fields=['status', 'stats'])
+        raise
+    except GenerationInterrupted as e:
+        reporter.finish(e.status, reporter.percentage, str(e))
+        export.status = e.status
+        export.error_message = str(e)
+        export.inflight_key = None
+        export.stats = _stats(export, stats, generator, reporter)
+        export.save(update_fields=['status', 'error_message', 'inflight_key', 'stats'])
+        raise
+    except Exception as e:
+        reporter.finish('failed', 0, f'Error: {str(e)}')
+        export.status = 'failed'
+        export.error_message = str(e)
+        # No longer in flight: identical requests from now on start a fresh export
+        export.inflight_key = None
+        export.stats = _stats(export, stats, generator, reporter)
+        export.save(update_fields=['status', 'error_message', 'inflight_key', 'stats'])
+        raise
+
+    reporter.finish('completed', 100, 'Generation completed successfully!')
+    export.status = 'completed'
+    export.completed_at = timezone.now()
+    export.inflight_key = None
+    export.stats = _stats(export, stats, generator, reporter)
+    export.save(update_fields=['status', 'completed_at', 'inflight_key', 'stats'])
+    return summary
+
+
+def _stats(export, stats, generator, reporter):
+    """The export's (or table change's) timing stats as saved on it"""
+    return stats.as_dict(reporter.rows_done, ai_seconds=generator.ai_seconds, ai_values=generator.ai_values_generated)
+
+
+def _run_file_export(export, reporter, generator, table_definition_data, openai_api_key, options, stats,
+                     chunks=None, parts=None):
+    """Generate rows (or take the given ones), write the export file(s), and optionally insert the rows as well"""
+    format_info = DynamicModelGenerator.EXPORT_FORMATS[export.export_format]
+    if parts is not None:
+        reporter.stage('merging_shards', f'Collecting {len(parts)} part files...', rows_done=export.num_records)
+        directory = _output_path(export, table_definition_data)
+        with stats.span('manifest'):
+            output_path = write_manifest(export, table_definition_data, directory, collect_parts(parts, directory))
+        return _completed(export, generator, output_path, len(parts))
+
+    if chunks is None:
+        if options.get('save_to_db'):
+            # The rows also go into the table, so they must not repeat its unique values
+            generator.load_unique_values(table_definition_data)
+        reporter.stage('generating_data', f'Generating synthetic data into a {format_info["label"]} file...')
+        chunks = stats.timed(generator.iter_synthetic_data(table_definition_data, export.num_records, openai_api_key))
+    else:
+        reporter.stage('merging_shards', f'Merging shards into a {format_info["label"]} file...')
+        chunks = stats.timed(_checked(chunks, generator), 'shard_read')
+
+    # Rows are streamed into the exporter unless they are also needed for the DB insert
+    chunks = reporter.track(chunks)
+    interrupted = []
+    if options.get('keep_partial'):
+        # End the stream early instead, so the exporter still writes a valid file
+        chunks = _until_interrupted(chunks, interrupted)
+    data = chain.from_iterable(chunks)
+    if options.get('save_to_db'):
+        data = list(data)
+        reporter.stage('creating_file', f'Creating {format_info["label"]} file...', rows_done=len(data))
+
+    part_rows = rows_per_part(export, table_definition_data, options)
+    part_count = 0
+    if part_rows:
+        # Split output: a directory of part files plus their manifest
+        directory = _output_path(export, table_definition_data)
+        try:
+            with stats.span('export'):
+                written = write_parts(export, generator, table_definition_data, data, part_rows, directory, options)
+        except GenerationInterrupted:
+            shutil.rmtree(directory, ignore_errors=True)
+            raise
+        with stats.span('manifest'):
+            output_path = write_manifest(export, table_definition_data, directory, written)
+        part_count = len(written)
+    else:
+        output_path = _output_path(export, table_definition_data, format_info['extension'])
+        try:
+            with stats.span('export'):
+                generator.create_export_file(
+                    export.export_format, table_definition_data, data, output_path,
+                    **options.get('format_options', {})
+                )
+        except GenerationInterrupted:
+            if os.path.exists(output_path):
+                os.remove(output_path)
+            raise
+
+        # Store the artifact pre-compressed when requested
+        if export.compression:
+            reporter.stage('compressing', f'Compressing with {export.compression}...', rows_done=reporter.rows_done)
+            with stats.span('compression'):
+                output_path = compress_file(output_path, export.compression)
+
+    if interrupted:
+        export.file_path = output_path
+        export.part_count = part_count
+        export.save(update_fields=['file_path', 'part_count'])
+        kept = f'{part_count} part files' if part_rows else 'partial file'
+        raise GenerationInterrupted(
+            interrupted[0].status, f'{interrupted[0]}; {kept} with {reporter.rows_done} rows kept'
+        )
+
+    summary = _completed(export, generator, output_path, part_count)
+    if options.get('save_to_db'):
+        reporter.stage('saving_to_db', 'Saving to database...')
+        with stats.span('insert'):
+            summary['insert'] = generator.insert_data_to_db(table_definition_data, data, on_chunk=reporter.update)
+        export.rows_committed = export.num_records
+        export.save(update_fields=['rows_committed'])
+    return summary
+
+
+def _output_path(export, table_definition_data, extension=None):
+    """Path of a new export artifact under output/; a directory when there is no extension"""
+    timestamp = datetime.now().strftime('%Y%m%d_%H%M%S')
+    name = f"{table_definition_data['table_name']}_{export.pk}_{timestamp}"
+    output_dir = os.path.join(settings.BASE_DIR, 'output')
+    os.makedirs(output_dir, exist_ok=True)
+    return os.path.join(output_dir, f'{name}.{extension}' if extension else name)
+
+
+def _completed(export, generator, output_path, part_count):
+    """Record a finished export's artifact (a file, or the manifest of its parts)"""
+    export.file_path = output_path
+    export.part_count = part_count
+    checkpoint = export.checkpoint or {}
+    if 'shard_rows' in checkpoint:
+        # The rows came from the shards' seeds, not this generator: an extension takes up the next shard
+        shard_rows = checkpoint['shard_rows']
+        export.checkpoint = {'row': export.num_records, 'shard_rows': shard_rows,
+                             'next_shard': checkpoint['first_shard'] + -(-export.num_records // shard_rows)}
+    else:
+        export.checkpoint = {'row': export.num_records, 'rng_state': generator.get_rng_state()}
+    export.save(update_fields=['file_path', 'part_count', 'checkpoint'])
+    summary = {'rows': export.num_records, 'file_path': output_path}
+    if part_count:
+        summary['parts'] = part_count
+    return summary
+
+
+def _checked(chunks, generator):
+    """Pass chunks through, checking for interruption before each one as generation does"""
+    for chunk in chunks:
+        generator.check_interrupted()
+        yield chunk
+
+
+def _until_interrupted(chunks, interrupted):
+    """Yield chunks until generation is interrupted, recording the interruption instead of raising it"""
+    try:
+        yield from chunks
+    except GenerationInterrupted as e:
+        interrupted.append(e)
+
+
+def _run_db_export(export, reporter, generator, table_definition_data, openai_api_key, stats):
+    """Stream chunks straight into the dynamic table, checkpointing after each commit"""
+    start_row = export.rows_committed
+    verb = 'Resuming' if start_row else 'Streaming'
+    reporter.stage('saving_to_db', f'{verb} rows into {table_definition_data["table_name"]} from row {start_row}...',
+                   rows_done=start_row)
+
+    # The table may already hold rows (earlier loads, a resumed run): keep unique columns unique across both
+    generator.load_unique_values(table_definition_data)
+
+    def checkpoint(rows_committed, rng_state):
+        DynamicTableExport.objects.filter(pk=export.pk).update(
+            rows_committed=rows_committed,
+            checkpoint={'row': rows_committed, 'rng_state': rng_state},
+        )
+        reporter.update(rows_committed)
+
+    try:
+        rows_committed = generator.generate_into_db(
+            table_definition_data, export.num_records, openai_api_key,
+            start_row=start_row, on_chunk=checkpoint, stats=stats
+        )
+    except GenerationYielded:
+        raise
+    except GenerationInterrupted as e:
+        # Committed chunks always stay; the load can be resumed from its checkpoint
+        export.refresh_from_db(fields=['rows_committed'])
+        raise GenerationInterrupted(e.status, f'{e}; {export.rows_committed} rows committed') from e
+    export.refresh_from_db(fields=['rows_committed', 'checkpoint'])
+    logger.info("Export #%s committed rows %s-%s into %s",
+                export.pk, start_row, rows_committed, table_definition_data['table_name'])
+    return {'rows': rows_committed - start_row, 'resumed_from': start_row}
+
+
+def run_table_change(change, openai_api_key=None, interrupt_check=None):
+    """Apply a DynamicTableChange to its table and generate the added columns for every row
+
+    Returns a summary dict; on error the change is marked failed (or cancelled,
+    when interrupted) and the exception re-raised. A re-run, after a worker
+    died or the change was stopped, continues from its checkpoint.
+    """
+    progress, _ = GenerationProgress.objects.get_or_create(table_change=change)
+    reporter = ProgressReporter(progress, change.num_rows, ['backfilling'])
+
+    generator = DynamicModelGenerator()
+    generator.interrupt_check = interrupt_check
+    generator.max_ai_values = getattr(settings, 'GENERATION_JOB_MAX_AI_VALUES', None)
+    stats = ExportStats()
+    if change.checkpoint:
+        stats.resume_from(change.stats)
+
+    change.status = 'processing'
+    change.error_message = ''
+    change.save(update_fields=['status', 'error_message'])
+
+    try:
+        summary = _apply_table_change(change, reporter, generator, openai_api_key, stats)
+    except GenerationInterrupted as e:
+        reporter.finish(e.status, reporter.percentage, str(e))
+        change.status = e.status
+        change.error_message = str(e)
+        change.stats = _stats(change, stats, generator, reporter)
+        change.save(update_fields=['status', 'error_message', 'stats'])
+        raise
+    except Exception as e:
+        reporter.finish('failed', 0, f'Error: {str(e)}')
+        change.status = 'failed'
+        change.error_message = str(e)
+        change.stats = _stats(change, stats, generator, reporter)
+        change.save(update_fields=['status', 'error_message', 'stats'])
+        raise
+
+    reporter.finish('completed', 100, f"Table updated: {summary['change']}")
+    change.status = 'completed'
+    change.completed_at = timezone.now()
+    change.stats = _stats(change, stats, generator, reporter)
+    change.save(update_fields=['status', 'completed_at', 'stats'])
+    return summary
+
+
+def _apply_table_change(change, reporter, generator, openai_api_key, stats):
+    """Run the DDL of a change, then backfill the columns it added
+
+    The new definition commits together with the DDL and a checkpoint of the
+    columns left to backfill; the backfill then checkpoints the last row id of
+    each committed chunk. A re-run (after a worker died) skips the DDL and
+    continues the backfill from there. A stopped backfill keeps the rows it
+    filled; the rest keep the new columns' placeholder values.
+    """
+    table_def = change.table_definition
+    checkpoint = change.checkpoint or {}
+    if 'added' not in checkpoint:
+        reporter.stage('altering_table', f'Altering {table_def.table_name}...')
+        old_definition = build_table_definition(table_def)
+        with stats.span('alter'), connection.schema_editor() as editor:
+            table_def.fields_definition = change.fields_definition
+            table_def.indexes = change.indexes
+            table_def.description = change.description
+            with transaction.atomic():
+                table_def.save()
+            plan = generator.alter_table(old_definition, build_table_definition(table_def), change.renames, editor)
+            checkpoint = {
+                'added': [field['name'] for field in plan['added']],
+                'deferred_indexes': plan['deferred_indexes'],
+                'summary': (f"{len(plan['added'])} added, {len(plan['renamed'])} renamed, "
+                            f"{len(plan['removed'])} removed, {len(plan['changed'])} changed"
+                            + (' (table rebuilt)' if plan['rebuilt'] else '')),
+                'last_id': 0,
+                'rows': 0,
+            }
+            DynamicTableChange.objects.filter(pk=change.pk).update(checkpoint=checkpoint)
+
+    table_definition_data = build_table_definition(table_def)
+    if checkpoint['added']:
+        if checkpoint['last_id']:
+            # Keep unique columns unique across the rows an earlier run already filled
+            generator.load_unique_values(table_definition_data)
+        reporter.stage('backfilling', f"Generating {', '.join(checkpoint['added'])} for existing rows...",
+                       rows_done=checkpoint['rows'])
+
+        def saved(rows, last_id):
+            DynamicTableChange.objects.filter(pk=change.pk).update(
+                checkpoint=dict(checkpoint, last_id=last_id, rows=checkpoint['rows'] + rows),
+            )
+            reporter.update(checkpoint['rows'] + rows)
+
+        try:
+            with stats.span('backfill'):
+                generator.backfill_columns(table_definition_data, checkpoint['added'], openai_api_key,
+                                           start_id=checkpoint['last_id'], on_chunk=saved)
+        except GenerationInterrupted as e:
+            change.refresh_from_db(fields=['checkpoint'])
+            raise GenerationInterrupted(
+                e.status, f"{e}; table changed ({checkpoint['summary']}), {change.rows_backfilled} rows backfilled"
+            ) from e
+        with stats.span('indexes'):
+            generator.create_indexes(table_definition_data, checkpoint['deferred_indexes'])
+    change.refresh_from_db(fields=['checkpoint'])
+    logger.info("Change #%s altered %s: %s", change.pk, table_def.table_name, checkpoint['summary'])
+    return {'rows': change.rows_backfilled, 'change': checkpoint['summary']}
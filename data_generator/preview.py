@@ -0,0 +1,101 @@
+"""
+Sample rows for a table's schema, generated in the request without an export
+
+Compiled generation plans are cached per schema, so a preview costs only the
+values themselves. Nothing is written: AI fields show values already stored
+in the table (cached for PREVIEW_AI_POOL_SECONDS) or, when there are none,
+the Faker values an export would fall back to.
+"""
+import hashlib
+import threading
+import time
+from collections import OrderedDict
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import DatabaseError, connection
+
+from .admission import ai_fields
+from .dynamic_models import DynamicModelGenerator, schema_hash
+
+# Compiled plans kept per process, most recently used last
+PLAN_CACHE_SIZE = 32
+DEFAULT_SEED = 0
+
+_plans = OrderedDict()
+_plans_lock = threading.Lock()
+
+
+def preview_rows(table_definition, num_rows=10, seed=None):
+    """Generate ``num_rows`` sample rows for a table definition
+
+    The same seed gives the same rows for the same schema. Returns a dict with
+    the columns, the rows, where each AI field's values came from ('pooled' or
+    'placeholder'), the seed, and the time taken in milliseconds.
+    """
+    started = time.perf_counter()
+    seed = DEFAULT_SEED if seed is None else seed
+    pools = {
+        field['name']: ai_value_pool(table_definition['table_name'], field)
+        for field in ai_fields(table_definition['fields_definition'])
+    }
+
+    with _plans_lock:
+        generator, plan = _compiled(table_definition)
+        rows = generator.sample_records(plan, num_rows, seed)
+
+    for name, pool in pools.items():
+        if pool:
+            for index, row in enumerate(rows):
+                row[name] = pool[(seed + index) % len(pool)]
+
+    return {
+        'columns': [field['name'] for field in table_definition['fields_definition']],
+        'rows': rows,
+        'ai_fields': {name: 'pooled' if pool else 'placeholder' for name, pool in pools.items()},
+        'seed': seed,
+        'elapsed_ms': round((time.perf_counter() - started) * 1000, 2),
+    }
+
+
+def ai_value_pool(table_name, field_def):
+    """Values of an AI field already stored in the table, newest first (cached)"""
+    description = field_def['options']['ai_description'].strip()
+    key = 'preview-ai-pool:{}:{}:{}'.format(
+        table_name, field_def['name'], hashlib.sha1(description.encode('utf-8')).hexdigest()[:12],
+    )
+    pool = cache.get(key)
+    if pool is None:
+        pool = _stored_values(table_name, field_def['name'], getattr(settings, 'PREVIEW_AI_POOL_SIZE', 200))
+        cache.set(key, pool, getattr(settings, 'PREVIEW_AI_POOL_SECONDS', 300))
+    return pool
+
+
+def _stored_values(table_name, field_name, limit):
+    quote_name = connection.ops.quote_name
+    sql = (f"SELECT DISTINCT {quote_name(field_name)} FROM {quote_name(table_name)} "
+           f"WHERE {quote_name(field_name)} IS NOT NULL LIMIT %s")
+    try:
+        with connection.cursor() as cursor:
+            # Not migrated yet, or a column only in an unsaved schema (SQLite would read an
+            # unknown quoted column as a string literal, so check rather than rely on an error)
+            columns = {column.name for column in connection.introspection.get_table_description(cursor, table_name)}
+            if field_name not in columns:
+                return []
+            cursor.execute(sql, [limit])
+            return [row[0] for row in cursor.fetchall()]
+    except DatabaseError:
+        return []
+
+
+def _compiled(table_definition):
+    """Generator and compiled plan for a schema, from the cache (call with _plans_lock held)"""
+    key = schema_hash(table_definition)
+    entry = _plans.pop(key, None)
+    if entry is None:
+        generator = DynamicModelGenerator(seed=DEFAULT_SEED)
+        entry = (generator, generator.compile_plan(table_definition['fields_definition']))
+    _plans[key] = entry
+    while len(_plans) > PLAN_CACHE_SIZE:
+        _plans.popitem(last=False)
+    return entry
@@ -0,0 +1,202 @@
+"""
+Export progress: the reporter the pipeline updates, and the snapshots and
+Server-Sent Events stream watchers read it through
+"""
+import asyncio
+import json
+import time
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.utils import timezone
+
+from .models import DynamicTableExport, GenerationJob, GenerationProgress
+
+TERMINAL_STATUSES = ('completed', 'failed', 'cancelled')
+
+# Comment line sent on an idle stream so proxies don't time the connection out
+KEEPALIVE_SECONDS = 15
+
+
+class ProgressReporter:
+    """Tracks an export's progress in memory, writing it to GenerationProgress at most every flush interval
+
+    ``stages`` are the steps that process rows (e.g. generate, then insert);
+    each covers ``rows_total`` rows and gets an equal share of the percentage.
+    Other steps (writing the file, compressing) keep the percentage where it is.
+    """
+    FLUSH_FIELDS = ['current_step', 'progress_percentage', 'message',
+                    'rows_done', 'rows_total', 'rows_per_second', 'updated_at']
+
+    def __init__(self, progress, rows_total, stages=('generating_data',), flush_interval_ms=None):
+        if flush_interval_ms is None:
+            flush_interval_ms = getattr(settings, 'PROGRESS_FLUSH_INTERVAL_MS', 500)
+        self.progress = progress
+        self.rows_total = rows_total
+        self.stages = list(stages)
+        self.flush_interval = flush_interval_ms / 1000
+        self.step = progress.current_step
+        self.message = progress.message
+        self.percentage = progress.progress_percentage
+        # Carried over so a run picking up an earlier step (e.g. merging shards) continues its percentage
+        self.rows_done = progress.rows_done
+        self._stage_started = self._last_flush = time.monotonic()
+        self._stage_start_rows = 0
+
+    def stage(self, step, message, rows_done=0):
+        """Start a step; always flushed"""
+        self.percentage = self._stage_percentage()
+        self.step = step
+        self.message = message
+        self.rows_done = self._stage_start_rows = rows_done
+        self._stage_started = time.monotonic()
+        self.flush()
+
+    def update(self, rows_done, message=None):
+        """Record rows finished in the current step; flushed only if the interval has passed"""
+        self.rows_done = rows_done
+        if message is not None:
+            self.message = message
+        if time.monotonic() - self._last_flush >= self.flush_interval:
+            self.flush()
+
+    def advance(self, rows):
+        self.update(self.rows_done + rows)
+
+    def track(self, chunks):
+        """Pass row chunks through, counting each once its consumer asks for the next"""
+        for chunk in chunks:
+            yield chunk
+            self.advance(len(chunk))
+
+    @property
+    def rows_per_second(self):
+        elapsed = time.monotonic() - self._stage_started
+        return (self.rows_done - self._stage_start_rows) / elapsed if elapsed > 0 else 0.0
+
+    def _stage_percentage(self):
+        if self.step not in self.stages:
+            return self.percentage
+        fraction = min(1.0, self.rows_done / self.rows_total) if self.rows_total else 1.0
+        # 100 is reserved for finish()
+        return min(99, int((self.stages.index(self.step) + fraction) * 100 / len(self.stages)))
+
+    def flush(self):
+        self.percentage = self._stage_percentage()
+        self._write()
+
+    def finish(self, step, percentage, message):
+        """Record the final state of the export; always flushed"""
+        self.step, self.percentage, self.message = step, percentage, message
+        self._write()
+
+    def _write(self):
+        progress = self.progress
+        progress.current_step = self.step
+        progress.progress_percentage = self.percentage
+        progress.message = self.message
+        progress.rows_done = self.rows_done
+        progress.rows_total = self.rows_total
+        progress.rows_per_second = round(self.rows_per_second, 1)
+        progress.save(update_fields=self.FLUSH_FIELDS)
+        self._last_flush = time.monotonic()
+
+
+def progress_snapshot(export_id):
+    """Return the current progress of an export as a plain dict (None if the export is gone)"""
+    export = DynamicTableExport.objects.filter(pk=export_id).select_related('progress').first()
+    if export is None:
+        return None
+    try:
+        progress = export.progress
+    except GenerationProgress.DoesNotExist:
+        progress = None
+
+    percentage = progress.progress_percentage if progress else 0
+    if export.status == 'completed':
+        percentage = 100
+
+    return {
+        'status': export.status,
+        'step': progress.current_step if progress else 'queued',
+        'percentage': percentage,
+        'message': export.error_message if export.status in ('failed', 'cancelled') else (progress.message if progress else ''),
+        'rows_done': progress.rows_done if progress else 0,
+        'rows_total': (progress.rows_total if progress else 0) or export.num_records,
+        'rows_per_second': progress.rows_per_second if progress else 0,
+        'eta_seconds': _eta_seconds(export, percentage),
+    }
+
+
+def _eta_seconds(export, percentage):
+    """Extrapolate the time left from the running job's elapsed time"""
+    if export.status != 'processing' or not 0 < percentage < 100:
+        return None
+    started_at = (GenerationJob.objects.filter(export_id=export.pk, status__in=GenerationJob.IN_PROGRESS_STATUSES)
+                  .values_list('started_at', flat=True).first())
+    if started_at is None:
+        return None
+    elapsed = (timezone.now() - started_at).total_seconds()
+    return round(elapsed * (100 - percentage) / percentage)
+
+
+def format_event(event, data):
+    """Encode one Server-Sent Event"""
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n"
+
+
+def _retry_field(milliseconds):
+    return f"retry: {milliseconds}\n\n"
+
+
+async def iter_progress_events(export_id):
+    """Stream progress events until the export completes, fails or is cancelled
+
+    A 'progress' event is sent whenever the snapshot changes, then a final
+    'completed', 'failed' or 'cancelled' event. The stream also ends after
+    settings.PROGRESS_STREAM_MAX_SECONDS; EventSource reconnects by itself.
+    """
+    interval = getattr(settings, 'PROGRESS_STREAM_INTERVAL_SECONDS', 0.5)
+    deadline = time.monotonic() + getattr(settings, 'PROGRESS_STREAM_MAX_SECONDS', 300)
+    snapshot_of = sync_to_async(progress_snapshot)
+
+    yield _retry_field(int(interval * 1000))
+    last_state, last_sent = None, time.monotonic()
+    while True:
+        snapshot = await snapshot_of(export_id)
+        if snapshot is None:
+            yield format_event('failed', {'status': 'failed', 'message': 'Export not found'})
+            return
+        if snapshot['status'] in TERMINAL_STATUSES:
+            yield format_event(snapshot['status'], snapshot)
+            return
+
+        # The ETA moves on every tick; only real progress is worth an event
+        state = {key: value for key, value in snapshot.items() if key != 'eta_seconds'}
+        now = time.monotonic()
+        if state != last_state:
+            yield format_event('progress', snapshot)
+            last_state, last_sent = state, now
+        elif now - last_sent >= KEEPALIVE_SECONDS:
+            yield ": keepalive\n\n"
+            last_sent = now
+
+        if now >= deadline:
+            return
+        await asyncio.sleep(interval)
+
+
+def iter_progress_snapshot(export_id):
+    """Single-snapshot stream for servers that can't hold a connection open (WSGI)
+
+    The client's EventSource reconnects after the retry delay, so this degrades
+    to a lightweight poll.
+    """
+    yield _retry_field(getattr(settings, 'PROGRESS_STREAM_WSGI_RETRY_MS', 1000))
+    snapshot = progress_snapshot(export_id)
+    if snapshot is None:
+        yield format_event('failed', {'status': 'failed', 'message': 'Export not found'})
+    elif snapshot['status'] in TERMINAL_STATUSES:
+        yield format_event(snapshot['status'], snapshot)
+    else:
+        yield format_event('progress', snapshot)
@@ -0,0 +1,101 @@
+"""
+Which queued generation job a worker runs next
+
+Jobs are ordered by priority class first (interactive before standard before
+bulk), then by weighted fair share: within a class, the share (requester, or
+table with GENERATION_FAIR_SHARE_BY='table') with the least running work per
+unit of weight goes first, and among equals the job that has waited longest.
+Jobs that call the LLM are additionally capped by GENERATION_LLM_CONCURRENCY.
+"""
+from collections import defaultdict
+from datetime import timedelta
+
+from django.conf import settings
+from django.db.models import Avg, Count, Max, Min, Q, Subquery, Value
+from django.db.models.functions import Coalesce
+from django.db.models.lookups import LessThan
+from django.utils import timezone
+
+from .models import GenerationJob
+
+# Queued jobs considered per scheduling decision
+SCAN_LIMIT = 500
+
+# The table a job works on, whether it runs an export or a table change
+JOB_TABLE = Coalesce('export__table_definition_id', 'table_change__table_definition_id')
+
+
+def priority_for(estimate):
+    """Priority class for a job from its admission estimate"""
+    seconds = (estimate or {}).get('seconds', 0)
+    if seconds <= getattr(settings, 'GENERATION_INTERACTIVE_MAX_SECONDS', 10):
+        return GenerationJob.PRIORITY_INTERACTIVE
+    if seconds >= getattr(settings, 'GENERATION_BULK_MIN_SECONDS', 300):
+        return GenerationJob.PRIORITY_BULK
+    return GenerationJob.PRIORITY_STANDARD
+
+
+def share_key(requester, table_id):
+    if getattr(settings, 'GENERATION_FAIR_SHARE_BY', 'requester') == 'table':
+        return f'table:{table_id}'
+    return requester or 'anonymous'
+
+
+def share_weight(key):
+    return max(0.01, getattr(settings, 'GENERATION_FAIR_SHARE_WEIGHTS', {}).get(key, 1.0))
+
+
+def schedule(candidates):
+    """Return the pks of queued ``candidates`` in the order workers should try them"""
+    fields = ('pk', 'priority', 'requester', 'table_id', 'queued_at', 'created_at')
+    queued = list(candidates.order_by('priority', 'queued_at', 'created_at').annotate(table_id=JOB_TABLE)
+                  .values(*fields)[:SCAN_LIMIT])
+    if len(queued) < 2:
+        return [row['pk'] for row in queued]
+
+    # Every running job counts for at least a second, so many cheap jobs still add up
+    usage = defaultdict(float)
+    running = GenerationJob.objects.filter(status__in=GenerationJob.IN_PROGRESS_STATUSES).annotate(
+        table_id=JOB_TABLE).values_list('requester', 'table_id', 'estimated_seconds')
+    for requester, table_id, seconds in running:
+        usage[share_key(requester, table_id)] += max(1.0, seconds)
+
+    def order(row):
+        key = share_key(row['requester'], row['table_id'])
+        return row['priority'], usage[key] / share_weight(key), row['queued_at'] or row['created_at']
+
+    return [row['pk'] for row in sorted(queued, key=order)]
+
+
+def within_llm_limit(jobs):
+    """Narrow ``jobs`` so no more than GENERATION_LLM_CONCURRENCY LLM-calling jobs run at once"""
+    limit = getattr(settings, 'GENERATION_LLM_CONCURRENCY', 2)
+    if not limit:
+        return jobs
+    running_llm = GenerationJob.objects.filter(status='running', estimated_ai_values__gt=0)
+    running_count = Coalesce(
+        Subquery(running_llm.order_by().values('status').annotate(n=Count('pk')).values('n')),
+        Value(0),
+    )
+    return jobs.filter(Q(estimated_ai_values=0) | LessThan(running_count, limit))
+
+
+def queue_wait_by_class(hours=24):
+    """Queue wait per priority class: jobs started in the last ``hours`` plus those still waiting"""
+    now = timezone.now()
+    since = now - timedelta(hours=hours)
+    stats = []
+    for priority, label in GenerationJob.PRIORITY_CHOICES:
+        jobs = GenerationJob.objects.filter(priority=priority)
+        started = jobs.filter(started_at__gte=since).aggregate(
+            jobs=Count('pk'), avg_wait=Avg('wait_seconds'), max_wait=Max('wait_seconds'))
+        waiting = jobs.filter(status='queued').aggregate(jobs=Count('pk'), oldest=Min('queued_at'))
+        stats.append({
+            'label': label,
+            'started': started['jobs'],
+            'avg_wait': round(started['avg_wait'] or 0, 1),
+            'max_wait': round(started['max_wait'] or 0, 1),
+            'waiting': waiting['jobs'],
+            'oldest_wait': round((now - waiting['oldest']).total_seconds(), 1) if waiting['oldest'] else None,
+        })
+    return stats
@@ -0,0 +1,477 @@
+"""
+Sharded file exports: large exports are split into row ranges that workers on any host generate in parallel
+
+The worker that claims a large file export's job splits it into GenerationShard
+rows and moves on. Any worker sharing the database and the output volume then
+leases shards one at a time, writes each shard's rows to a JSON Lines file under
+settings.GENERATION_SHARD_DIR and renews its lease while it runs; a shard whose
+lease expires (its worker died) goes back to pending for another worker. When
+the last shard completes the job is requeued, and the worker that claims it
+merges the shard files into the export's artifact through the normal pipeline.
+Split exports (see data_generator.parts) shard into one shard per part: each
+shard is written straight to its part file, and the last step only collects them.
+"""
+import hashlib
+import json
+import logging
+import os
+import shutil
+import threading
+import time
+from contextlib import contextmanager
+from datetime import date, datetime, timedelta
+from decimal import Decimal
+from itertools import chain, islice
+
+from django.conf import settings
+from django.db import connection, transaction
+from django.db.models import Count, F, Min, Q, Sum
+from django.utils import timezone
+
+from .api_keys import forget_api_keys
+from .compression import COMPRESSION_SUFFIXES
+from .dynamic_models import DynamicModelGenerator, GenerationInterrupted
+from .models import DynamicTableExport, GenerationJob, GenerationProgress, GenerationShard
+from .parts import part_name, rows_per_part, write_part
+from .pipeline import build_table_definition, export_stages
+
+logger = logging.getLogger(__name__)
+
+# How many pending shards a worker tries per claim attempt
+CLAIM_BATCH = 5
+# Rows per chunk when a shard file is read back for the merge
+READ_CHUNK_ROWS = 1000
+
+
+class ShardLost(Exception):
+    """The shard's lease was taken over, or its job stopped, while the worker was generating it"""
+
+
+def shard_size(job):
+    """Rows per shard when a claimed job is split into shards, or None when it runs on one worker
+
+    Only large file exports are sharded. Database loads already run as
+    resumable slices; fields declared unique need a single generator to keep
+    values distinct; LLM-backed jobs would bypass GENERATION_LLM_CONCURRENCY
+    with a shard on every host; and a partial file can't be kept from shards.
+    A split export gets a shard per part, unless its rows also go into the
+    table (its parts can't be read back for the insert). An extension is
+    generated the way its original was, so it continues the same stream.
+    """
+    shard_rows = _shard_rows()
+    export = job.export
+    checkpoint = export.checkpoint or {}
+    if 'shard_rows' in checkpoint:
+        # Extending a sharded export: shards of the same size continue its shard seeds
+        return checkpoint['shard_rows']
+    if checkpoint.get('rng_state'):
+        # Extending an export generated in one stream: only one worker can continue it
+        return None
+    if not shard_rows or export.num_records <= shard_rows:
+        return None
+    if export.export_format not in DynamicModelGenerator.EXPORT_FORMATS:
+        return None
+    if job.estimated_ai_values or job.options.get('keep_partial'):
+        return None
+    if any(field.get('options', {}).get('unique') for field in export.table_definition.fields_definition):
+        return None
+    if job.options.get('split'):
+        if job.options.get('save_to_db'):
+            return None
+        return rows_per_part(export, build_table_definition(export.table_definition), job.options)
+    return shard_rows
+
+
+def shard_seed(seed, index):
+    """Seed for one shard, derived from the export's so a re-run produces the same rows"""
+    digest = hashlib.sha256(f'{seed}:{index}'.encode('utf-8')).digest()
+    return int.from_bytes(digest[:8], 'big') >> 2
+
+
+def split_job(job, shard_rows):
+    """Replace a claimed job's single run with shards for any worker to lease; returns the shard count
+
+    An extension's shards continue the original's shard seeds from the shard
+    after its last, so they don't repeat its rows. The shard size and first
+    shard are kept in the export's checkpoint, from which the merge records
+    where an extension of this export continues.
+    """
+    export = job.export
+    first_index = (export.checkpoint or {}).get('first_shard', 0)
+    shards = [
+        GenerationShard(job=job, index=index, start_row=start,
+                        num_rows=min(shard_rows, export.num_records - start),
+                        seed=shard_seed(export.seed, first_index + index))
+        for index, start in enumerate(range(0, export.num_records, shard_rows))
+    ]
+    now = timezone.now()
+    with transaction.atomic():
+        GenerationShard.objects.bulk_create(shards)
+        GenerationJob.objects.filter(pk=job.pk, status='running').update(status='sharded', worker='', heartbeat_at=None)
+    export.checkpoint = {'row': 0, 'shard_rows': shard_rows, 'first_shard': first_index}
+    DynamicTableExport.objects.filter(pk=export.pk).update(status='processing', error_message='',
+                                                           checkpoint=export.checkpoint)
+    GenerationProgress.objects.filter(export=export).update(
+        current_step='generating_shards', progress_percentage=0, rows_done=0, rows_total=export.num_records,
+        rows_per_second=0, updated_at=now,
+        message=f'Split into {len(shards)} shards of up to {shard_rows:,} rows; waiting for workers...',
+    )
+    logger.info("Job #%s split into %s shards of up to %s rows", job.pk, len(shards), shard_rows)
+    return len(shards)
+
+
+def next_shard_priority():
+    """Priority class of the most urgent pending shard (None when there are none)"""
+    return GenerationShard.objects.filter(status='pending', job__status='sharded').aggregate(
+        priority=Min('job__priority'))['priority']
+
+
+def claim_shard(worker_id):
+    """Lease the next pending shard and return it (None if there are none)
+
+    Shards of the most urgent, longest-queued job go first. Like claim_job
+    this is a compare-and-set UPDATE, so a shard is only ever leased to one worker.
+    """
+    candidates = GenerationShard.objects.filter(status='pending', job__status='sharded').order_by(
+        'job__priority', 'job__queued_at', 'job_id', 'index').values_list('pk', flat=True)[:CLAIM_BATCH]
+    for pk in candidates:
+        now = timezone.now()
+        if GenerationShard.objects.filter(pk=pk, status='pending').update(
+            status='running', worker=worker_id, attempts=F('attempts') + 1, rows_done=0,
+            started_at=now, lease_expires_at=now + timedelta(seconds=_lease_seconds()),
+        ):
+            return GenerationShard.objects.select_related('job__export__table_definition').get(pk=pk)
+    return None
+
+
+def run_shard(shard):
+    """Generate a leased shard's rows into its shard file (its part file, for a split export)
+
+    The last shard to complete hands its job back to the queue for merging.
+    """
+    job = shard.job
+    export = job.export
+    path = shard_path(shard)
+    # Per attempt, so a worker that lost its lease can't clobber the new holder's file
+    partial_path = f'{path}.{shard.attempts}.tmp'
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    logger.info("Worker %s running shard %s of job #%s (rows %s-%s, attempt %s)", shard.worker, shard.index,
+                job.pk, shard.start_row, shard.start_row + shard.num_rows, shard.attempts)
+
+    generator = DynamicModelGenerator(seed=shard.seed)
+    generator.interrupt_check = ShardInterruptCheck(shard)
+    progress = ShardProgress(job, export_stages(export, job.options, sharded=True))
+    owned = GenerationShard.objects.filter(pk=shard.pk, status='running', attempts=shard.attempts)
+    table_definition = build_table_definition(export.table_definition)
+    rows_done = 0
+
+    def generated():
+        nonlocal rows_done
+        for chunk in generator.iter_synthetic_data(table_definition, shard.num_rows):
+            yield chunk
+            rows_done += len(chunk)
+            owned.update(rows_done=rows_done)
+            progress.update()
+
+    try:
+        with lease(shard):
+            if job.options.get('split'):
+                written = write_part(export, table_definition, chain.from_iterable(generated()), partial_path,
+                                     job.options, generator)
+            else:
+                with open(partial_path, 'w', encoding='utf-8') as f:
+                    for chunk in generated():
+                        f.writelines(json.dumps(row, default=_encode_value) + '\n' for row in chunk)
+                written = partial_path
+    except ShardLost:
+        _remove_partial(partial_path)
+        logger.info("Shard %s of job #%s stopped: its lease or job ended", shard.index, job.pk)
+        return False
+    except GenerationInterrupted as e:
+        _remove_partial(partial_path)
+        abort_sharded_job(job, e.status, str(e))
+        return False
+    except Exception as e:
+        _remove_partial(partial_path)
+        logger.exception("Shard %s of job #%s failed", shard.index, job.pk)
+        _retry_or_fail(shard, str(e))
+        return False
+
+    # Attempts of the same shard write identical rows, so replacing first is safe
+    try:
+        os.replace(written, path)
+    except FileNotFoundError:
+        # The job ended and its shard directory was removed under us
+        return False
+    if not owned.update(status='completed', rows_done=rows_done, file_path=path,
+                        lease_expires_at=None, finished_at=timezone.now()):
+        logger.info("Shard %s of job #%s finished after losing its lease", shard.index, job.pk)
+        return False
+    progress.flush()
+    _hand_off_to_merge(job)
+    return True
+
+
+def read_shards(job):
+    """Yield the row chunks of a job's completed shards, in row order
+
+    Shard files are parsed as plain JSON, never unpickled, so whatever else can
+    write to the shard volume can't run code in the merging worker.
+    """
+    for path in job.shards.order_by('index').values_list('file_path', flat=True):
+        with open(path, encoding='utf-8') as f:
+            rows = (json.loads(line, object_hook=_decode_value) for line in f)
+            while True:
+                chunk = list(islice(rows, READ_CHUNK_ROWS))
+                if not chunk:
+                    break
+                yield chunk
+
+
+def shard_parts(job):
+    """The part files written by a split export's shards, in row order"""
+    return [
+        {'path': path, 'start_row': start_row, 'rows': rows}
+        for path, start_row, rows in job.shards.order_by('index').values_list('file_path', 'start_row', 'num_rows')
+    ]
+
+
+def shard_timings(job):
+    """(shards, worker seconds summed over them, wall-clock seconds from first start to last finish)"""
+    spans = list(job.shards.filter(status='completed').values_list('started_at', 'finished_at'))
+    if not spans:
+        return 0, 0.0, 0.0
+    worker_seconds = sum((finished - started).total_seconds() for started, finished in spans)
+    wall_seconds = (max(finished for _, finished in spans) - min(started for started, _ in spans)).total_seconds()
+    return len(spans), worker_seconds, wall_seconds
+
+
+def discard_shard_files(job):
+    """Delete a job's shard files once they are merged or no longer needed
+
+    This includes partial files left behind by workers that died mid-shard.
+    """
+    job.shards.update(file_path='')
+    job_dir = _job_dir(job)
+    shutil.rmtree(job_dir, ignore_errors=True)
+    try:
+        os.rmdir(os.path.dirname(job_dir))
+    except OSError:
+        pass
+
+
+def abort_sharded_job(job, status, message):
+    """Stop a sharded job: record the outcome, stop its shards and remove their files
+
+    Returns False when the job was no longer sharded (already merged or stopped).
+    """
+    now = timezone.now()
+    if not GenerationJob.objects.filter(pk=job.pk, status='sharded').update(
+        status=status, error_message=message, finished_at=now,
+    ):
+        return False
+    forget_api_keys([job.pk])
+    job.shards.filter(status__in=('pending', 'running')).update(
+        status='cancelled', lease_expires_at=None, finished_at=now,
+    )
+    DynamicTableExport.objects.filter(pk=job.export_id).update(
+        status=status, error_message=message, inflight_key=None,
+    )
+    GenerationProgress.objects.filter(export_id=job.export_id).update(
+        current_step=status, message=message, updated_at=now,
+    )
+    discard_shard_files(job)
+    logger.info("Sharded job #%s stopped: %s", job.pk, message)
+    return True
+
+
+def requeue_stale_shards():
+    """Return shards whose lease expired to pending; stop sharded jobs past their deadline
+
+    A shard that keeps losing its worker fails its job after
+    settings.GENERATION_JOB_MAX_ATTEMPTS. Returns (requeued, failed) counts.
+    """
+    now = timezone.now()
+    failed = 0
+    grace = timedelta(seconds=_lease_seconds())
+    for job in GenerationJob.objects.filter(status='sharded', deadline_at__lt=now - grace):
+        failed += abort_sharded_job(job, 'failed', 'Timed out')
+
+    stale = GenerationShard.objects.filter(status='running', lease_expires_at__lt=now)
+    max_attempts = getattr(settings, 'GENERATION_JOB_MAX_ATTEMPTS', 3)
+    for shard in stale.filter(attempts__gte=max_attempts).select_related('job'):
+        failed += abort_sharded_job(shard.job, 'failed', f'Shard {shard.index} lost its worker {shard.attempts} times')
+    requeued = stale.filter(attempts__lt=max_attempts).update(
+        status='pending', worker='', rows_done=0, lease_expires_at=None,
+    )
+    if requeued or failed:
+        logger.warning("Requeued %s stale shard(s) and stopped %s sharded job(s)", requeued, failed)
+    return requeued, failed
+
+
+class ShardInterruptCheck:
+    """Stops a shard once its job is past its deadline, or the shard or job is no longer running
+
+    The database is read at most every settings.GENERATION_CANCEL_POLL_SECONDS.
+    """
+
+    def __init__(self, shard):
+        self.owned = GenerationShard.objects.filter(
+            pk=shard.pk, status='running', attempts=shard.attempts, job__status='sharded',
+        )
+        self.deadline_at = shard.job.deadline_at
+        self.poll_seconds = getattr(settings, 'GENERATION_CANCEL_POLL_SECONDS', 1.0)
+        self._next_poll = 0
+
+    def __call__(self):
+        if self.deadline_at and timezone.now() >= self.deadline_at:
+            raise GenerationInterrupted('failed', 'Timed out')
+        now = time.monotonic()
+        if now >= self._next_poll:
+            self._next_poll = now + self.poll_seconds
+            if not self.owned.exists():
+                raise ShardLost()
+
+
+class ShardProgress:
+    """Writes a sharded export's progress, summed over its shards, at most every flush interval
+
+    Shard generation is the first of the export's stages, so it covers that
+    stage's share of the percentage; the merge continues from there.
+    """
+
+    def __init__(self, job, stages):
+        self.job = job
+        self.stages = stages
+        self.flush_interval = getattr(settings, 'PROGRESS_FLUSH_INTERVAL_MS', 500) / 1000
+        self._last_flush = time.monotonic()
+
+    def update(self):
+        if time.monotonic() - self._last_flush >= self.flush_interval:
+            self.flush()
+
+    def flush(self):
+        totals = self.job.shards.aggregate(
+            rows=Sum('rows_done'), started=Min('started_at'),
+            shards=Count('pk'), completed=Count('pk', filter=Q(status='completed')),
+        )
+        rows_total = self.job.export.num_records
+        rows = totals['rows'] or 0
+        now = timezone.now()
+        elapsed = (now - totals['started']).total_seconds() if totals['started'] else 0
+        GenerationProgress.objects.filter(export_id=self.job.export_id).update(
+            current_step='generating_shards',
+            progress_percentage=min(99, int(rows * 100 / rows_total / len(self.stages))) if rows_total else 0,
+            message=f'{totals["completed"]} of {totals["shards"]} shards generated',
+            rows_done=rows, rows_total=rows_total,
+            rows_per_second=round(rows / elapsed, 1) if elapsed > 0 else 0,
+            updated_at=now,
+        )
+        self._last_flush = time.monotonic()
+
+
+@contextmanager
+def lease(shard):
+    """Renew the shard's lease from a background thread while it is generated"""
+    interval = _lease_seconds() / 3
+    owned = GenerationShard.objects.filter(pk=shard.pk, status='running', attempts=shard.attempts)
+    stop = threading.Event()
+
+    def renew():
+        try:
+            while not stop.wait(interval):
+                try:
+                    owned.update(lease_expires_at=timezone.now() + timedelta(seconds=_lease_seconds()))
+                except Exception:
+                    logger.warning("Could not renew the lease on shard #%s", shard.pk, exc_info=True)
+        finally:
+            connection.close()
+
+    thread = threading.Thread(target=renew, name=f'shard-{shard.pk}-lease', daemon=True)
+    thread.start()
+    try:
+        yield
+    finally:
+        stop.set()
+        thread.join()
+
+
+def shard_path(shard):
+    job = shard.job
+    if job.options.get('split'):
+        export = job.export
+        name = part_name(export, shard.index) + COMPRESSION_SUFFIXES.get(export.compression, '')
+        return os.path.join(_job_dir(job), name)
+    return os.path.join(_job_dir(job), f'{shard.index:05d}.jsonl')
+
+
+def _job_dir(job):
+    shard_dir = getattr(settings, 'GENERATION_SHARD_DIR', None) or os.path.join(settings.BASE_DIR, 'output', 'shards')
+    return os.path.join(shard_dir, f'export_{job.export_id}', f'job_{job.pk}')
+
+
+def _hand_off_to_merge(job):
+    """Requeue a sharded job once all its shards are done, so the next free worker merges them"""
+    if job.shards.exclude(status='completed').exists():
+        return False
+    now = timezone.now()
+    # Shard generation time counts against the job's time limit, as a slice would
+    handed_off = GenerationJob.objects.filter(pk=job.pk, status='sharded').update(
+        status='queued', attempts=F('attempts') - 1, queued_at=now,
+        run_seconds=F('run_seconds') + (now - job.started_at).total_seconds(),
+    )
+    if handed_off:
+        GenerationProgress.objects.filter(export_id=job.export_id).update(
+            message='All shards generated; waiting for a worker to merge them...', updated_at=now,
+        )
+    return bool(handed_off)
+
+
+def _retry_or_fail(shard, error_message):
+    """Return a failed shard to pending, or fail its job once it has used up its attempts"""
+    max_attempts = getattr(settings, 'GENERATION_JOB_MAX_ATTEMPTS', 3)
+    owned = GenerationShard.objects.filter(pk=shard.pk, status='running', attempts=shard.attempts)
+    if shard.attempts < max_attempts:
+        owned.update(status='pending', worker='', rows_done=0, lease_expires_at=None, error_message=error_message)
+        return
+    owned.update(status='failed', error_message=error_message, lease_expires_at=None, finished_at=timezone.now())
+    abort_sharded_job(shard.job, 'failed', f'Shard {shard.index} failed: {error_message}')
+
+
+# Values JSON has no type for are written as {tag: text}, so the merge writes them as generated
+VALUE_TAGS = {
+    '$datetime': (datetime, datetime.fromisoformat),
+    '$date': (date, date.fromisoformat),
+    '$decimal': (Decimal, Decimal),
+}
+
+
+def _encode_value(value):
+    # datetime before date: a datetime is also a date
+    for tag, (value_type, _) in VALUE_TAGS.items():
+        if isinstance(value, value_type):
+            return {tag: str(value) if value_type is Decimal else value.isoformat()}
+    raise TypeError(f"Can't write a {type(value).__name__} value to a shard file")
+
+
+def _decode_value(obj):
+    if len(obj) == 1:
+        tag, text = next(iter(obj.items()))
+        if tag in VALUE_TAGS:
+            return VALUE_TAGS[tag][1](text)
+    return obj
+
+
+def _remove_partial(partial_path):
+    """Delete a shard's partial file, including its compressed copy for a split export"""
+    for suffix in ('',) + tuple(COMPRESSION_SUFFIXES.values()):
+        if os.path.exists(partial_path + suffix):
+            os.remove(partial_path + suffix)
+
+
+def _shard_rows():
+    return getattr(settings, 'GENERATION_SHARD_ROWS', 200000)
+
+
+def _lease_seconds():
+    return getattr(settings, 'GENERATION_JOB_LEASE_SECONDS', 120)
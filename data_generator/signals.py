@@ -0,0 +1,15 @@
+"""
+Keep the dynamic model cache in step with stored table definitions
+"""
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from .dynamic_models import model_registry
+from .models import DynamicTableDefinition
+
+
+@receiver(post_save, sender=DynamicTableDefinition)
+@receiver(post_delete, sender=DynamicTableDefinition)
+def evict_dynamic_model(sender, instance, **kwargs):
+    """Drop the cached model class whenever its definition is saved or deleted"""
+    model_registry.evict(instance.table_name)
@@ -0,0 +1,148 @@
+"""
+Per-export timing stats: where an export's time went, saved as DynamicTableExport.stats
+
+The pipeline wraps each stage (writing the file, compressing, inserting,
+collecting parts) in a span and times every generated chunk. Spans nest: rows
+are generated lazily while the writer pulls them, so a span only counts its
+own time, not the generation (or inner spans) that ran inside it. Time spent
+waiting on the LLM is reported separately from the rest of generation.
+Peak memory is the worker's resident memory sampled after every chunk and
+stage of this export's run, so it is the export's own, not the worker's
+lifetime peak.
+"""
+import os
+import time
+from collections import defaultdict
+from contextlib import contextmanager
+
+try:
+    PAGE_SIZE = os.sysconf('SC_PAGE_SIZE')
+except (AttributeError, ValueError, OSError):
+    # Not available on Windows
+    PAGE_SIZE = None
+
+
+class ExportStats:
+    """Accumulates stage and chunk timings for one run of an export"""
+
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.seconds = defaultdict(float)
+        self.chunks = 0
+        self.chunk_seconds = 0.0
+        self.max_chunk_seconds = 0.0
+        self.runs = 1
+        self.shards = None
+        self.peak_rss_mib = None
+        self._previous_seconds = 0.0
+        self._stack = []
+        self._sample_rss()
+
+    def add_shards(self, count, worker_seconds, wall_seconds):
+        """Count the shard phase of a sharded export, which ran on other workers before this run"""
+        self.seconds['shards'] += wall_seconds
+        self._previous_seconds += wall_seconds
+        self.shards = {'count': count, 'worker_seconds': round(worker_seconds, 3),
+                       'wall_seconds': round(wall_seconds, 3)}
+
+    @contextmanager
+    def span(self, name):
+        """Time a block as stage ``name``, excluding any timed work nested inside it"""
+        nested = [0.0]
+        self._stack.append(nested)
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            elapsed = time.perf_counter() - started
+            self._stack.pop()
+            self.seconds[name] += elapsed - nested[0]
+            self._count_in_parent(elapsed)
+            self._sample_rss()
+
+    def timed(self, chunks, name='generation'):
+        """Pass chunks through, counting the time spent producing each one under stage ``name``"""
+        iterator = iter(chunks)
+        while True:
+            started = time.perf_counter()
+            try:
+                chunk = next(iterator)
+            except StopIteration:
+                return
+            elapsed = time.perf_counter() - started
+            self.seconds[name] += elapsed
+            self.chunks += 1
+            self.chunk_seconds += elapsed
+            self.max_chunk_seconds = max(self.max_chunk_seconds, elapsed)
+            self._count_in_parent(elapsed)
+            self._sample_rss()
+            yield chunk
+
+    def resume_from(self, previous):
+        """Continue the totals of an earlier run (a resumed or time-sliced database load)"""
+        if not previous:
+            return
+        for name, seconds in previous.get('stages', {}).items():
+            self.seconds[name] += seconds
+        chunks = previous.get('chunks', {})
+        self.chunks += chunks.get('count', 0)
+        self.chunk_seconds += chunks.get('total_seconds', 0.0)
+        self.max_chunk_seconds = max(self.max_chunk_seconds, chunks.get('max_seconds', 0.0))
+        self.runs += previous.get('runs', 1)
+        self._previous_seconds = previous.get('total_seconds', 0.0)
+        if previous.get('peak_rss_mib') is not None:
+            self.peak_rss_mib = max(self.peak_rss_mib or 0.0, previous['peak_rss_mib'])
+
+    def as_dict(self, rows, ai_seconds=0.0, ai_values=0):
+        """The stats saved on the export"""
+        total = self._previous_seconds + time.perf_counter() - self.started
+        stages = dict(self.seconds)
+        if ai_seconds:
+            # LLM calls happen inside generation; report them on their own
+            stages['generation'] = max(0.0, stages.get('generation', 0.0) - ai_seconds)
+            stages['ai'] = stages.get('ai', 0.0) + ai_seconds
+        stats = {
+            'total_seconds': round(total, 3),
+            'stages': {name: round(seconds, 3) for name, seconds in stages.items()},
+            # Bookkeeping between stages: progress writes, checkpoints, job state
+            'other_seconds': round(max(0.0, total - sum(stages.values())), 3),
+            'rows': rows,
+            'rows_per_second': round(rows / total, 1) if total > 0 else 0.0,
+            'ai_values': ai_values,
+            'chunks': {
+                'count': self.chunks,
+                'total_seconds': round(self.chunk_seconds, 3),
+                'mean_seconds': round(self.chunk_seconds / self.chunks, 4) if self.chunks else 0.0,
+                'max_seconds': round(self.max_chunk_seconds, 4),
+            },
+            'peak_rss_mib': None if self.peak_rss_mib is None else round(self.peak_rss_mib, 1),
+            'runs': self.runs,
+        }
+        if self.shards:
+            stats['shards'] = self.shards
+        return stats
+
+    def _count_in_parent(self, elapsed):
+        if self._stack:
+            self._stack[-1][0] += elapsed
+
+    def _sample_rss(self):
+        rss = rss_mib()
+        if rss is not None:
+            self.peak_rss_mib = max(self.peak_rss_mib or 0.0, rss)
+
+
+def rss_mib():
+    """Resident memory of this process right now, in MiB (None where unavailable)
+
+    Read from /proc, which costs microseconds; elsewhere (macOS, Windows)
+    there is no cheap way to read it, so exports report no peak there.
+    """
+    if PAGE_SIZE is None:
+        return None
+    try:
+        with open('/proc/self/statm') as f:
+            pages = int(f.read().split()[1])
+    except (OSError, ValueError, IndexError):
+        return None
+    return pages * PAGE_SIZE / (1024 * 1024)
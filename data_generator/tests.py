@@ -1,3 +1,1359 @@
-from django.test import TestCase
+import gzip
+import io
+import json
+import os
+import sqlite3
+import tempfile
+import zipfile
+from datetime import datetime, timedelta
+from decimal import Decimal
+from unittest import mock
 
-# Create your tests here.
+from django.core.cache import cache
+from django.db import IntegrityError, connection
+from django.test import TestCase, TransactionTestCase, override_settings
+from django.utils import timezone
+
+from .admission import check_admission, estimate_cost, estimate_table_change_cost
+from .api_keys import job_api_key, store_api_key
+from .compression import compress_file, iter_compressed, negotiate_encoding, parse_accept_encoding
+from .dynamic_models import DynamicModelGenerator, GenerationInterrupted, dynamic_apps, model_registry
+from .jobs import (JobInterruptCheck, claim_job, create_or_attach_export, enqueue_export, request_cancellation,
+                   request_fingerprint, requeue_stale_jobs, run_job)
+from .models import (DynamicTableChange, DynamicTableDefinition, DynamicTableExport, GenerationJob, GenerationProgress,
+                     GenerationShard)
+from .parts import MANIFEST_NAME, file_sha256, read_manifest, rows_per_part
+from .pipeline import build_table_definition, run_export, run_table_change
+from .preview import preview_rows
+from .progress import ProgressReporter
+from .scheduling import priority_for, schedule
+from .stats import ExportStats
+from .shards import claim_shard, requeue_stale_shards, run_shard, shard_seed, split_job
+
+FIELDS = [
+    {'name': 'name', 'type': 'string', 'options': {}},
+    {'name': 'age', 'type': 'number', 'options': {'min_value': 18, 'max_value': 90}},
+    {'name': 'joined', 'type': 'datetime', 'options': {}},
+    {'name': 'tier', 'type': 'choice', 'options': {'choices': ['bronze', 'silver', 'gold']}},
+]
+
+# Every column type the file writers have to render, with values that need escaping
+WRITER_FIELDS = [
+    {'name': 'name', 'type': 'string', 'options': {}},
+    {'name': 'age', 'type': 'number', 'options': {}},
+    {'name': 'price', 'type': 'decimal', 'options': {}},
+    {'name': 'active', 'type': 'boolean', 'options': {}},
+    {'name': 'joined', 'type': 'datetime', 'options': {}},
+    {'name': 'note', 'type': 'text', 'options': {'nullable': True}},
+]
+WRITER_ROWS = [
+    {'name': "O'Brien", 'age': 41, 'price': Decimal('9.99'), 'active': True,
+     'joined': datetime(2020, 5, 17, 8, 30), 'note': 'tab\there\nnewline'},
+    {'name': 'Ada', 'age': 36, 'price': Decimal('0.50'), 'active': False,
+     'joined': datetime(2021, 1, 2, 3, 4, 5), 'note': None},
+    {'name': 'Back\\slash', 'age': 0, 'price': Decimal('100.00'), 'active': True,
+     'joined': datetime(2019, 12, 31, 23, 59), 'note': ''},
+]
+
+
+def writer_table(table_name='people'):
+    return {'table_name': table_name, 'display_name': 'People', 'fields_definition': WRITER_FIELDS}
+
+
+class TempDirMixin:
+    """Gives each test a scratch directory, removed afterwards"""
+
+    def setUp(self):
+        super().setUp()
+        tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp.cleanup)
+        self.tmp = tmp.name
+
+    def path(self, name):
+        return os.path.join(self.tmp, name)
+
+
+class DynamicTableMixin:
+    """Creates dynamic tables for a test and drops them afterwards
+
+    Table DDL can't run inside TestCase's transaction on SQLite, so tests
+    using this are TransactionTestCases.
+    """
+
+    def create_table(self, definition):
+        DynamicModelGenerator().create_table(definition)
+        self.addCleanup(self.drop_table, definition['table_name'])
+        return definition
+
+    def drop_table(self, table_name):
+        with connection.cursor() as cursor:
+            cursor.execute(f'DROP TABLE IF EXISTS {table_name}')
+
+    def create_table_definition(self, table_name, fields_definition, **fields):
+        """A saved DynamicTableDefinition whose table exists"""
+        table_def = DynamicTableDefinition.objects.create(
+            table_name=table_name, display_name=table_name.title(), fields_definition=fields_definition, **fields,
+        )
+        self.create_table(build_table_definition(table_def))
+        return table_def
+
+    def fetch(self, sql, params=()):
+        with connection.cursor() as cursor:
+            cursor.execute(sql, params)
+            return cursor.fetchall()
+
+
+class QueueTestCase(TestCase):
+    """Creates the table, exports and jobs the queue tests claim"""
+
+    def setUp(self):
+        self.table = DynamicTableDefinition.objects.create(
+            table_name='people', display_name='People', fields_definition=FIELDS,
+        )
+
+    def make_job(self, status='queued', estimated_seconds=1.0, requester='', priority=GenerationJob.PRIORITY_STANDARD,
+                 queued_ago=0):
+        export = DynamicTableExport.objects.create(table_definition=self.table, num_records=100, export_format='csv')
+        return GenerationJob.objects.create(
+            export=export, status=status, estimated_seconds=estimated_seconds, requester=requester,
+            priority=priority, queued_at=timezone.now() - timedelta(seconds=queued_ago),
+        )
+
+
+class NegotiateEncodingTests(TestCase):
+
+    def test_parses_quality_values(self):
+        self.assertEqual(parse_accept_encoding('gzip;q=0.5, br, *;q=0'), {'gzip': 0.5, 'br': 1.0, '*': 0.0})
+
+    def test_picks_the_highest_quality_candidate(self):
+        self.assertEqual(negotiate_encoding('gzip;q=0.5, br', ['gzip', 'br']), 'br')
+        self.assertEqual(negotiate_encoding('gzip, br', ['gzip', 'br']), 'gzip')
+
+    def test_wildcard_and_refusals(self):
+        self.assertEqual(negotiate_encoding('*', ['gzip']), 'gzip')
+        self.assertEqual(negotiate_encoding('gzip;q=0, *;q=0.1', ['gzip', 'br']), 'br')
+        self.assertEqual(negotiate_encoding('identity', ['gzip']), '')
+        self.assertEqual(negotiate_encoding('', ['gzip']), '')
+
+
+class CompressedDownloadTests(TempDirMixin, TestCase):
+
+    def setUp(self):
+        super().setUp()
+        table = DynamicTableDefinition.objects.create(table_name='people', display_name='People',
+                                                      fields_definition=FIELDS)
+        self.body = b'name,age\n' + b'Ada,36\n' * 1000
+        with open(self.path('people.csv'), 'wb') as f:
+            f.write(self.body)
+        self.export = DynamicTableExport.objects.create(
+            table_definition=table, num_records=1000, export_format='csv', status='completed',
+            compression='gzip', file_path=compress_file(self.path('people.csv'), 'gzip'),
+        )
+        self.url = f'/excel-export/{self.export.pk}/download/'
+
+    def test_compressed_file_round_trips(self):
+        self.assertTrue(self.export.file_path.endswith('people.csv.gz'))
+        self.assertFalse(os.path.exists(self.path('people.csv')))
+        with gzip.open(self.export.file_path) as f:
+            self.assertEqual(f.read(), self.body)
+
+    def test_streamed_compression_is_valid_gzip(self):
+        chunks = [self.body[i:i + 100] for i in range(0, len(self.body), 100)]
+        self.assertEqual(gzip.decompress(b''.join(iter_compressed(chunks, 'gzip'))), self.body)
+
+    def test_stored_encoding_is_sent_as_is_when_accepted(self):
+        response = self.client.get(self.url, HTTP_ACCEPT_ENCODING='gzip, br')
+        self.assertEqual(response['Content-Encoding'], 'gzip')
+        self.assertIn('Accept-Encoding', response['Vary'])
+        self.assertEqual(gzip.decompress(b''.join(response.streaming_content)), self.body)
+        self.assertIn('filename="people.csv"', response['Content-Disposition'])
+
+    def test_decompressed_for_clients_without_the_encoding(self):
+        response = self.client.get(self.url, HTTP_ACCEPT_ENCODING='identity')
+        self.assertFalse(response.has_header('Content-Encoding'))
+        self.assertEqual(b''.join(response.streaming_content), self.body)
+
+
+@override_settings(GENERATION_INLINE_JOBS=False)
+class SplitExportTests(TempDirMixin, TestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.table = DynamicTableDefinition.objects.create(table_name='people', display_name='People',
+                                                           fields_definition=FIELDS)
+
+    def run_split(self, num_records=100, split=None):
+        export = DynamicTableExport.objects.create(table_definition=self.table, num_records=num_records,
+                                                   export_format='csv', seed=11)
+        with override_settings(BASE_DIR=self.tmp):
+            run_export(export, options={'split': split or {'rows': 40}})
+        export.refresh_from_db()
+        return export
+
+    def read_rows(self, path):
+        with open(path, encoding='utf-8') as f:
+            return f.read().splitlines()[1:]
+
+    def test_manifest_lists_each_part_with_its_row_range(self):
+        export = self.run_split()
+        self.assertEqual(os.path.basename(export.file_path), MANIFEST_NAME)
+        manifest = read_manifest(export.file_path)
+        self.assertEqual((manifest['rows'], manifest['seed']), (100, 11))
+        self.assertEqual([(p['path'], p['start_row'], p['end_row']) for p in manifest['parts']], [
+            ('part-00000.csv', 0, 40), ('part-00001.csv', 40, 80), ('part-00002.csv', 80, 100),
+        ])
+        directory = os.path.dirname(export.file_path)
+        for part in manifest['parts']:
+            path = os.path.join(directory, part['path'])
+            self.assertEqual((part['bytes'], part['sha256']), (os.path.getsize(path), file_sha256(path)))
+            self.assertEqual(len(self.read_rows(path)), part['rows'])
+
+    def test_parts_hold_the_rows_of_a_single_file_export(self):
+        directory = os.path.dirname(self.run_split().file_path)
+        split_rows = [row for index in range(3)
+                      for row in self.read_rows(os.path.join(directory, f'part-{index:05d}.csv'))]
+        single = DynamicTableExport.objects.create(table_definition=self.table, num_records=100,
+                                                   export_format='csv', seed=11)
+        with override_settings(BASE_DIR=self.tmp):
+            run_export(single)
+        single.refresh_from_db()
+        self.assertEqual(split_rows, self.read_rows(single.file_path))
+
+    def test_byte_target_is_converted_to_rows(self):
+        export = DynamicTableExport(table_definition=self.table, num_records=1000, export_format='csv', seed=11)
+        definition = build_table_definition(self.table)
+        small = rows_per_part(export, definition, {'split': {'bytes': 2000}})
+        large = rows_per_part(export, definition, {'split': {'bytes': 20000}})
+        self.assertGreater(small, 1)
+        self.assertAlmostEqual(large / small, 10, delta=1)
+        self.assertIsNone(rows_per_part(export, definition, {}))
+
+    def test_split_export_downloads_as_parts_or_one_zip(self):
+        export = self.run_split()
+        url = f'/excel-export/{export.pk}/download/'
+        part = b''.join(self.client.get(url, {'part': 1}).streaming_content)
+        self.assertEqual(len(part.decode('utf-8').splitlines()), 41)
+        self.assertEqual(self.client.get(url, {'part': 3}).status_code, 404)
+        manifest = b''.join(self.client.get(url, {'manifest': 1}).streaming_content)
+        self.assertEqual(json.loads(manifest)['rows'], 100)
+
+        response = self.client.get(url)
+        self.assertEqual(response['Content-Type'], 'application/zip')
+        with zipfile.ZipFile(io.BytesIO(b''.join(response.streaming_content))) as archive:
+            self.assertEqual(sorted(archive.namelist()),
+                             [MANIFEST_NAME, 'part-00000.csv', 'part-00001.csv', 'part-00002.csv'])
+
+
+class SqlDumpTests(TempDirMixin, TestCase):
+
+    def dump(self, **options):
+        path = self.path('people.sql')
+        DynamicModelGenerator().create_sql_file(writer_table(), WRITER_ROWS, path, **options)
+        with open(path, encoding='utf-8') as f:
+            return f.read()
+
+    def test_insert_dump_loads_into_sqlite(self):
+        conn = sqlite3.connect(':memory:')
+        conn.executescript(self.dump())
+        rows = conn.execute('SELECT name, age, price, active, joined, note FROM people ORDER BY id').fetchall()
+        self.assertEqual(rows, [
+            ("O'Brien", 41, 9.99, 1, '2020-05-17 08:30:00', 'tab\there\nnewline'),
+            ('Ada', 36, 0.5, 0, '2021-01-02 03:04:05', None),
+            ('Back\\slash', 0, 100, 1, '2019-12-31 23:59:00', ''),
+        ])
+
+    def test_inserts_are_batched(self):
+        sql = self.dump(batch_size=2)
+        self.assertEqual(sql.count('INSERT INTO people'), 2)
+        self.assertTrue(sql.rstrip().endswith('COMMIT;'))
+
+    def test_copy_blocks_escape_values(self):
+        sql = self.dump(style='copy', batch_size=2)
+        self.assertEqual(sql.count('COPY people (name, age, price, active, joined, note) FROM stdin;'), 2)
+        self.assertEqual(sql.count('\\.\n'), 2)
+        self.assertIn("O'Brien\t41\t9.99\tt\t2020-05-17 08:30:00\ttab\\there\\nnewline\n", sql)
+        self.assertIn('Ada\t36\t0.50\tf\t2021-01-02 03:04:05\t\\N\n', sql)
+        self.assertIn('Back\\\\slash\t', sql)
+        # COPY is PostgreSQL-only
+        self.assertIn('id BIGSERIAL PRIMARY KEY', sql)
+
+    def test_declared_indexes_are_built_after_the_data(self):
+        definition = dict(writer_table(), indexes=[{'fields': ['name', 'age'], 'unique': True}])
+        definition['fields_definition'] = [
+            dict(field, options={'indexed': True}) if field['name'] == 'joined' else field
+            for field in WRITER_FIELDS
+        ]
+        path = self.path('people.sql')
+        DynamicModelGenerator().create_sql_file(definition, WRITER_ROWS, path)
+        with open(path, encoding='utf-8') as f:
+            sql = f.read()
+        self.assertGreater(sql.index('CREATE INDEX IF NOT EXISTS idx_people_joined'), sql.rindex('INSERT INTO'))
+
+        conn = sqlite3.connect(':memory:')
+        conn.executescript(sql)
+        indexes = {row[1]: row[2] for row in conn.execute("PRAGMA index_list('people')")}
+        self.assertEqual(indexes['idx_people_joined'], 0)
+        self.assertEqual(indexes['uniq_people_name_age'], 1)
+
+    def test_rejects_unknown_style_and_dialect(self):
+        with self.assertRaises(ValueError):
+            self.dump(style='merge')
+        with self.assertRaises(ValueError):
+            self.dump(dialect='oracle')
+
+
+class SqliteExportTests(TempDirMixin, TestCase):
+
+    def test_database_holds_the_rows_and_declared_indexes(self):
+        definition = dict(writer_table(), indexes=[{'fields': ['name', 'age'], 'unique': False}])
+        path = self.path('people.sqlite3')
+        DynamicModelGenerator().create_sqlite_file(definition, WRITER_ROWS, path, batch_size=2)
+
+        conn = sqlite3.connect(path)
+        self.addCleanup(conn.close)
+        rows = conn.execute('SELECT name, age, price, active, joined, note FROM people ORDER BY id').fetchall()
+        self.assertEqual(rows, [
+            ("O'Brien", 41, 9.99, 1, '2020-05-17 08:30:00', 'tab\there\nnewline'),
+            ('Ada', 36, 0.5, 0, '2021-01-02 03:04:05', None),
+            ('Back\\slash', 0, 100, 1, '2019-12-31 23:59:00', ''),
+        ])
+        indexes = [row[0] for row in conn.execute("SELECT name FROM sqlite_master WHERE type = 'index'")]
+        self.assertIn('idx_people_name_age', indexes)
+        self.assertEqual(conn.execute('PRAGMA journal_mode').fetchone()[0], 'delete')
+
+    def test_existing_file_is_replaced(self):
+        path = self.path('people.sqlite3')
+        generator = DynamicModelGenerator()
+        generator.create_sqlite_file(writer_table(), WRITER_ROWS, path)
+        generator.create_sqlite_file(writer_table(), WRITER_ROWS[:1], path)
+        conn = sqlite3.connect(path)
+        self.addCleanup(conn.close)
+        self.assertEqual(conn.execute('SELECT COUNT(*) FROM people').fetchone()[0], 1)
+
+
+class InsertDataTests(DynamicTableMixin, TransactionTestCase):
+
+    def setUp(self):
+        self.definition = self.create_table(writer_table())
+
+    def test_rows_commit_one_chunk_at_a_time(self):
+        committed = []
+        stats = DynamicModelGenerator().insert_data_to_db(self.definition, WRITER_ROWS, chunk_size=2,
+                                                          on_chunk=committed.append)
+        self.assertEqual(committed, [2, 3])
+        self.assertEqual(stats['rows'], 3)
+        self.assertEqual(self.fetch('SELECT name, age, note FROM people ORDER BY id'), [
+            ("O'Brien", 41, 'tab\there\nnewline'), ('Ada', 36, None), ('Back\\slash', 0, ''),
+        ])
+
+    def test_multi_row_statements_insert_the_same_rows(self):
+        generator = DynamicModelGenerator()
+        generator.insert_data_to_db(self.definition, WRITER_ROWS, multi_row=False)
+        generator.insert_data_to_db(self.definition, WRITER_ROWS, multi_row=True)
+        rows = self.fetch('SELECT name, age, price, active, joined, note FROM people ORDER BY id')
+        self.assertEqual(rows[:3], rows[3:])
+
+    def test_failed_chunk_keeps_the_chunks_before_it(self):
+        definition = self.create_table({'table_name': 'emails', 'fields_definition': [
+            {'name': 'email', 'type': 'email', 'options': {'unique': True}},
+        ]})
+        rows = [{'email': 'a@example.com'}, {'email': 'b@example.com'},
+                {'email': 'c@example.com'}, {'email': 'a@example.com'}]
+        with self.assertRaises(IntegrityError):
+            DynamicModelGenerator().insert_data_to_db(definition, rows, chunk_size=2)
+        self.assertEqual(self.fetch('SELECT email FROM emails ORDER BY id'), [('a@example.com',), ('b@example.com',)])
+
+
+def interrupt_after(checks):
+    """An interrupt_check that stops generation on its ``checks``-th call"""
+    calls = []
+
+    def check():
+        calls.append(1)
+        if len(calls) >= checks:
+            raise GenerationInterrupted('cancelled', 'Stopped by the test')
+    return check
+
+
+class RngCheckpointTests(TestCase):
+
+    def test_resuming_from_a_checkpoint_continues_the_same_rows(self):
+        definition = {'table_name': 'people', 'fields_definition': FIELDS}
+        expected = DynamicModelGenerator(seed=7).generate_synthetic_data(definition, 30)
+
+        first = DynamicModelGenerator(seed=7)
+        head = first.generate_synthetic_data(definition, 10)
+        # The checkpoint is stored as JSON
+        state = json.loads(json.dumps(first.get_rng_state()))
+
+        resumed = DynamicModelGenerator(seed=7)
+        resumed.set_rng_state(state)
+        self.assertEqual(head + resumed.generate_synthetic_data(definition, 20), expected)
+
+
+class GeneratedDatesTests(TestCase):
+
+    def test_dates_are_never_in_the_future(self):
+        fields = FIELDS + [{'name': 'born', 'type': 'date', 'options': {}}]
+        definition = {'table_name': 'people', 'fields_definition': fields}
+        rows = DynamicModelGenerator(seed=3).generate_synthetic_data(definition, 500)
+        now = timezone.now().replace(tzinfo=None)
+        self.assertTrue(all(row['joined'] <= now for row in rows))
+        # Dates are generated as ISO strings
+        self.assertTrue(all(row['born'] <= now.date().isoformat() for row in rows))
+
+
+@override_settings(BULK_INSERT_CHUNK_SIZE=10, GENERATION_INLINE_JOBS=False)
+class DatabaseLoadTests(DynamicTableMixin, TransactionTestCase):
+
+    def load(self, table_def, num_records, seed=5, **options):
+        export = DynamicTableExport.objects.create(
+            table_definition=table_def, num_records=num_records, export_format='db', seed=seed,
+        )
+        run_export(export, **options)
+        export.refresh_from_db()
+        return export
+
+    def rows(self, table_name):
+        return self.fetch(f'SELECT name, age, joined, tier FROM {table_name} ORDER BY id')
+
+    def test_resumed_load_matches_an_uninterrupted_one(self):
+        table_def = self.create_table_definition('people', FIELDS)
+        export = DynamicTableExport.objects.create(
+            table_definition=table_def, num_records=35, export_format='db', seed=5,
+        )
+        with self.assertRaises(GenerationInterrupted):
+            run_export(export, interrupt_check=interrupt_after(3))
+        export.refresh_from_db()
+        self.assertEqual((export.status, export.rows_committed), ('cancelled', 20))
+        self.assertEqual(export.checkpoint['row'], 20)
+        self.assertTrue(export.is_resumable)
+
+        run_export(export)
+        export.refresh_from_db()
+        self.assertEqual((export.status, export.rows_committed), ('completed', 35))
+
+        self.load(self.create_table_definition('people_once', FIELDS), 35)
+        self.assertEqual(self.rows('people'), self.rows('people_once'))
+
+    def test_new_load_keeps_unique_columns_unique_against_existing_rows(self):
+        fields = [{'name': 'email', 'type': 'email', 'options': {'unique': True}}]
+        table_def = self.create_table_definition('subscribers', fields)
+        self.load(table_def, 25)
+        # The same seed generates the same emails again unless the stored ones count as used
+        self.assertEqual(self.load(table_def, 25).status, 'completed')
+        emails = self.fetch('SELECT email FROM subscribers')
+        self.assertEqual(len(emails), 50)
+        self.assertEqual(len(set(emails)), 50)
+
+
+@override_settings(GENERATION_INLINE_JOBS=False)
+class SaveToDatabaseTests(TempDirMixin, DynamicTableMixin, TransactionTestCase):
+
+    def test_file_export_saved_to_the_table_avoids_existing_unique_values(self):
+        table_def = self.create_table_definition('members', [
+            {'name': 'email', 'type': 'email', 'options': {'unique': True}},
+        ])
+        with override_settings(BASE_DIR=self.tmp):
+            for _ in range(2):
+                export = DynamicTableExport.objects.create(
+                    table_definition=table_def, num_records=25, export_format='csv', seed=5,
+                )
+                run_export(export, options={'save_to_db': True})
+        emails = self.fetch('SELECT email FROM members')
+        self.assertEqual(len(set(emails)), 50)
+
+
+class DeferredIndexTests(DynamicTableMixin, TransactionTestCase):
+
+    def setUp(self):
+        self.definition = self.create_table({'table_name': 'visits', 'fields_definition': [
+            {'name': 'email', 'type': 'email', 'options': {'unique': True}},
+            {'name': 'city', 'type': 'string', 'options': {'indexed': True}},
+            {'name': 'visits', 'type': 'number', 'options': {}},
+        ], 'indexes': [{'fields': ['city', 'visits'], 'unique': False}]})
+
+    def indexes(self):
+        with connection.cursor() as cursor:
+            return {index for index, info in connection.introspection.get_constraints(cursor, 'visits').items()
+                    if info['index']}
+
+    def test_non_unique_indexes_are_dropped_during_the_load_and_rebuilt(self):
+        all_indexes = {'uniq_visits_email', 'idx_visits_city', 'idx_visits_city_visits'}
+        self.assertTrue(all_indexes <= self.indexes())
+        with DynamicModelGenerator().deferred_indexes(self.definition):
+            self.assertEqual(self.indexes() & all_indexes, {'uniq_visits_email'})
+        self.assertTrue(all_indexes <= self.indexes())
+
+    def test_indexes_are_rebuilt_when_the_load_fails(self):
+        with self.assertRaises(RuntimeError):
+            with DynamicModelGenerator().deferred_indexes(self.definition):
+                raise RuntimeError('load failed')
+        self.assertIn('idx_visits_city', self.indexes())
+
+    @override_settings(BULK_INDEX_REBUILD_THRESHOLD=10)
+    def test_large_loads_defer_their_indexes(self):
+        generator = DynamicModelGenerator(seed=1)
+        rows = generator.generate_synthetic_data(self.definition, 20)
+        with mock.patch.object(generator, 'deferred_indexes', wraps=generator.deferred_indexes) as deferred:
+            generator.insert_data_to_db(self.definition, rows[:5])
+            deferred.assert_not_called()
+            generator.insert_data_to_db(self.definition, rows[5:])
+            deferred.assert_called_once_with(self.definition)
+        self.assertEqual(self.fetch('SELECT COUNT(*) FROM visits'), [(20,)])
+        self.assertIn('idx_visits_city_visits', self.indexes())
+
+
+class CreateTableTests(DynamicTableMixin, TransactionTestCase):
+
+    def columns(self, table_name):
+        with connection.cursor() as cursor:
+            return {column.name: column for column in connection.introspection.get_table_description(cursor, table_name)}
+
+    def test_columns_indexes_and_created_at_default(self):
+        self.create_table({'table_name': 'people', 'fields_definition': FIELDS + [
+            {'name': 'email', 'type': 'email', 'options': {'unique': True}},
+            {'name': 'nickname', 'type': 'string', 'options': {'nullable': True, 'max_length': 30}},
+        ]})
+        columns = self.columns('people')
+        self.assertEqual(list(columns), ['id', 'name', 'age', 'joined', 'tier', 'email', 'nickname', 'created_at'])
+        self.assertFalse(columns['name'].null_ok)
+        self.assertTrue(columns['nickname'].null_ok)
+
+        with connection.cursor() as cursor:
+            cursor.execute("INSERT INTO people (name, age, joined, tier, email) VALUES ('a', 1, '2024-01-01', 'x', 'a@x')")
+            with self.assertRaises(IntegrityError):
+                cursor.execute("INSERT INTO people (name, age, joined, tier, email) VALUES ('b', 2, '2024-01-01', 'x', 'a@x')")
+        [(created_at,)] = self.fetch('SELECT created_at FROM people')
+        self.assertIsNotNone(created_at)
+
+    def post_table(self, table_name):
+        self.addCleanup(self.drop_table, table_name)
+        return self.client.post('/create/', {
+            'table_name': table_name,
+            'field_0_name': 'Email', 'field_0_type': 'email', 'field_0_unique': 'on',
+            'field_1_name': 'city', 'field_1_type': 'string', 'field_1_max_length': '40',
+            'indexes': 'city, email',
+        })
+
+    def test_view_saves_the_definition_and_creates_the_table(self):
+        response = self.post_table('customers')
+        self.assertEqual(response.status_code, 200, response.content)
+        table_def = DynamicTableDefinition.objects.get(table_name='customers')
+        self.assertTrue(table_def.is_migrated)
+        self.assertEqual(table_def.indexes, [{'fields': ['city', 'email'], 'unique': False}])
+        self.assertIn('email', self.columns('customers'))
+        with connection.cursor() as cursor:
+            constraints = connection.introspection.get_constraints(cursor, 'customers')
+        self.assertTrue({'uniq_customers_email', 'idx_customers_city_email'} <= set(constraints))
+
+    def test_failed_ddl_leaves_no_definition_behind(self):
+        with mock.patch.object(DynamicModelGenerator, '_generate_index_sql', return_value=['CREATE INDEX broken']):
+            response = self.post_table('customers')
+        self.assertEqual(response.status_code, 500)
+        self.assertFalse(DynamicTableDefinition.objects.filter(table_name='customers').exists())
+        self.assertNotIn('customers', connection.introspection.table_names())
+
+    def test_taken_name_is_rejected(self):
+        self.assertEqual(self.post_table('customers').status_code, 200)
+        response = self.post_table('customers')
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('already exists', response.json()['error'])
+
+
+class ModelRegistryTests(TestCase):
+
+    def setUp(self):
+        self.addCleanup(model_registry.clear)
+        self.definition = {'table_name': 'people', 'fields_definition': FIELDS}
+
+    def registered(self, model_class):
+        opts = model_class._meta
+        return dynamic_apps.all_models[opts.app_label].get(opts.model_name) is model_class
+
+    def test_same_schema_reuses_the_class(self):
+        model_class = model_registry.get(self.definition)
+        self.assertIs(model_registry.get(dict(self.definition, display_name='Renamed')), model_class)
+        self.assertTrue(self.registered(model_class))
+
+    def test_changed_schema_replaces_and_unregisters_the_class(self):
+        old = model_registry.get(self.definition)
+        new = model_registry.get(dict(self.definition, indexes=[{'fields': ['name', 'age'], 'unique': False}]))
+        self.assertIsNot(new, old)
+        self.assertFalse(self.registered(old))
+        self.assertTrue(self.registered(new))
+
+    def test_saving_or_deleting_a_definition_evicts_its_model(self):
+        table_def = DynamicTableDefinition.objects.create(
+            table_name='people', display_name='People', fields_definition=FIELDS,
+        )
+        model_class = model_registry.get(self.definition)
+        table_def.save()
+        self.assertFalse(self.registered(model_class))
+
+        model_class = model_registry.get(self.definition)
+        table_def.delete()
+        self.assertFalse(self.registered(model_class))
+        self.assertIsNot(model_registry.get(self.definition), model_class)
+
+
+class DiffFieldsTests(TestCase):
+
+    def setUp(self):
+        self.generator = DynamicModelGenerator()
+
+    def test_added_removed_and_renamed_columns(self):
+        new = [
+            {'name': 'full_name', 'type': 'string', 'options': {}},
+            {'name': 'age', 'type': 'number', 'options': {'min_value': 18, 'max_value': 90}},
+            {'name': 'email', 'type': 'email', 'options': {}},
+        ]
+        diff = self.generator.diff_fields(FIELDS, new, renames={'name': 'full_name'})
+        self.assertEqual([field['name'] for field in diff['added']], ['email'])
+        self.assertEqual(diff['removed'], ['joined', 'tier'])
+        self.assertEqual(diff['renamed'], {'name': 'full_name'})
+        self.assertEqual(diff['changed'], [])
+        self.assertFalse(self.generator.needs_rebuild(FIELDS, diff))
+
+    def test_type_change_needs_a_rebuild(self):
+        new = [dict(field, type='text') if field['name'] == 'age' else field for field in FIELDS]
+        diff = self.generator.diff_fields(FIELDS, new)
+        self.assertEqual(diff['changed'], ['age'])
+        self.assertTrue(self.generator.needs_rebuild(FIELDS, diff))
+
+    def test_sqlite_ignores_size_changes(self):
+        new = [dict(field, options={'max_length': 20}) if field['name'] == 'name' else field for field in FIELDS]
+        self.assertEqual(self.generator.diff_fields(FIELDS, new)['changed'], [])
+        self.assertEqual(self.generator.diff_fields(FIELDS, new, dialect='postgresql')['changed'], ['name'])
+
+    def test_swapped_names_need_a_rebuild(self):
+        new = [dict(field, name={'name': 'tier', 'tier': 'name'}.get(field['name'], field['name']))
+               for field in FIELDS]
+        diff = self.generator.diff_fields(FIELDS, new, renames={'name': 'tier', 'tier': 'name'})
+        self.assertEqual(diff['renamed'], {'name': 'tier', 'tier': 'name'})
+        self.assertTrue(self.generator.needs_rebuild(FIELDS, diff))
+
+
+EDITED_FIELDS = [
+    {'name': 'full_name', 'type': 'string', 'options': {}},
+    {'name': 'age', 'type': 'number', 'options': {'min_value': 18, 'max_value': 90}},
+    {'name': 'joined', 'type': 'datetime', 'options': {}},
+    {'name': 'email', 'type': 'email', 'options': {'unique': True}},
+]
+
+
+class AlterTableTests(DynamicTableMixin, TransactionTestCase):
+
+    def setUp(self):
+        self.definition = self.create_table({'table_name': 'people', 'fields_definition': FIELDS})
+        self.generator = DynamicModelGenerator(seed=3)
+        self.generator.insert_data_to_db(self.definition, self.generator.generate_synthetic_data(self.definition, 12))
+        self.before = self.fetch('SELECT id, name, age FROM people ORDER BY id')
+
+    def columns(self):
+        with connection.cursor() as cursor:
+            return [column.name for column in connection.introspection.get_table_description(cursor, 'people')]
+
+    def test_renames_drops_and_adds_columns_in_place(self):
+        new_definition = {'table_name': 'people', 'fields_definition': EDITED_FIELDS}
+        plan = self.generator.alter_table(self.definition, new_definition, renames={'name': 'full_name'})
+        self.assertFalse(plan['rebuilt'])
+        self.assertEqual(self.columns(), ['id', 'full_name', 'age', 'joined', 'created_at', 'email'])
+        self.assertEqual(self.fetch('SELECT id, full_name, age FROM people ORDER BY id'), self.before)
+        # The unique index on the added column waits for its backfill
+        self.assertEqual([index['name'] for index in plan['deferred_indexes']], ['uniq_people_email'])
+        self.assertEqual(self.fetch('SELECT DISTINCT email FROM people'), [('',)])
+
+    def test_type_change_rebuilds_the_table_keeping_its_rows(self):
+        new_fields = [dict(field, type='text') if field['name'] == 'age'
+                      else dict(field, options={'indexed': True}) if field['name'] == 'name' else field
+                      for field in FIELDS]
+        plan = self.generator.alter_table(self.definition, {'table_name': 'people', 'fields_definition': new_fields})
+        self.assertTrue(plan['rebuilt'])
+        self.assertEqual(plan['changed'], ['age'])
+        self.assertEqual(self.fetch('SELECT id, name, CAST(age AS INTEGER) FROM people ORDER BY id'), self.before)
+        self.assertNotIn('people__shadow', connection.introspection.table_names())
+        with connection.cursor() as cursor:
+            self.assertIn('idx_people_name', connection.introspection.get_constraints(cursor, 'people'))
+
+    def test_backfill_fills_the_added_columns_chunk_by_chunk(self):
+        new_definition = {'table_name': 'people', 'fields_definition': EDITED_FIELDS}
+        self.generator.alter_table(self.definition, new_definition, renames={'name': 'full_name'})
+        model_registry.evict('people')
+        chunks = []
+        stats = self.generator.backfill_columns(new_definition, ['email'], chunk_size=5,
+                                                on_chunk=lambda rows, last_id: chunks.append((rows, last_id)))
+        ids = [row[0] for row in self.before]
+        self.assertEqual(stats['rows'], 12)
+        self.assertEqual(chunks, [(5, ids[4]), (10, ids[9]), (12, ids[11])])
+        emails = [email for (email,) in self.fetch('SELECT email FROM people')]
+        self.assertEqual(len(set(emails)), 12)
+        self.assertNotIn('', emails)
+
+    def test_backfill_continues_after_start_id(self):
+        self.generator.alter_table(self.definition, {'table_name': 'people', 'fields_definition': EDITED_FIELDS},
+                                   renames={'name': 'full_name'})
+        model_registry.evict('people')
+        ids = [row[0] for row in self.before]
+        stats = self.generator.backfill_columns({'table_name': 'people', 'fields_definition': EDITED_FIELDS},
+                                                ['email'], start_id=ids[7])
+        self.assertEqual(stats['rows'], 4)
+        self.assertEqual(self.fetch("SELECT COUNT(*) FROM people WHERE email = ''"), [(8,)])
+
+
+@override_settings(GENERATION_INLINE_JOBS=False, BULK_INSERT_CHUNK_SIZE=5)
+class TableChangeTests(DynamicTableMixin, TransactionTestCase):
+
+    def setUp(self):
+        self.table_def = self.create_table_definition('people', FIELDS, is_migrated=True)
+        generator = DynamicModelGenerator(seed=3)
+        definition = build_table_definition(self.table_def)
+        generator.insert_data_to_db(definition, generator.generate_synthetic_data(definition, 12))
+
+    def post_edit(self):
+        form = {'indexes': '', 'description': 'Edited'}
+        for index, field in enumerate(EDITED_FIELDS):
+            form[f'field_{index}_name'] = field['name']
+            form[f'field_{index}_type'] = field['type']
+            if field['options'].get('unique'):
+                form[f'field_{index}_unique'] = 'on'
+        form['field_0_original'] = 'name'
+        form['field_1_original'] = 'age'
+        form['field_2_original'] = 'joined'
+        return self.client.post(f'/table/{self.table_def.pk}/edit/', form)
+
+    def test_edit_queues_a_table_change_not_an_export(self):
+        response = self.post_edit()
+        self.assertEqual(response.status_code, 200, response.content)
+        change = DynamicTableChange.objects.get()
+        self.assertEqual((change.status, change.num_rows, change.renames), ('pending', 12, {'name': 'full_name'}))
+        self.assertEqual(change.jobs.get().status, 'queued')
+        self.assertFalse(DynamicTableExport.objects.exists())
+        self.assertEqual(self.post_edit().status_code, 409)
+
+    def test_worker_applies_the_change_and_backfills(self):
+        self.post_edit()
+        job = claim_job('test')
+        self.assertEqual(job.table_change_id, DynamicTableChange.objects.get().pk)
+        summary = run_job(job)
+        self.assertEqual(summary, {'rows': 12, 'change': '1 added, 1 renamed, 1 removed, 0 changed'})
+
+        change = DynamicTableChange.objects.get()
+        self.assertEqual((change.status, change.rows_backfilled), ('completed', 12))
+        self.assertEqual(change.progress.current_step, 'completed')
+        self.table_def.refresh_from_db()
+        self.assertEqual([field['name'] for field in self.table_def.fields_definition],
+                         [field['name'] for field in EDITED_FIELDS])
+        self.assertEqual(self.table_def.description, 'Edited')
+        self.assertEqual(self.fetch("SELECT COUNT(DISTINCT email) FROM people WHERE email != ''"), [(12,)])
+        with connection.cursor() as cursor:
+            self.assertIn('uniq_people_email', connection.introspection.get_constraints(cursor, 'people'))
+
+    def test_stopped_backfill_resumes_from_its_checkpoint(self):
+        self.post_edit()
+        change = DynamicTableChange.objects.get()
+        with self.assertRaises(GenerationInterrupted):
+            run_table_change(change, interrupt_check=interrupt_after(2))
+        change.refresh_from_db()
+        self.assertEqual((change.status, change.rows_backfilled), ('cancelled', 5))
+        self.assertIn('5 rows backfilled', change.error_message)
+
+        with mock.patch.object(DynamicModelGenerator, 'alter_table') as alter_table:
+            run_table_change(change)
+        alter_table.assert_not_called()
+        change.refresh_from_db()
+        self.assertEqual((change.status, change.rows_backfilled), ('completed', 12))
+        self.assertEqual(self.fetch("SELECT COUNT(DISTINCT email) FROM people WHERE email != ''"), [(12,)])
+
+    def test_cancelling_a_queued_change(self):
+        self.post_edit()
+        change = DynamicTableChange.objects.get()
+        response = self.client.post(f'/table-change/{change.pk}/cancel/', HTTP_HX_REQUEST='true')
+        self.assertEqual(response.content.decode(), f'Change #{change.pk} cancelled')
+        change.refresh_from_db()
+        self.assertEqual(change.status, 'cancelled')
+        self.assertEqual(change.jobs.get().status, 'cancelled')
+        self.assertIsNone(claim_job('test'))
+        self.assertIn('tier', [field['name'] for field in DynamicTableDefinition.objects.get().fields_definition])
+
+
+@override_settings(GENERATION_GLOBAL_BUDGET_SECONDS=100, GENERATION_INLINE_JOBS=False)
+class ClaimJobTests(QueueTestCase):
+
+    def test_claim_is_compare_and_set(self):
+        job = self.make_job()
+        claimed = claim_job('worker-a', job_id=job.pk)
+        self.assertEqual(claimed.pk, job.pk)
+        self.assertEqual(claimed.status, 'running')
+        self.assertEqual(claimed.worker, 'worker-a')
+        self.assertEqual(claimed.attempts, 1)
+        self.assertIsNone(claim_job('worker-b', job_id=job.pk))
+
+    def test_budget_counts_running_and_sharded_jobs(self):
+        self.make_job(status='running', estimated_seconds=40)
+        self.make_job(status='sharded', estimated_seconds=40)
+        too_big = self.make_job(estimated_seconds=30)
+        self.assertIsNone(claim_job('worker', job_id=too_big.pk))
+        fits = self.make_job(estimated_seconds=20)
+        self.assertEqual(claim_job('worker', job_id=fits.pk).pk, fits.pk)
+
+    def test_job_over_budget_runs_once_nothing_else_does(self):
+        big = self.make_job(estimated_seconds=500)
+        running = self.make_job(status='running', estimated_seconds=1)
+        self.assertIsNone(claim_job('worker', job_id=big.pk))
+        GenerationJob.objects.filter(pk=running.pk).update(status='completed')
+        self.assertEqual(claim_job('worker', job_id=big.pk).pk, big.pk)
+
+    @override_settings(GENERATION_GLOBAL_BUDGET_SECONDS=0)
+    def test_zero_budget_disables_the_check(self):
+        self.make_job(status='running', estimated_seconds=1000)
+        job = self.make_job(estimated_seconds=1000)
+        self.assertEqual(claim_job('worker', job_id=job.pk).pk, job.pk)
+
+
+class ScheduleTests(QueueTestCase):
+
+    def queued(self):
+        return schedule(GenerationJob.objects.filter(status='queued'))
+
+    def test_priority_class_goes_first(self):
+        bulk = self.make_job(priority=GenerationJob.PRIORITY_BULK, queued_ago=60)
+        interactive = self.make_job(priority=GenerationJob.PRIORITY_INTERACTIVE)
+        self.assertEqual(self.queued(), [interactive.pk, bulk.pk])
+
+    def test_requester_with_less_running_work_goes_first(self):
+        self.make_job(status='running', estimated_seconds=50, requester='busy')
+        busy = self.make_job(requester='busy', queued_ago=60)
+        idle = self.make_job(requester='idle')
+        self.assertEqual(self.queued(), [idle.pk, busy.pk])
+
+    @override_settings(GENERATION_FAIR_SHARE_WEIGHTS={'heavy': 100})
+    def test_weight_scales_a_requesters_share(self):
+        self.make_job(status='running', estimated_seconds=50, requester='heavy')
+        self.make_job(status='running', estimated_seconds=5, requester='light')
+        light = self.make_job(requester='light', queued_ago=60)
+        heavy = self.make_job(requester='heavy')
+        self.assertEqual(self.queued(), [heavy.pk, light.pk])
+
+    @override_settings(GENERATION_FAIR_SHARE_BY='table')
+    def test_table_changes_share_with_exports_of_their_table(self):
+        self.make_job(status='running', estimated_seconds=50, requester='a')
+        other_table = DynamicTableDefinition.objects.create(
+            table_name='cars', display_name='Cars', fields_definition=FIELDS,
+        )
+        change = DynamicTableChange.objects.create(table_definition=self.table, fields_definition=FIELDS)
+        busy = GenerationJob.objects.create(table_change=change, requester='b',
+                                            queued_at=timezone.now() - timedelta(seconds=60))
+        idle = GenerationJob.objects.create(
+            export=DynamicTableExport.objects.create(table_definition=other_table, num_records=10),
+            requester='a',
+        )
+        self.assertEqual(self.queued(), [idle.pk, busy.pk])
+
+    def test_longest_waiting_goes_first_among_equals(self):
+        newer = self.make_job(queued_ago=10)
+        older = self.make_job(queued_ago=60)
+        self.assertEqual(self.queued(), [older.pk, newer.pk])
+
+    @override_settings(GENERATION_INTERACTIVE_MAX_SECONDS=10, GENERATION_BULK_MIN_SECONDS=300)
+    def test_priority_class_follows_the_estimate(self):
+        self.assertEqual(priority_for({'seconds': 2}), GenerationJob.PRIORITY_INTERACTIVE)
+        self.assertEqual(priority_for({'seconds': 60}), GenerationJob.PRIORITY_STANDARD)
+        self.assertEqual(priority_for({'seconds': 600}), GenerationJob.PRIORITY_BULK)
+        self.assertEqual(priority_for(None), GenerationJob.PRIORITY_INTERACTIVE)
+
+
+class ShardClaimTests(QueueTestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.job = self.make_job(status='sharded')
+        for index in range(2):
+            GenerationShard.objects.create(job=self.job, index=index, start_row=index * 50, num_rows=50)
+
+    def test_shards_are_leased_in_order_to_one_worker_each(self):
+        first = claim_shard('worker-a')
+        second = claim_shard('worker-b')
+        self.assertEqual((first.index, first.worker, first.status), (0, 'worker-a', 'running'))
+        self.assertEqual((second.index, second.worker), (1, 'worker-b'))
+        self.assertGreater(first.lease_expires_at, timezone.now())
+        self.assertIsNone(claim_shard('worker-c'))
+
+    def test_shards_of_a_job_that_is_not_sharded_are_skipped(self):
+        GenerationJob.objects.filter(pk=self.job.pk).update(status='cancelled')
+        self.assertIsNone(claim_shard('worker'))
+
+    @override_settings(GENERATION_JOB_MAX_ATTEMPTS=3)
+    def test_expired_lease_returns_the_shard_to_pending(self):
+        shard = claim_shard('worker-a')
+        GenerationShard.objects.filter(pk=shard.pk).update(lease_expires_at=timezone.now() - timedelta(seconds=1))
+        self.assertEqual(requeue_stale_shards(), (1, 0))
+        retried = claim_shard('worker-b')
+        self.assertEqual((retried.pk, retried.worker, retried.attempts), (shard.pk, 'worker-b', 2))
+
+    @override_settings(GENERATION_JOB_MAX_ATTEMPTS=1)
+    def test_shard_that_keeps_losing_its_worker_fails_the_job(self):
+        shard = claim_shard('worker-a')
+        GenerationShard.objects.filter(pk=shard.pk).update(lease_expires_at=timezone.now() - timedelta(seconds=1))
+        self.assertEqual(requeue_stale_shards(), (0, 1))
+        self.job.refresh_from_db()
+        self.assertEqual(self.job.status, 'failed')
+        self.assertIn('Shard 0 lost its worker', self.job.export.error_message)
+
+
+class SplitJobTests(QueueTestCase):
+
+    def test_shards_cover_the_export_with_seeds_of_their_own(self):
+        job = self.make_job(status='running')
+        self.assertEqual(split_job(job, 40), 3)
+        shards = list(job.shards.order_by('index').values_list('start_row', 'num_rows', 'seed'))
+        self.assertEqual([(start, rows) for start, rows, _ in shards], [(0, 40), (40, 40), (80, 20)])
+        self.assertEqual([seed for *_, seed in shards], [shard_seed(job.export.seed, index) for index in range(3)])
+        job.refresh_from_db()
+        self.assertEqual((job.status, job.worker), ('sharded', ''))
+
+
+@override_settings(PREVIEW_MAX_ROWS=5)
+class PreviewTests(TestCase):
+
+    def setUp(self):
+        self.addCleanup(cache.clear)
+        fields = FIELDS + [{'name': 'bio', 'type': 'string', 'options': {'ai_description': 'A short bio'}}]
+        self.table = DynamicTableDefinition.objects.create(
+            table_name='people', display_name='People', fields_definition=fields,
+        )
+
+    def test_same_seed_gives_the_same_rows(self):
+        definition = build_table_definition(self.table)
+        first = preview_rows(definition, 3, seed=7)
+        self.assertEqual(first['rows'], preview_rows(definition, 3, seed=7)['rows'])
+        self.assertNotEqual(first['rows'], preview_rows(definition, 3, seed=8)['rows'])
+        self.assertEqual(first['columns'], ['name', 'age', 'joined', 'tier', 'bio'])
+        self.assertEqual(len(first['rows']), 3)
+
+    def test_ai_fields_fall_back_to_placeholders_without_stored_values(self):
+        preview = preview_rows(build_table_definition(self.table), 2)
+        self.assertEqual(preview['ai_fields'], {'bio': 'placeholder'})
+        self.assertTrue(all(row['bio'] for row in preview['rows']))
+
+    def test_json_preview_is_capped_at_the_row_limit(self):
+        response = self.client.get(f'/table/{self.table.pk}/preview/', {'format': 'json', 'rows': 100, 'seed': 3})
+        self.assertEqual(response.status_code, 200)
+        body = response.json()
+        self.assertEqual((len(body['rows']), body['seed']), (5, 3))
+
+    def test_posted_draft_fields_are_previewed_without_being_saved(self):
+        response = self.client.post(f'/table/{self.table.pk}/preview/', {
+            'format': 'json', 'rows': 2,
+            'field_0_name': 'City', 'field_0_type': 'string',
+        })
+        self.assertEqual(response.json()['columns'], ['city'])
+        self.table.refresh_from_db()
+        self.assertEqual(len(self.table.fields_definition), 5)
+
+    def test_invalid_draft_is_reported(self):
+        response = self.client.post(f'/table/{self.table.pk}/preview/', {
+            'format': 'json',
+            'field_0_name': 'city', 'field_0_type': 'string',
+            'field_1_name': 'city', 'field_1_type': 'string',
+        })
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('Duplicate field name', response.json()['error'])
+
+
+@override_settings(GENERATION_INLINE_JOBS=False, GENERATION_GLOBAL_BUDGET_SECONDS=0, GENERATION_SHARD_ROWS=20)
+class ExtendExportTests(TempDirMixin, TestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.table = DynamicTableDefinition.objects.create(table_name='people', display_name='People',
+                                                           fields_definition=FIELDS)
+        settings_override = override_settings(BASE_DIR=self.tmp, GENERATION_SHARD_DIR=self.path('shards'))
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+
+    def export(self, num_records):
+        export = DynamicTableExport.objects.create(table_definition=self.table, num_records=num_records,
+                                                   export_format='csv', seed=5)
+        self.run_queue(export)
+        return export
+
+    def run_queue(self, export):
+        if not export.jobs.exists():
+            enqueue_export(export)
+        while (job := claim_job('worker')) is not None:
+            run_job(job)
+            while (shard := claim_shard('worker')) is not None:
+                run_shard(shard)
+        export.refresh_from_db()
+        self.assertEqual(export.status, 'completed')
+
+    def extend(self, original, num_records):
+        self.client.post(f'/excel-export/{original.pk}/extend/', {'num_records': num_records})
+        extension = original.extensions.get()
+        self.assertEqual(extension.start_row, original.end_row)
+        self.run_queue(extension)
+        return extension
+
+    def rows(self, export):
+        with open(export.file_path, encoding='utf-8') as f:
+            return f.read().splitlines()[1:]
+
+    def test_extension_continues_the_stream_of_one_larger_export(self):
+        original = self.export(15)
+        self.assertIn('rng_state', original.checkpoint)
+        # Too large for one stream, but it continues one so it isn't sharded
+        extension = self.extend(original, 30)
+        self.assertFalse(extension.jobs.get().shards.exists())
+        with override_settings(GENERATION_SHARD_ROWS=0):
+            single = self.export(45)
+        self.assertEqual(self.rows(original) + self.rows(extension), self.rows(single))
+
+    def test_extension_of_a_sharded_export_continues_with_the_next_shard(self):
+        original = self.export(50)
+        self.assertEqual(original.jobs.get().shards.count(), 3)
+        self.assertEqual(original.checkpoint, {'row': 50, 'shard_rows': 20, 'next_shard': 3})
+        self.assertNotIn('rng_state', original.continuation)
+
+        # Small enough for one worker, but still generated as a shard of the same size
+        extension = self.extend(original, 10)
+        shards = list(extension.jobs.get().shards.values_list('index', 'seed'))
+        self.assertEqual(shards, [(0, shard_seed(5, 3))])
+        self.assertEqual(extension.checkpoint['next_shard'], 4)
+        expected = DynamicModelGenerator(seed=shard_seed(5, 3)).generate_synthetic_data(
+            build_table_definition(self.table), 10)
+        self.assertEqual([row.split(',')[0] for row in self.rows(extension)], [row['name'] for row in expected])
+
+    def test_only_completed_exports_can_be_extended(self):
+        export = DynamicTableExport.objects.create(table_definition=self.table, num_records=10, export_format='csv',
+                                                   status='failed', checkpoint={'row': 5, 'rng_state': [1]})
+        self.assertFalse(export.is_extendable)
+        self.client.post(f'/excel-export/{export.pk}/extend/', {'num_records': 10})
+        self.assertFalse(export.extensions.exists())
+
+
+@override_settings(GENERATION_INLINE_JOBS=False, GENERATION_KEY_CACHE='default', OPENAI_API_KEY='env-key',
+                   CACHES={'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}})
+class JobApiKeyTests(QueueTestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.addCleanup(cache.clear)
+
+    def enqueue(self):
+        export = DynamicTableExport.objects.create(table_definition=self.table, num_records=5, export_format='csv')
+        return enqueue_export(export, openai_api_key='sk-form')
+
+    def test_key_travels_through_the_cache_until_the_job_finishes(self):
+        job = self.enqueue()
+        self.assertEqual(job_api_key(job.pk), 'sk-form')
+        self.assertNotIn('sk-form', json.dumps(list(GenerationJob.objects.values()), default=str))
+
+        with mock.patch('data_generator.jobs.run_export', return_value={}) as run:
+            run_job(claim_job('worker', job_id=job.pk))
+        self.assertEqual(run.call_args.args[1], 'sk-form')
+        self.assertEqual(job_api_key(job.pk), '')
+
+    def test_workers_fall_back_to_the_env_key(self):
+        job = self.make_job()
+        with mock.patch('data_generator.jobs.run_export', return_value={}) as run:
+            run_job(claim_job('worker', job_id=job.pk))
+        self.assertEqual(run.call_args.args[1], 'env-key')
+
+    def test_cancelling_a_queued_job_forgets_its_key(self):
+        job = self.enqueue()
+        self.assertEqual(request_cancellation(job.export), 'cancelled')
+        self.assertEqual(job_api_key(job.pk), '')
+
+    @override_settings(GENERATION_JOB_MAX_ATTEMPTS=2)
+    def test_stale_jobs_keep_their_key_only_while_they_can_run_again(self):
+        stale = timezone.now() - timedelta(hours=1)
+        retried, exhausted = self.make_job(status='running'), self.make_job(status='running')
+        GenerationJob.objects.filter(pk=retried.pk).update(attempts=1, heartbeat_at=stale)
+        GenerationJob.objects.filter(pk=exhausted.pk).update(attempts=2, heartbeat_at=stale)
+        store_api_key(retried.pk, 'sk-retried')
+        store_api_key(exhausted.pk, 'sk-exhausted')
+
+        self.assertEqual(requeue_stale_jobs(), (1, 1))
+        self.assertEqual(job_api_key(retried.pk), 'sk-retried')
+        self.assertEqual(job_api_key(exhausted.pk), '')
+
+
+@override_settings(GENERATION_INLINE_JOBS=False)
+class ProgressStartTests(TestCase):
+
+    def test_heading_names_the_requested_format(self):
+        table = DynamicTableDefinition.objects.create(
+            table_name='people', display_name='People', fields_definition=FIELDS, is_migrated=True,
+        )
+        response = self.client.post(f'/table/{table.pk}/generate-excel/', {
+            'export_format': 'csv', 'num_records': '25', 'compression': 'gzip',
+        }, HTTP_HX_REQUEST='true')
+        self.assertContains(response, 'Generating 25 rows')
+        self.assertContains(response, 'CSV (.csv), gzip')
+        self.assertNotContains(response, 'Excel')
+
+
+class ProgressReporterTests(TestCase):
+
+    def setUp(self):
+        table = DynamicTableDefinition.objects.create(table_name='people', display_name='People', fields_definition=FIELDS)
+        export = DynamicTableExport.objects.create(table_definition=table, num_records=100, export_format='csv')
+        self.progress = GenerationProgress.objects.create(export=export)
+        self.now = 1000.0
+        patcher = mock.patch('data_generator.progress.time.monotonic', side_effect=lambda: self.now)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def stored(self):
+        progress = GenerationProgress.objects.get(pk=self.progress.pk)
+        return progress.current_step, progress.rows_done, progress.progress_percentage
+
+    def test_updates_are_written_at_most_once_per_interval(self):
+        reporter = ProgressReporter(self.progress, 100, ['generating_data', 'saving_to_db'], flush_interval_ms=500)
+        reporter.stage('generating_data', 'Generating...')
+        with mock.patch.object(GenerationProgress, 'save', autospec=True,
+                               side_effect=GenerationProgress.save) as save:
+            for rows in range(10, 60, 10):
+                self.now += 0.05
+                reporter.update(rows)
+            self.assertEqual(save.call_count, 0)
+            self.now += 0.5
+            reporter.update(60)
+            self.assertEqual(save.call_count, 1)
+        # Half of the first of two stages
+        self.assertEqual(self.stored(), ('generating_data', 60, 30))
+
+    def test_stages_and_finish_are_always_written(self):
+        reporter = ProgressReporter(self.progress, 100, ['generating_data', 'saving_to_db'], flush_interval_ms=500)
+        reporter.stage('generating_data', 'Generating...')
+        reporter.update(100)
+        reporter.stage('saving_to_db', 'Saving...')
+        self.assertEqual(self.stored(), ('saving_to_db', 0, 50))
+        reporter.update(50)
+        reporter.finish('completed', 100, 'Done')
+        self.assertEqual(self.stored(), ('completed', 50, 100))
+
+    def test_steps_outside_the_stages_keep_the_percentage(self):
+        reporter = ProgressReporter(self.progress, 100, ['generating_data'], flush_interval_ms=0)
+        reporter.stage('generating_data', 'Generating...')
+        reporter.update(100)
+        reporter.stage('compressing', 'Compressing...', rows_done=100)
+        self.assertEqual(self.stored(), ('compressing', 100, 99))
+
+    def test_track_counts_each_chunk_once_consumed(self):
+        reporter = ProgressReporter(self.progress, 100, ['generating_data'], flush_interval_ms=0)
+        reporter.stage('generating_data', 'Generating...')
+        chunks = reporter.track(iter([[1] * 30, [1] * 30]))
+        next(chunks)
+        self.assertEqual(reporter.rows_done, 0)
+        self.now += 2
+        list(chunks)
+        self.assertEqual(reporter.rows_done, 60)
+        self.assertEqual(reporter.rows_per_second, 30.0)
+
+
+class ExportStatsTests(TestCase):
+
+    def test_span_excludes_the_timed_work_nested_in_it(self):
+        clock = iter([0.0, 1.0, 1.5, 2.0, 2.0, 4.0, 10.0])
+        with mock.patch('data_generator.stats.time.perf_counter', lambda: next(clock)):
+            stats = ExportStats()
+            with stats.span('export'):
+                # Generation inside the writer's span takes 0.5s of its 3s
+                self.assertEqual(list(stats.timed([[1, 2]])), [[1, 2]])
+            as_dict = stats.as_dict(rows=2)
+        self.assertEqual(as_dict['stages'], {'generation': 0.5, 'export': 2.5})
+        self.assertEqual((as_dict['total_seconds'], as_dict['other_seconds']), (10.0, 7.0))
+        self.assertEqual(as_dict['chunks']['count'], 1)
+
+    def test_ai_time_is_reported_apart_from_generation(self):
+        stats = ExportStats()
+        stats.seconds['generation'] = 3.0
+        stages = stats.as_dict(rows=10, ai_seconds=2.0, ai_values=10)['stages']
+        self.assertEqual((stages['generation'], stages['ai']), (1.0, 2.0))
+
+    def test_resumed_load_adds_to_the_earlier_runs(self):
+        earlier = ExportStats()
+        earlier.seconds['insert'] = 2.0
+        stats = ExportStats()
+        stats.resume_from(earlier.as_dict(rows=10))
+        stats.seconds['insert'] += 1.0
+        as_dict = stats.as_dict(rows=20)
+        self.assertEqual((as_dict['stages']['insert'], as_dict['runs']), (3.0, 2))
+
+    def test_shard_phase_counts_as_its_wall_clock_time(self):
+        stats = ExportStats()
+        stats.add_shards(4, worker_seconds=40.0, wall_seconds=12.0)
+        as_dict = stats.as_dict(rows=100)
+        self.assertEqual(as_dict['stages']['shards'], 12.0)
+        self.assertGreaterEqual(as_dict['total_seconds'], 12.0)
+        self.assertEqual(as_dict['shards'], {'count': 4, 'worker_seconds': 40.0, 'wall_seconds': 12.0})
+
+    def test_peak_memory_is_sampled_during_this_export_only(self):
+        samples = iter([900.0, 120.0, 150.0, 130.0])
+        with mock.patch('data_generator.stats.rss_mib', lambda: next(samples)):
+            # An earlier, larger export left the worker's lifetime peak at 900 MiB
+            next(samples)
+            stats = ExportStats()
+            with stats.span('export'):
+                list(stats.timed([[1]]))
+        self.assertEqual(stats.as_dict(rows=1)['peak_rss_mib'], 150.0)
+
+    @mock.patch('data_generator.stats.rss_mib', return_value=None)
+    def test_peak_memory_is_left_out_where_it_cannot_be_read(self, _):
+        self.assertIsNone(ExportStats().as_dict(rows=0)['peak_rss_mib'])
+
+
+@override_settings(GENERATION_MAX_REQUEST_SECONDS=100, GENERATION_MAX_REQUEST_AI_VALUES=10,
+                   GENERATION_USER_BUDGET_SECONDS=150, GENERATION_USER_AI_BUDGET=20,
+                   GENERATION_GLOBAL_BUDGET_SECONDS=200)
+class AdmissionTests(QueueTestCase):
+
+    def estimate(self, seconds, ai_values=0):
+        return {'seconds': seconds, 'ai_values': ai_values}
+
+    def test_accepts_a_request_within_every_budget(self):
+        self.assertEqual(check_admission(self.estimate(10), 100, 'csv', 'me')[0], 'accept')
+
+    def test_rejects_a_request_over_the_per_request_limits(self):
+        self.assertEqual(check_admission(self.estimate(101), 100, 'csv', 'me')[0], 'reject')
+        self.assertEqual(check_admission(self.estimate(1, ai_values=11), 100, 'csv', 'me')[0], 'reject')
+
+    def test_rejects_a_requester_over_their_budget(self):
+        self.make_job(estimated_seconds=90, requester='me')
+        self.assertEqual(check_admission(self.estimate(90), 100, 'csv', 'me')[0], 'reject')
+        self.assertEqual(check_admission(self.estimate(90), 100, 'csv', 'someone-else')[0], 'accept')
+
+    def test_queues_behind_running_work_over_the_global_budget(self):
+        self.make_job(status='sharded', estimated_seconds=150, requester='other')
+        self.assertEqual(check_admission(self.estimate(60), 100, 'csv', 'me')[0], 'queue')
+
+    def test_excel_row_limit_applies_to_single_files_only(self):
+        rows = 2_000_000
+        self.assertEqual(check_admission(self.estimate(1), rows, 'xlsx', 'me')[0], 'reject')
+        self.assertEqual(check_admission(self.estimate(1), rows, 'xlsx', 'me', split=True)[0], 'accept')
+
+    def test_estimate_grows_with_rows_and_counts_no_ai_values_without_ai(self):
+        small = estimate_cost(FIELDS, 1000, 'csv', use_ai=False)
+        large = estimate_cost(FIELDS, 100000, 'csv', use_ai=False)
+        self.assertGreater(large['seconds'], small['seconds'])
+        self.assertEqual(large['ai_values'], 0)
+
+    def test_table_change_costs_only_its_added_columns_unless_rebuilt(self):
+        added = estimate_table_change_cost(FIELDS, {'tier'}, 100000, use_ai=False)
+        self.assertEqual(added['seconds'], estimate_cost(FIELDS[3:], 100000, 'db', use_ai=False)['seconds'])
+        rebuilt = estimate_table_change_cost(FIELDS, {'tier'}, 100000, rebuild=True, use_ai=False)
+        self.assertGreater(rebuilt['seconds'], added['seconds'])
+
+    @override_settings(GENERATION_INLINE_JOBS=False)
+    def test_rejected_request_creates_no_export(self):
+        DynamicTableDefinition.objects.filter(pk=self.table.pk).update(is_migrated=True)
+        response = self.client.post(f'/table/{self.table.pk}/generate-excel/', {
+            'export_format': 'csv', 'num_records': '2000000',
+        }, HTTP_HX_REQUEST='true')
+        self.assertContains(response, 'of worker time')
+        self.assertFalse(DynamicTableExport.objects.exists())
+
+
+class CreateOrAttachExportTests(QueueTestCase):
+
+    def export_fields(self):
+        return {'table_definition': self.table, 'num_records': 100, 'export_format': 'csv'}
+
+    def test_identical_request_attaches_to_the_inflight_export(self):
+        export, created = create_or_attach_export('fingerprint', **self.export_fields())
+        attached, attached_created = create_or_attach_export('fingerprint', **self.export_fields())
+        self.assertTrue(created)
+        self.assertFalse(attached_created)
+        self.assertEqual(attached.pk, export.pk)
+        export.refresh_from_db()
+        self.assertEqual(export.coalesced_requests, 1)
+
+    def test_create_is_retried_when_the_inflight_export_finishes_first(self):
+        export, _ = create_or_attach_export('fingerprint', **self.export_fields())
+        with mock.patch('data_generator.jobs.attach_to_inflight', side_effect=[None, export]) as attach:
+            attached, created = create_or_attach_export('fingerprint', **self.export_fields())
+        self.assertEqual(attach.call_count, 2)
+        self.assertEqual((attached.pk, created), (export.pk, False))
+
+    def test_fingerprint_follows_the_schema_and_request(self):
+        fingerprint = request_fingerprint(self.table, 100, 'csv', '', '', {}, False)
+        self.assertEqual(fingerprint, request_fingerprint(self.table, 100, 'csv', '', '', {}, False))
+        self.assertNotEqual(fingerprint, request_fingerprint(self.table, 100, 'csv', '', '7', {}, False))
+        self.table.fields_definition = FIELDS[:2]
+        self.assertNotEqual(fingerprint, request_fingerprint(self.table, 100, 'csv', '', '', {}, False))
+
+    @override_settings(GENERATION_INLINE_JOBS=False)
+    def test_identical_submissions_share_one_export_and_job(self):
+        DynamicTableDefinition.objects.filter(pk=self.table.pk).update(is_migrated=True)
+        for _ in range(2):
+            self.client.post(f'/table/{self.table.pk}/generate-excel/',
+                             {'export_format': 'csv', 'num_records': '10'}, HTTP_HX_REQUEST='true')
+        export = DynamicTableExport.objects.get()
+        self.assertEqual(export.coalesced_requests, 1)
+        self.assertEqual(export.jobs.count(), 1)
+
+
+@override_settings(GENERATION_INLINE_JOBS=False, GENERATION_CANCEL_POLL_SECONDS=0)
+class CancellationTests(TempDirMixin, QueueTestCase):
+
+    def test_interrupt_check_stops_on_cancel_and_deadline(self):
+        job = self.make_job(status='running')
+        check = JobInterruptCheck(job)
+        check()
+        GenerationJob.objects.filter(pk=job.pk).update(cancel_requested=True)
+        with self.assertRaisesMessage(GenerationInterrupted, 'Cancelled'):
+            check()
+
+        job.deadline_at = timezone.now() - timedelta(seconds=1)
+        with self.assertRaises(GenerationInterrupted) as stopped:
+            JobInterruptCheck(job)()
+        self.assertEqual((stopped.exception.status, str(stopped.exception)), ('failed', 'Timed out'))
+
+    def test_cancelling_a_queued_export_ends_it_at_once(self):
+        job = self.make_job()
+        response = self.client.post(f'/excel-export/{job.export_id}/cancel/', HTTP_HX_REQUEST='true')
+        self.assertEqual(response.content.decode(), f'Export #{job.export_id} cancelled')
+        job.refresh_from_db()
+        self.assertEqual((job.status, job.export.status), ('cancelled', 'cancelled'))
+        self.assertIsNone(claim_job('worker'))
+
+    def test_cancelling_a_running_export_flags_its_job(self):
+        job = self.make_job(status='running')
+        self.assertEqual(request_cancellation(job.export), 'requested')
+        job.refresh_from_db()
+        self.assertTrue(job.cancel_requested)
+        self.assertEqual(job.status, 'running')
+        self.assertIsNone(request_cancellation(self.make_job(status='completed').export))
+
+    def run_interrupted(self, options):
+        export = DynamicTableExport.objects.create(table_definition=self.table, num_records=3000, export_format='csv')
+        with override_settings(BASE_DIR=self.tmp), self.assertRaises(GenerationInterrupted):
+            run_export(export, options=options, interrupt_check=interrupt_after(2))
+        export.refresh_from_db()
+        return export
+
+    def test_stopped_export_keeps_its_partial_file_when_asked(self):
+        export = self.run_interrupted({'keep_partial': True})
+        self.assertEqual(export.status, 'cancelled')
+        self.assertIn('partial file with 1000 rows kept', export.error_message)
+        with open(export.file_path, encoding='utf-8') as f:
+            self.assertEqual(sum(1 for _ in f), 1001)
+        self.assertTrue(export.is_downloadable)
+
+    def test_stopped_export_removes_its_file_by_default(self):
+        export = self.run_interrupted({})
+        self.assertEqual(export.status, 'cancelled')
+        self.assertEqual(export.file_path, '')
+        self.assertEqual(os.listdir(os.path.join(self.tmp, 'output')), [])
+
+    @override_settings(GENERATION_JOB_LEASE_SECONDS=60)
+    def test_jobs_past_their_deadline_are_failed_by_the_sweep(self):
+        job = self.make_job(status='running')
+        GenerationJob.objects.filter(pk=job.pk).update(
+            heartbeat_at=timezone.now(), deadline_at=timezone.now() - timedelta(minutes=5),
+        )
+        self.assertEqual(requeue_stale_jobs(), (0, 1))
+        job.refresh_from_db()
+        self.assertEqual((job.status, job.export.status, job.export.error_message), ('failed', 'failed', 'Timed out'))
@@ -10,8 +10,16 @@ urlpatterns = [
     path('create/', views.create_dynamic_table, name='create_dynamic_table'),
     path('tables/', views.dynamic_table_list, name='dynamic_table_list'),
     path('table/<int:table_id>/', views.dynamic_table_detail, name='dynamic_table_detail'),
+    path('table/<int:table_id>/edit/', views.edit_dynamic_table, name='edit_dynamic_table'),
     path('table/<int:table_id>/generate-excel/', views.generate_excel_data, name='generate_excel_data'),
+    path('table/<int:table_id>/estimate/', views.estimate_export_cost, name='estimate_export_cost'),
+    path('table/<int:table_id>/preview/', views.preview_table_data, name='preview_table_data'),
     path('progress/<int:export_id>/', views.progress_status, name='progress_status'),
+    path('progress/<int:export_id>/stream/', views.progress_stream, name='progress_stream'),
     path('progress/<int:export_id>/complete/', views.progress_complete, name='progress_complete'),
     path('excel-export/<int:export_id>/download/', views.download_excel, name='download_excel'),
+    path('excel-export/<int:export_id>/resume/', views.resume_export, name='resume_export'),
+    path('excel-export/<int:export_id>/cancel/', views.cancel_export, name='cancel_export'),
+    path('excel-export/<int:export_id>/extend/', views.extend_export, name='extend_export'),
+    path('table-change/<int:change_id>/cancel/', views.cancel_table_change, name='cancel_table_change'),
 ]
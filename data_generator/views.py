@@ -1,19 +1,56 @@
 from django.shortcuts import render, get_object_or_404, redirect
 from django.contrib.auth.decorators import login_required
 from django.contrib import messages
-from django.http import JsonResponse, HttpResponse
+from django.core.handlers.asgi import ASGIRequest
+from django.http import Http404, JsonResponse, HttpResponse, FileResponse, StreamingHttpResponse
+from django.utils.cache import patch_vary_headers
 from django.views.decorators.http import require_POST
 from django.views.decorators.csrf import csrf_exempt
 from django.core.paginator import Paginator
-from .models import DynamicTableDefinition, DynamicTableExport, GenerationProgress
-from .dynamic_models import DynamicModelGenerator
+from django.db import DatabaseError, IntegrityError, connection, transaction
+from .models import DynamicTableChange, DynamicTableDefinition, DynamicTableExport, GenerationJob, GenerationProgress
+from .dynamic_models import PARQUET_AVAILABLE, DynamicModelGenerator, model_registry
+from .compression import (
+    COMPRESSION_CONTENT_TYPES, COMPRESSION_SUFFIXES, available_encodings,
+    iter_compressed, iter_decompressed, iter_file, iter_zip, negotiate_encoding, split_compression_suffix,
+)
+from .admission import check_admission, estimate_cost, estimate_table_change_cost, requester_for
+from .jobs import (
+    attach_to_inflight, create_or_attach_export, enqueue_export, enqueue_table_change, request_cancellation,
+    request_fingerprint,
+)
+from .parts import MANIFEST_NAME, read_manifest
+from .pipeline import build_table_definition, new_seed
+from .preview import preview_rows
+from .progress import iter_progress_events, iter_progress_snapshot
 import json
+import math
 import random
+import re
 from datetime import datetime
 import csv
 import os
 from django.conf import settings
 
+FIELD_NAME_RE = re.compile(r'^field_(\d+)_name$')
+
+# Largest row count an export records (DynamicTableExport.num_records)
+MAX_RECORDS = 2 ** 31 - 1
+
+FIELD_TYPES = [
+    ('string', 'String'),
+    ('text', 'Text (Long)'),
+    ('number', 'Number'),
+    ('decimal', 'Decimal'),
+    ('boolean', 'Boolean'),
+    ('date', 'Date'),
+    ('datetime', 'DateTime'),
+    ('email', 'Email'),
+    ('url', 'URL'),
+    ('choice', 'Choice'),
+    ('list', 'List'),
+]
+
 def home(request):
     """Main page - Model Builder interface"""
     tables = DynamicTableDefinition.objects.all().order_by('-created_at')
@@ -27,7 +64,10 @@ def add_field(request):
     """HTMX endpoint to add a new field to the form"""
     if request.method == 'GET':
         field_index = request.GET.get('index', 0)
-        return render(request, 'data_generator/field_form.html', {'field_index': field_index})
+        return render(request, 'data_generator/field_form.html', {
+            'field_index': field_index,
+            'field_types': FIELD_TYPES,
+        })
     return JsonResponse({'error': 'Method not allowed'}, status=405)
 
 @csrf_exempt 
@@ -43,59 +83,21 @@ def create_dynamic_table(request):
         if not table_name:
             return JsonResponse({'error': 'Table name is required'}, status=400)
         
-        # Collect field definitions
-        fields_definition = []
-        field_index = 0
-        
-        while f'field_{field_index}_name' in request.POST:
-            field_name = request.POST.get(f'field_{field_index}_name')
-            field_type = request.POST.get(f'field_{field_index}_type')
-            
-            if not field_name or not field_type:
-                field_index += 1
-                continue
-                
-            field_def = {
-                'name': field_name.lower().replace(' ', '_'),
-                'type': field_type,
-                'options': {}
-            }
-            
-            # Add type-specific options
-            if field_type == 'string':
-                max_length = request.POST.get(f'field_{field_index}_max_length')
-                if max_length:
-                    field_def['options']['max_length'] = int(max_length)
-                    
-            elif field_type == 'number':
-                min_value = request.POST.get(f'field_{field_index}_min_value')
-                max_value = request.POST.get(f'field_{field_index}_max_value')
-                if min_value:
-                    field_def['options']['min_value'] = int(min_value)
-                if max_value:
-                    field_def['options']['max_value'] = int(max_value)
-                    
-            elif field_type == 'choice':
-                choices_str = request.POST.get(f'field_{field_index}_choices', '')
-                if choices_str:
-                    choices = [choice.strip() for choice in choices_str.split(',') if choice.strip()]
-                    field_def['options']['choices'] = choices
-            
-            # Add AI description if specified
-            ai_description = request.POST.get(f'field_{field_index}_ai_description')
-            if ai_description:
-                field_def['options']['ai_description'] = ai_description
-            
-            # Add nullable option
-            nullable = request.POST.get(f'field_{field_index}_nullable') == 'on'
-            field_def['options']['nullable'] = nullable
-            
-            fields_definition.append(field_def)
-            field_index += 1
+        try:
+            fields_definition, _ = _parse_fields_definition(request.POST)
+        except ValueError as e:
+            return JsonResponse({'error': str(e)}, status=400)
         
         if not fields_definition:
             return JsonResponse({'error': 'At least one field is required'}, status=400)
         
+        try:
+            indexes = _parse_index_declarations(
+                request.POST.get('indexes', ''), [field['name'] for field in fields_definition]
+            )
+        except ValueError as e:
+            return JsonResponse({'error': str(e)}, status=400)
+        
         # Check if table name already exists before creating
         if DynamicTableDefinition.objects.filter(table_name=table_name).exists():
             return JsonResponse({'error': f'Table "{table_name}" already exists. Please choose a different name.'}, status=400)
@@ -105,189 +107,570 @@ def create_dynamic_table(request):
             'table_name': table_name,
             'display_name': display_name,
             'description': description,
-            'fields_definition': fields_definition
+            'fields_definition': fields_definition,
+            'indexes': indexes,
         }
         
-        # Save to database
-        table_def = DynamicTableDefinition.objects.create(
-            table_name=table_name,
-            display_name=display_name,
-            description=description,
-            fields_definition=fields_definition
-        )
-        
-        # Create dynamic model and migration
+        # Save the definition and create the table in one transaction: either both exist or neither
         generator = DynamicModelGenerator()
         try:
-            model_class = generator.create_model_class(table_definition_data)
-            migration_file = generator.create_migration_file(table_definition_data, model_class)
-            
-            # Run migration with better error handling
-            success, error_msg = generator.run_migration_with_feedback(migration_file)
-            if success:
-                table_def.is_migrated = True
-                table_def.migration_file = migration_file
-                table_def.save()
-                
-                messages.success(request, f'Table "{display_name}" created successfully!')
-                return JsonResponse({
-                    'success': True, 
-                    'message': f'Table "{display_name}" created successfully!',
-                    'redirect': f'/table/{table_def.id}/'
-                })
-            else:
-                # Delete the table definition if migration failed
-                table_def.delete()
-                error_detail = error_msg if error_msg else 'Unknown migration error'
-                messages.error(request, f'Failed to create database table: {error_detail}')
-                return JsonResponse({'error': f'Failed to create database table: {error_detail}'}, status=500)
-                
+            with connection.schema_editor() as editor:
+                # Savepoint keeps the editor's transaction usable if the name was just taken
+                with transaction.atomic():
+                    table_def = DynamicTableDefinition.objects.create(
+                        table_name=table_name,
+                        display_name=display_name,
+                        description=description,
+                        fields_definition=fields_definition,
+                        indexes=indexes,
+                        is_migrated=True,
+                    )
+                generator.create_table(table_definition_data, editor)
+        except IntegrityError:
+            # Another request created the same table between the check above and the insert
+            return JsonResponse({'error': f'Table "{table_name}" already exists. Please choose a different name.'}, status=400)
         except Exception as e:
-            # Delete the table definition if there was an error
-            try:
-                table_def.delete()
-            except:
-                pass
             error_msg = str(e)
-            messages.error(request, f'Error creating table: {error_msg}')
-            return JsonResponse({'error': f'Error creating table: {error_msg}'}, status=500)
+            messages.error(request, f'Failed to create database table: {error_msg}')
+            return JsonResponse({'error': f'Failed to create database table: {error_msg}'}, status=500)
+        
+        messages.success(request, f'Table "{display_name}" created successfully!')
+        return JsonResponse({
+            'success': True, 
+            'message': f'Table "{display_name}" created successfully!',
+            'redirect': f'/table/{table_def.id}/'
+        })
             
     except Exception as e:
         return JsonResponse({'error': f'Error processing request: {str(e)}'}, status=500)
 
+def _parse_fields_definition(post):
+    """Collect ``field_<n>_*`` inputs into a fields_definition list
+    
+    Indices may have gaps (fields removed in the form). Returns the fields and,
+    in the same order, each field's original name (edit form) or None.
+    """
+    indices = sorted(
+        int(match.group(1)) for match in (FIELD_NAME_RE.match(key) for key in post) if match
+    )
+    fields_definition, originals = [], []
+    
+    for field_index in indices:
+        field_name = post.get(f'field_{field_index}_name')
+        field_type = post.get(f'field_{field_index}_type')
+        
+        if not field_name or not field_type:
+            continue
+            
+        field_def = {
+            'name': field_name.strip().lower().replace(' ', '_'),
+            'type': field_type,
+            'options': {}
+        }
+        
+        # Add type-specific options
+        if field_type == 'string':
+            max_length = post.get(f'field_{field_index}_max_length')
+            if max_length:
+                field_def['options']['max_length'] = int(max_length)
+                
+        elif field_type == 'number':
+            min_value = post.get(f'field_{field_index}_min_value')
+            max_value = post.get(f'field_{field_index}_max_value')
+            if min_value:
+                field_def['options']['min_value'] = int(min_value)
+            if max_value:
+                field_def['options']['max_value'] = int(max_value)
+                
+        elif field_type == 'choice':
+            choices_str = post.get(f'field_{field_index}_choices', '')
+            if choices_str:
+                choices = [choice.strip() for choice in choices_str.split(',') if choice.strip()]
+                field_def['options']['choices'] = choices
+        
+        # Add AI description if specified
+        ai_description = post.get(f'field_{field_index}_ai_description')
+        if ai_description:
+            field_def['options']['ai_description'] = ai_description
+        
+        # Add nullable option
+        nullable = post.get(f'field_{field_index}_nullable') == 'on'
+        field_def['options']['nullable'] = nullable
+        
+        # Add index options
+        if post.get(f'field_{field_index}_unique') == 'on':
+            field_def['options']['unique'] = True
+        elif post.get(f'field_{field_index}_indexed') == 'on':
+            field_def['options']['indexed'] = True
+        
+        fields_definition.append(field_def)
+        originals.append(post.get(f'field_{field_index}_original') or None)
+    
+    names = [field['name'] for field in fields_definition]
+    duplicates = sorted({name for name in names if names.count(name) > 1})
+    if duplicates:
+        raise ValueError(f'Duplicate field name(s): {", ".join(duplicates)}')
+    reserved = sorted(set(names) & {'id', 'created_at'})
+    if reserved:
+        raise ValueError(f'Reserved field name(s): {", ".join(reserved)}')
+    return fields_definition, originals
+
+def _parse_index_declarations(text, field_names, renames=None):
+    """Parse composite index lines such as ``state, created_on`` or ``unique: email, org``"""
+    renames = renames or {}
+    indexes = []
+    for line in text.splitlines():
+        line = line.strip()
+        if not line:
+            continue
+        unique = False
+        if line.lower().startswith('unique:'):
+            unique = True
+            line = line[len('unique:'):]
+        columns = [column.strip().lower().replace(' ', '_') for column in line.split(',') if column.strip()]
+        columns = [renames.get(column, column) for column in columns]
+        unknown = [column for column in columns if column not in field_names]
+        if unknown:
+            raise ValueError(f'Index refers to unknown field(s): {", ".join(unknown)}')
+        if columns:
+            indexes.append({'fields': columns, 'unique': unique})
+    return indexes
+
+def edit_dynamic_table(request, table_id):
+    """Change an existing dynamic table's fields in place"""
+    table_def = get_object_or_404(DynamicTableDefinition, pk=table_id)
+    
+    if request.method != 'POST':
+        indexes_text = '\n'.join(
+            ('unique: ' if index.get('unique') else '') + ', '.join(index['fields'])
+            for index in table_def.indexes
+        )
+        return render(request, 'data_generator/edit_dynamic_table.html', {
+            'table_def': table_def,
+            'field_types': FIELD_TYPES,
+            'indexes_text': indexes_text,
+        })
+    
+    if not table_def.is_migrated:
+        return JsonResponse({'error': 'Table has not been created in the database yet'}, status=400)
+    
+    try:
+        fields_definition, originals = _parse_fields_definition(request.POST)
+        if not fields_definition:
+            raise ValueError('At least one field is required')
+        old_names = {field['name'] for field in table_def.fields_definition}
+        renames = {
+            original: field['name'] for field, original in zip(fields_definition, originals)
+            if original in old_names and original != field['name']
+        }
+        indexes = _parse_index_declarations(
+            request.POST.get('indexes', ''), [field['name'] for field in fields_definition], renames
+        )
+    except ValueError as e:
+        return JsonResponse({'error': str(e)}, status=400)
+    
+    if table_def.changes.filter(status__in=('pending', 'processing')).exists():
+        return JsonResponse({'error': 'An earlier change to this table is still queued or running'}, status=409)
+    
+    generator = DynamicModelGenerator()
+    dialect = 'postgresql' if connection.vendor == 'postgresql' else 'sqlite'
+    diff = generator.diff_fields(table_def.fields_definition, fields_definition, renames, dialect)
+    try:
+        num_rows = model_registry.get(build_table_definition(table_def)).objects.count()
+    except DatabaseError as e:
+        return JsonResponse({'error': f'Failed to read the table: {e}'}, status=500)
+    
+    # The DDL and the backfill of added columns run as a queued job, admitted like an export
+    requester = requester_for(request)
+    estimate = estimate_table_change_cost(
+        fields_definition, {field['name'] for field in diff['added']}, num_rows,
+        rebuild=generator.needs_rebuild(table_def.fields_definition, diff),
+        use_ai=bool(getattr(settings, 'OPENAI_API_KEY', '')),
+    )
+    decision, reason = check_admission(estimate, num_rows, 'db', requester)
+    if decision == 'reject':
+        return JsonResponse({'error': f'Change rejected: {reason}'}, status=400)
+    
+    change = DynamicTableChange.objects.create(
+        table_definition=table_def,
+        fields_definition=fields_definition,
+        indexes=indexes,
+        description=request.POST.get('description', table_def.description),
+        renames=renames,
+        num_rows=num_rows,
+    )
+    enqueue_table_change(change, requester=requester, estimate=estimate)
+    
+    summary = (f"{len(diff['added'])} added, {len(diff['renamed'])} renamed, "
+               f"{len(diff['removed'])} removed, {len(diff['changed'])} changed")
+    message = f'Change #{change.id} to "{table_def.display_name}" queued ({summary})'
+    if decision == 'queue':
+        message += f': {reason.lower()}'
+    messages.success(request, message)
+    return JsonResponse({
+        'success': True,
+        'message': message,
+        'redirect': f'/table/{table_def.id}/'
+    })
+
 def dynamic_table_detail(request, table_id):
     """View details of a dynamic table"""
     table_def = get_object_or_404(DynamicTableDefinition, pk=table_id)
     exports = table_def.exports.all()[:10]
+    changes = table_def.changes.all()[:5]
     
     # Check if OpenAI API key is set in Django settings (from .env file)
-    from django.conf import settings
     has_env_api_key = bool(getattr(settings, 'OPENAI_API_KEY', ''))
     
     context = {
         'table_def': table_def,
         'recent_exports': exports,
+        'recent_changes': changes,
         'fields_json': json.dumps(table_def.fields_definition, indent=2),
-        'has_env_api_key': has_env_api_key
+        'has_env_api_key': has_env_api_key,
+        'compression_choices': available_encodings(),
+        'default_compression': getattr(settings, 'EXPORT_COMPRESSION', ''),
+        'export_formats': DynamicTableExport.FORMAT_CHOICES,
+        'sql_dialects': DynamicModelGenerator.SQL_DIALECTS,
     }
     return render(request, 'data_generator/dynamic_table_detail.html', context)
 
+def _form_number(post, name, label, cast=int, default=None):
+    """Read an optional numeric form input; ValueError carries a message for the user"""
+    raw = post.get(name, '').strip()
+    if not raw:
+        return default
+    try:
+        value = cast(raw)
+    except ValueError:
+        raise ValueError(f'{label} must be a number') from None
+    if not math.isfinite(value):
+        raise ValueError(f'{label} must be a number')
+    return value
+
+def _generation_error(request, table_id, error):
+    """Show an invalid generation request's error next to the form"""
+    if request.headers.get('HX-Request'):
+        return render(request, 'data_generator/form_error.html', {'error': error})
+    messages.error(request, error)
+    return redirect('dynamic_table_detail', table_id=table_id)
+
 @require_POST
 def generate_excel_data(request, table_id):
-    """Generate synthetic data and export to Excel"""
+    """Generate synthetic data and export it in the selected format"""
     table_def = get_object_or_404(DynamicTableDefinition, pk=table_id)
     
     if not table_def.is_migrated:
         messages.error(request, 'Table has not been migrated yet')
         return redirect('dynamic_table_detail', table_id=table_id)
     
-    num_records = int(request.POST.get('num_records', 5))
-    openai_api_key = request.POST.get('openai_api_key', '').strip()
+    export_format = request.POST.get('export_format', 'xlsx')
+    if export_format not in dict(DynamicTableExport.FORMAT_CHOICES):
+        return _generation_error(request, table_id, f'Unsupported export format: {export_format}')
+    if export_format == 'parquet' and not PARQUET_AVAILABLE:
+        return _generation_error(request, table_id, "Parquet exports require the 'pyarrow' package")
+    compression = request.POST.get('compression', getattr(settings, 'EXPORT_COMPRESSION', ''))
+    if compression not in available_encodings() or export_format == 'db':
+        compression = ''
     
-    # If no API key provided in form, try to get from Django settings (.env file)
-    if not openai_api_key:
-        from django.conf import settings
-        openai_api_key = getattr(settings, 'OPENAI_API_KEY', '')
+    options = {
+        'save_to_db': request.POST.get('save_to_db') == 'on',
+        'keep_partial': request.POST.get('keep_partial') == 'on',
+    }
+    try:
+        num_records = _form_number(request.POST, 'num_records', 'Number of records', default=5)
+        if not 1 <= num_records <= MAX_RECORDS:
+            raise ValueError(f'Number of records must be between 1 and {MAX_RECORDS:,}')
+        # Database-only loads stream in committed chunks and can resume, so they get their own cap
+        max_db_records = getattr(settings, 'DB_EXPORT_MAX_RECORDS', 5000000)
+        if export_format == 'db' and num_records > max_db_records:
+            raise ValueError(f'Maximum {max_db_records} records allowed per database load')
+        submitted_seed = request.POST.get('seed', '').strip()
+        seed = _form_number(request.POST, 'seed', 'Seed')
+        if seed is not None and not -2 ** 63 <= seed < 2 ** 63:
+            raise ValueError('Seed must fit in 64 bits')
+        time_limit = _form_number(request.POST, 'time_limit_minutes', 'Time limit', cast=float)
+        if time_limit is not None:
+            if time_limit <= 0:
+                raise ValueError('Time limit must be greater than zero')
+            options['timeout_seconds'] = max(1, int(time_limit * 60))
+        if export_format == 'sql':
+            batch_size = _form_number(request.POST, 'sql_batch_size', 'Rows per statement', default=500)
+            if batch_size < 1:
+                raise ValueError('Rows per statement must be at least 1')
+            options['format_options'] = {
+                'style': request.POST.get('sql_style', 'insert'),
+                'dialect': request.POST.get('sql_dialect', 'sqlite'),
+                'batch_size': batch_size,
+            }
+        # Split output: part files of N rows or about N MB each, plus a manifest
+        split_by = request.POST.get('split_by', '')
+        if split_by in ('rows', 'mb') and export_format != 'db':
+            split_size = _form_number(request.POST, 'split_size', 'Part size', cast=float, default=0)
+            if split_size <= 0:
+                raise ValueError('Part size must be greater than zero')
+            options['split'] = (
+                {'rows': max(1, int(split_size))} if split_by == 'rows' else {'bytes': int(split_size * 1024 * 1024)}
+            )
+    except ValueError as e:
+        return _generation_error(request, table_id, str(e))
+    if seed is None:
+        seed = new_seed()
     
-    if num_records > 10:
-        messages.error(request, 'Maximum 10 records allowed per export')
-        return redirect('dynamic_table_detail', table_id=table_id)
+    # Only a key typed into the form travels with the job; workers read the .env key themselves
+    form_api_key = request.POST.get('openai_api_key', '').strip()
+    use_ai = bool(form_api_key or getattr(settings, 'OPENAI_API_KEY', ''))
     
-    # Create export record
-    export = DynamicTableExport.objects.create(
-        table_definition=table_def,
-        num_records=num_records,
-        status='processing'
+    # Identical requests already in flight share that export's progress and artifact
+    fingerprint = request_fingerprint(
+        table_def, num_records, export_format, compression, submitted_seed, options, use_ai
+    )
+    export = attach_to_inflight(fingerprint)
+    created = False
+    decision = None
+    if export is None:
+        # Admission control: the request's estimated cost is checked against the budgets
+        requester = requester_for(request)
+        estimate = estimate_cost(
+            table_def.fields_definition, num_records, export_format, options['save_to_db'], use_ai=use_ai
+        )
+        decision, reason = check_admission(estimate, num_records, export_format, requester,
+                                           split=bool(options.get('split')))
+        if decision == 'reject':
+            if request.headers.get('HX-Request'):
+                return render(request, 'data_generator/cost_estimate.html', {
+                    'estimate': estimate, 'decision': decision, 'reason': reason, 'num_records': num_records,
+                })
+            messages.error(request, f'Request rejected: {reason}')
+            return redirect('dynamic_table_detail', table_id=table_id)
+        
+        # Create export record; the work itself happens in a run_generation_worker process
+        export, created = create_or_attach_export(
+            fingerprint,
+            table_definition=table_def,
+            num_records=num_records,
+            export_format=export_format,
+            compression=compression,
+            seed=seed,
+            status='pending'
+        )
+        if created:
+            enqueue_export(export, options, form_api_key, requester=requester, estimate=estimate)
+    
+    label = dict(DynamicTableExport.FORMAT_CHOICES)[export_format]
+    
+    # Check if this is an HTMX request
+    if request.headers.get('HX-Request'):
+        # Return progress bar that will start polling
+        return render(request, 'data_generator/progress_start.html', {
+            'export': export
+        })
+    
+    export.refresh_from_db(fields=['status', 'file_path'])
+    if export.status == 'completed' and export.file_path:
+        # Ran inline (GENERATION_INLINE_JOBS)
+        return redirect('download_excel', export_id=export.id)
+    if not created:
+        messages.info(request, f'An identical export #{export.id} is already in progress; following it')
+    elif decision == 'queue':
+        messages.info(request, f'Export #{export.id} ({num_records} records, {label}) queued: {reason.lower()}')
+    else:
+        messages.success(request, f'Export #{export.id} ({num_records} records, {label}) queued')
+    return redirect('dynamic_table_detail', table_id=table_id)
+
+def estimate_export_cost(request, table_id):
+    """HTMX endpoint: estimated cost and admission decision for the export form's current values"""
+    table_def = get_object_or_404(DynamicTableDefinition, pk=table_id)
+    try:
+        num_records = max(1, int(request.GET.get('num_records') or 1))
+    except ValueError:
+        num_records = 1
+    export_format = request.GET.get('export_format', 'xlsx')
+    if export_format not in dict(DynamicTableExport.FORMAT_CHOICES):
+        export_format = 'xlsx'
+    
+    # The form's API key is never sent here, so assume AI fields will use the LLM
+    estimate = estimate_cost(
+        table_def.fields_definition, num_records, export_format, request.GET.get('save_to_db') == 'on'
     )
+    decision, reason = check_admission(estimate, num_records, export_format, requester_for(request),
+                                       split=request.GET.get('split_by') in ('rows', 'mb'))
+    return render(request, 'data_generator/cost_estimate.html', {
+        'estimate': estimate, 'decision': decision, 'reason': reason, 'num_records': num_records,
+    })
+
+def preview_table_data(request, table_id):
+    """Sample rows for the table's schema, or for the edit form's unsaved fields when POSTed
+
+    Returns an HTML fragment, or JSON with format=json. Nothing is stored.
+    """
+    table_def = get_object_or_404(DynamicTableDefinition, pk=table_id)
+    definition = build_table_definition(table_def)
+    params = request.POST if request.method == 'POST' else request.GET
+    wants_json = params.get('format') == 'json'
+    
+    if request.method == 'POST':
+        try:
+            fields_definition, _ = _parse_fields_definition(request.POST)
+        except ValueError as e:
+            if wants_json:
+                return JsonResponse({'error': str(e)}, status=400)
+            return render(request, 'data_generator/preview_rows.html', {'error': str(e)})
+        if fields_definition:
+            definition['fields_definition'] = fields_definition
+    
+    max_rows = getattr(settings, 'PREVIEW_MAX_ROWS', 50)
+    try:
+        num_rows = min(max_rows, max(1, int(params.get('rows') or 10)))
+    except ValueError:
+        num_rows = 10
+    try:
+        seed = int(params['seed']) if params.get('seed') else None
+    except ValueError:
+        seed = None
     
-    # Create progress tracking
-    progress = GenerationProgress.objects.create(
-        export=export,
-        current_step='initializing',
-        progress_percentage=0,
-        message='Starting data generation...'
+    preview = preview_rows(definition, num_rows, seed)
+    if wants_json:
+        return JsonResponse(preview)
+    return render(request, 'data_generator/preview_rows.html', {
+        'preview': preview,
+        'cells': [[row[column] for column in preview['columns']] for row in preview['rows']],
+        'table_def': table_def,
+        'draft': request.method == 'POST',
+    })
+
+@require_POST
+def resume_export(request, export_id):
+    """Continue a database-only load from its last committed checkpoint"""
+    export = get_object_or_404(DynamicTableExport, pk=export_id)
+    table_id = export.table_definition.id
+    
+    if not export.is_resumable:
+        messages.error(request, f'Export #{export.id} cannot be resumed')
+        return redirect('dynamic_table_detail', table_id=table_id)
+    
+    if export.jobs.filter(status__in=('queued',) + GenerationJob.IN_PROGRESS_STATUSES).exists():
+        messages.error(request, f'Export #{export.id} is already queued or running')
+        return redirect('dynamic_table_detail', table_id=table_id)
+    
+    # The remaining rows were admitted with the original request; charge them again while they run
+    form_api_key = request.POST.get('openai_api_key', '').strip()
+    estimate = estimate_cost(
+        export.table_definition.fields_definition, export.num_records - export.rows_committed, export.export_format,
+        use_ai=bool(form_api_key or getattr(settings, 'OPENAI_API_KEY', '')),
     )
+    enqueue_export(export, openai_api_key=form_api_key, requester=requester_for(request), estimate=estimate)
+    messages.success(request, f'Export #{export.id} queued to resume from row {export.rows_committed}')
+    return redirect('dynamic_table_detail', table_id=table_id)
+
+@require_POST
+def extend_export(request, export_id):
+    """Queue a new export with more rows continuing a completed one (same format, seed and options)
+
+    Only the additional rows are generated: a database load appends them to the
+    table, a file export produces a file (or parts) with just those rows.
+    """
+    original = get_object_or_404(DynamicTableExport, pk=export_id)
+    table_id = original.table_definition.id
     
+    if not original.is_extendable:
+        messages.error(request, f'Export #{original.id} cannot be extended; only completed exports can')
+        return redirect('dynamic_table_detail', table_id=table_id)
     try:
-        # Update progress
-        progress.current_step = 'generating_data'
-        progress.progress_percentage = 20
-        progress.message = 'Generating synthetic data...'
-        progress.save()
-        
-        generator = DynamicModelGenerator()
-        
-        # Generate synthetic data
-        table_definition_data = {
-            'table_name': table_def.table_name,
-            'display_name': table_def.display_name,
-            'fields_definition': table_def.fields_definition
-        }
-        
-        data = generator.generate_synthetic_data(table_definition_data, num_records, openai_api_key)
-        
-        # Update progress
-        progress.current_step = 'creating_excel'
-        progress.progress_percentage = 60
-        progress.message = 'Creating Excel file...'
-        progress.save()
-        
-        # Create Excel file
-        timestamp = datetime.now().strftime('%Y%m%d_%H%M%S')
-        filename = f"{table_def.table_name}_{timestamp}.xlsx"
-        output_dir = os.path.join(settings.BASE_DIR, 'output')
-        output_path = os.path.join(output_dir, filename)
-        
-        # Ensure output directory exists
-        os.makedirs(output_dir, exist_ok=True)
-        
-        generator.create_excel_file(table_definition_data, data, output_path)
-        
-        # Update progress
-        progress.current_step = 'saving_to_db'
-        progress.progress_percentage = 80
-        progress.message = 'Saving to database...'
-        progress.save()
-        
-        # Optionally insert data into database
-        if request.POST.get('save_to_db') == 'on':
-            generator.insert_data_to_db(table_definition_data, data)
-        
-        # Update progress
-        progress.current_step = 'completed'
-        progress.progress_percentage = 100
-        progress.message = 'Generation completed successfully!'
-        progress.save()
-        
-        # Update export record
-        export.status = 'completed'
-        export.file_path = output_path
-        export.completed_at = datetime.now()
-        export.save()
-        
-        messages.success(request, f'Successfully generated {num_records} records and exported to Excel!')
-        
-        # Check if this is an HTMX request
-        if request.headers.get('HX-Request'):
-            # Return progress bar that will start polling
-            return render(request, 'data_generator/progress_start.html', {
-                'export': export
-            })
-        else:
-            # Regular redirect for non-HTMX requests
-            return redirect('download_excel', export_id=export.id)
-        
-    except Exception as e:
-        progress.current_step = 'failed'
-        progress.progress_percentage = 0
-        progress.message = f'Error: {str(e)}'
-        progress.save()
-        
-        export.status = 'failed'
-        export.error_message = str(e)
-        export.save()
-        messages.error(request, f'Error generating data: {str(e)}')
+        num_records = int(request.POST.get('num_records', 0))
+    except ValueError:
+        num_records = 0
+    if num_records < 1:
+        messages.error(request, 'Enter how many rows to add')
+        return redirect('dynamic_table_detail', table_id=table_id)
+    if original.export_format == 'db':
+        max_records = getattr(settings, 'DB_EXPORT_MAX_RECORDS', 5000000)
+        if num_records > max_records:
+            messages.error(request, f'Maximum {max_records} records allowed per database load')
+            return redirect('dynamic_table_detail', table_id=table_id)
+    
+    last_job = original.jobs.order_by('-created_at').first()
+    options = dict(last_job.options) if last_job else {}
+    form_api_key = request.POST.get('openai_api_key', '').strip()
+    use_ai = bool(form_api_key or getattr(settings, 'OPENAI_API_KEY', ''))
+    fingerprint = request_fingerprint(
+        original.table_definition, num_records, original.export_format, original.compression, original.seed,
+        dict(options, extends=original.pk), use_ai,
+    )
+    export = attach_to_inflight(fingerprint)
+    if export is not None:
+        messages.info(request, f'An identical extension #{export.id} is already in progress; following it')
+        return redirect('dynamic_table_detail', table_id=table_id)
+    
+    requester = requester_for(request)
+    estimate = estimate_cost(
+        original.table_definition.fields_definition, num_records, original.export_format,
+        options.get('save_to_db', False), use_ai=use_ai,
+    )
+    decision, reason = check_admission(estimate, num_records, original.export_format, requester,
+                                       split=bool(options.get('split')))
+    if decision == 'reject':
+        messages.error(request, f'Request rejected: {reason}')
         return redirect('dynamic_table_detail', table_id=table_id)
+    
+    # Starting from the original's continuation point continues its random stream
+    export, created = create_or_attach_export(
+        fingerprint,
+        table_definition=original.table_definition,
+        num_records=num_records,
+        export_format=original.export_format,
+        compression=original.compression,
+        seed=original.seed,
+        extends=original,
+        start_row=original.end_row,
+        checkpoint=original.continuation,
+        status='pending',
+    )
+    if created:
+        enqueue_export(export, options, form_api_key, requester=requester, estimate=estimate)
+    messages.success(request, f'Export #{export.id} queued: rows {export.start_row}-{export.end_row} '
+                              f'continuing export #{original.id}')
+    return redirect('dynamic_table_detail', table_id=table_id)
+
+@require_POST
+def cancel_export(request, export_id):
+    """Cancel a queued or running export"""
+    export = get_object_or_404(DynamicTableExport, pk=export_id)
+    outcome = request_cancellation(export)
+    if outcome == 'cancelled':
+        message = f'Export #{export.id} cancelled'
+    elif outcome == 'requested':
+        message = f'Export #{export.id} will stop after its current chunk'
+    else:
+        message = f'Export #{export.id} is not queued or running'
+    
+    if request.headers.get('HX-Request'):
+        return HttpResponse(message)
+    if outcome:
+        messages.success(request, message)
+    else:
+        messages.error(request, message)
+    return redirect('dynamic_table_detail', table_id=export.table_definition.id)
+
+@require_POST
+def cancel_table_change(request, change_id):
+    """Cancel a queued or running table change; a stopped backfill keeps the rows it filled"""
+    change = get_object_or_404(DynamicTableChange, pk=change_id)
+    outcome = request_cancellation(change)
+    if outcome == 'cancelled':
+        message = f'Change #{change.id} cancelled'
+    elif outcome == 'requested':
+        message = f'Change #{change.id} will stop after its current chunk'
+    else:
+        message = f'Change #{change.id} is not queued or running'
+    
+    if request.headers.get('HX-Request'):
+        return HttpResponse(message)
+    if outcome:
+        messages.success(request, message)
+    else:
+        messages.error(request, message)
+    return redirect('dynamic_table_detail', table_id=change.table_definition_id)
 
 def progress_status(request, export_id):
     """HTMX endpoint to get progress status"""
@@ -313,6 +696,22 @@ def progress_status(request, export_id):
             'export': None
         })
 
+async def progress_stream(request, export_id):
+    """Server-Sent Events stream of an export's progress, closed once it completes or fails"""
+    if not await DynamicTableExport.objects.filter(pk=export_id).aexists():
+        raise Http404("Export not found")
+
+    if isinstance(request, ASGIRequest):
+        events = iter_progress_events(export_id)
+    else:
+        # A WSGI worker can't be parked on a stream; send one snapshot and let EventSource reconnect
+        events = iter_progress_snapshot(export_id)
+
+    response = StreamingHttpResponse(events, content_type='text/event-stream')
+    response['Cache-Control'] = 'no-cache'
+    response['X-Accel-Buffering'] = 'no'
+    return response
+
 def progress_complete(request, export_id):
     """HTMX endpoint for when progress is complete"""
     export = get_object_or_404(DynamicTableExport, pk=export_id)
@@ -321,22 +720,77 @@ def progress_complete(request, export_id):
     })
 
 def download_excel(request, export_id):
-    """Download generated Excel file"""
+    """Download a generated export file"""
     export = get_object_or_404(DynamicTableExport, pk=export_id)
     
-    if export.status != 'completed' or not export.file_path:
+    if not export.is_downloadable:
         messages.error(request, 'Export is not ready for download')
         return redirect('dynamic_table_detail', table_id=export.table_definition.id)
     
     if not os.path.exists(export.file_path):
-        messages.error(request, 'Excel file not found')
+        messages.error(request, 'Export file not found')
         return redirect('dynamic_table_detail', table_id=export.table_definition.id)
     
-    # Serve file
-    with open(export.file_path, 'rb') as f:
-        response = HttpResponse(f.read(), content_type='application/vnd.openxmlformats-officedocument.spreadsheetml.sheet')
-        response['Content-Disposition'] = f'attachment; filename="{os.path.basename(export.file_path)}"'
+    if export.part_count:
+        return _download_split_export(request, export)
+    
+    filename = os.path.basename(split_compression_suffix(export.file_path)[0])
+    content_type = DynamicModelGenerator.EXPORT_FORMATS[export.export_format]['content_type']
+    stored = export.compression
+    
+    # Compressed artifact download (e.g. `curl -o data.xlsx.gz ...?compress=gzip`)
+    artifact = request.GET.get('compress', '')
+    if artifact:
+        if artifact not in available_encodings():
+            messages.error(request, f'Unsupported compression: {artifact}')
+            return redirect('dynamic_table_detail', table_id=export.table_definition.id)
+        if artifact == stored:
+            body = iter_file(export.file_path)
+        else:
+            source = iter_decompressed(export.file_path, stored) if stored else iter_file(export.file_path)
+            body = iter_compressed(source, artifact)
+        response = StreamingHttpResponse(body, content_type=COMPRESSION_CONTENT_TYPES[artifact])
+        response['Content-Disposition'] = f'attachment; filename="{filename}{COMPRESSION_SUFFIXES[artifact]}"'
         return response
+    
+    if not stored:
+        return FileResponse(open(export.file_path, 'rb'), as_attachment=True,
+                            filename=filename, content_type=content_type)
+    
+    # Stored pre-compressed: send as-is when the client accepts the encoding
+    if negotiate_encoding(request.headers.get('Accept-Encoding', ''), [stored]):
+        response = FileResponse(open(export.file_path, 'rb'), as_attachment=True,
+                                filename=filename, content_type=content_type)
+        response['Content-Encoding'] = stored
+    else:
+        response = StreamingHttpResponse(iter_decompressed(export.file_path, stored), content_type=content_type)
+        response['Content-Disposition'] = f'attachment; filename="{filename}"'
+    patch_vary_headers(response, ['Accept-Encoding'])
+    return response
+
+def _download_split_export(request, export):
+    """A split export's manifest (?manifest=1), one part (?part=N), or all of it as one zip archive"""
+    directory = os.path.dirname(export.file_path)
+    if request.GET.get('manifest'):
+        return FileResponse(open(export.file_path, 'rb'), filename=MANIFEST_NAME, content_type='application/json')
+    
+    parts = read_manifest(export.file_path)['parts']
+    part = request.GET.get('part')
+    if part is not None:
+        if not part.isdigit() or int(part) >= len(parts):
+            raise Http404('No such part')
+        name = parts[int(part)]['path']
+        if export.compression:
+            content_type = COMPRESSION_CONTENT_TYPES[export.compression]
+        else:
+            content_type = DynamicModelGenerator.EXPORT_FORMATS[export.export_format]['content_type']
+        return FileResponse(open(os.path.join(directory, name), 'rb'), as_attachment=True,
+                            filename=name, content_type=content_type)
+    
+    files = [(MANIFEST_NAME, export.file_path)] + [(p['path'], os.path.join(directory, p['path'])) for p in parts]
+    response = StreamingHttpResponse(iter_zip(files), content_type='application/zip')
+    response['Content-Disposition'] = f'attachment; filename="{os.path.basename(directory)}.zip"'
+    return response
 
 def dynamic_table_list(request):
     """List all dynamic tables"""
@@ -86,10 +86,37 @@ else:
     # Development
     DB_PATH = BASE_DIR / 'db.sqlite3'
 
+# SQLite profile applied to every connection on connect. WAL lets the web
+# workers keep reading while a generation job writes; busy_timeout makes
+# writers wait for the lock instead of failing with "database is locked".
+SQLITE_PRAGMAS = {
+    'journal_mode': config('SQLITE_JOURNAL_MODE', default='WAL'),
+    'busy_timeout': config('SQLITE_BUSY_TIMEOUT_MS', default=5000, cast=int),
+    'synchronous': config('SQLITE_SYNCHRONOUS', default='NORMAL'),
+    'mmap_size': config('SQLITE_MMAP_SIZE', default=268435456, cast=int),
+    'cache_size': config('SQLITE_CACHE_SIZE', default=-64000, cast=int),
+    'temp_store': config('SQLITE_TEMP_STORE', default='MEMORY'),
+}
+
+# Overrides applied only to the connection doing a bulk load into a dynamic
+# table, for the duration of the load (see data_generator.db_tuning)
+SQLITE_BULK_PRAGMAS = {
+    'synchronous': config('SQLITE_BULK_SYNCHRONOUS', default='OFF'),
+    'cache_size': config('SQLITE_BULK_CACHE_SIZE', default=-262144, cast=int),
+    'temp_store': 'MEMORY',
+}
+
 DATABASES = {
     'default': {
         'ENGINE': 'django.db.backends.sqlite3',
         'NAME': DB_PATH,
+        'OPTIONS': {
+            'timeout': SQLITE_PRAGMAS['busy_timeout'] / 1000,
+            # Take the write lock at BEGIN so busy_timeout applies instead of
+            # failing on a read-to-write lock upgrade
+            'transaction_mode': config('SQLITE_TRANSACTION_MODE', default='IMMEDIATE'),
+            'init_command': ';'.join(f'PRAGMA {name}={value}' for name, value in SQLITE_PRAGMAS.items()),
+        },
     }
 }
 
@@ -147,6 +174,93 @@ DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 # OpenAI Configuration
 OPENAI_API_KEY = config('OPENAI_API_KEY', default='')
 
+# Export storage: '' (uncompressed), 'gzip' or 'zstd' (requires zstandard)
+EXPORT_COMPRESSION = config('EXPORT_COMPRESSION', default='')
+
+# Bulk inserts into dynamic tables: rows per transaction, and whether to use
+# multi-row VALUES statements instead of executemany
+BULK_INSERT_CHUNK_SIZE = config('BULK_INSERT_CHUNK_SIZE', default=5000, cast=int)
+BULK_INSERT_MULTI_ROW = config('BULK_INSERT_MULTI_ROW', default=False, cast=bool)
+
+# Loads of at least this many rows drop a table's non-unique indexes and
+# rebuild them once at the end instead of maintaining them per row
+BULK_INDEX_REBUILD_THRESHOLD = config('BULK_INDEX_REBUILD_THRESHOLD', default=50000, cast=int)
+
+# Upper bound for "Database only" loads, which stream straight into the table
+DB_EXPORT_MAX_RECORDS = config('DB_EXPORT_MAX_RECORDS', default=5000000, cast=int)
+
+# Generation queue: exports are run by `manage.py run_generation_worker` processes.
+# GENERATION_INLINE_JOBS runs them inside the request instead (development only).
+GENERATION_INLINE_JOBS = config('GENERATION_INLINE_JOBS', default=False, cast=bool)
+GENERATION_WORKER_POLL_SECONDS = config('GENERATION_WORKER_POLL_SECONDS', default=1.0, cast=float)
+# A running job whose heartbeat is older than this is requeued (or failed after max attempts)
+GENERATION_JOB_LEASE_SECONDS = config('GENERATION_JOB_LEASE_SECONDS', default=120, cast=int)
+GENERATION_JOB_MAX_ATTEMPTS = config('GENERATION_JOB_MAX_ATTEMPTS', default=3, cast=int)
+# Per-job budgets: wall-clock time and values asked of the LLM. Running jobs check these (and
+# cancellation, polled every GENERATION_CANCEL_POLL_SECONDS) between chunks and before each LLM call.
+GENERATION_JOB_TIMEOUT_SECONDS = config('GENERATION_JOB_TIMEOUT_SECONDS', default=3600, cast=int)
+GENERATION_JOB_MAX_AI_VALUES = config('GENERATION_JOB_MAX_AI_VALUES', default=5000, cast=int)
+GENERATION_CANCEL_POLL_SECONDS = config('GENERATION_CANCEL_POLL_SECONDS', default=1.0, cast=float)
+OPENAI_REQUEST_TIMEOUT = config('OPENAI_REQUEST_TIMEOUT', default=30, cast=int)
+# OpenAI keys typed into a request reach the worker through this cache alias, never the database, and
+# expire after GENERATION_API_KEY_TTL_SECONDS. Web and worker processes must share it: the file-based
+# default works on one host; point GENERATION_KEY_CACHE_BACKEND/LOCATION at Redis or Memcached across hosts.
+GENERATION_KEY_CACHE = 'generation_keys'
+GENERATION_API_KEY_TTL_SECONDS = config('GENERATION_API_KEY_TTL_SECONDS', default=86400, cast=int)
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+    },
+    GENERATION_KEY_CACHE: {
+        'BACKEND': config('GENERATION_KEY_CACHE_BACKEND',
+                          default='django.core.cache.backends.filebased.FileBasedCache'),
+        'LOCATION': config('GENERATION_KEY_CACHE_LOCATION',
+                           default=os.path.join(BASE_DIR, 'cache', 'generation_keys')),
+    },
+}
+
+# Admission control: requests are estimated in worker-seconds and AI (LLM) values and checked
+# against these budgets instead of a fixed record cap. 0 disables a check.
+GENERATION_AI_VALUE_SECONDS = config('GENERATION_AI_VALUE_SECONDS', default=1.0, cast=float)
+GENERATION_MAX_REQUEST_SECONDS = config('GENERATION_MAX_REQUEST_SECONDS', default=3600, cast=int)
+GENERATION_MAX_REQUEST_AI_VALUES = config('GENERATION_MAX_REQUEST_AI_VALUES', default=2000, cast=int)
+# Per requester (user, or client IP when anonymous), summed over queued and running jobs
+GENERATION_USER_BUDGET_SECONDS = config('GENERATION_USER_BUDGET_SECONDS', default=7200, cast=int)
+GENERATION_USER_AI_BUDGET = config('GENERATION_USER_AI_BUDGET', default=5000, cast=int)
+# Summed over running jobs; further jobs wait in the queue
+GENERATION_GLOBAL_BUDGET_SECONDS = config('GENERATION_GLOBAL_BUDGET_SECONDS', default=1800, cast=int)
+
+# Scheduling: priority class by estimated seconds (interactive <= INTERACTIVE_MAX < standard < BULK_MIN <= bulk),
+# weighted fair share per requester or per table within a class, and a cap on LLM-calling jobs running at once.
+# Resumable database loads give up their worker every SLICE_SECONDS while other jobs wait.
+GENERATION_INTERACTIVE_MAX_SECONDS = config('GENERATION_INTERACTIVE_MAX_SECONDS', default=10, cast=int)
+GENERATION_BULK_MIN_SECONDS = config('GENERATION_BULK_MIN_SECONDS', default=300, cast=int)
+GENERATION_FAIR_SHARE_BY = config('GENERATION_FAIR_SHARE_BY', default='requester')  # or 'table'
+GENERATION_FAIR_SHARE_WEIGHTS = {}  # e.g. {'user:1': 2.0, 'table:7': 0.5}; default weight 1
+GENERATION_LLM_CONCURRENCY = config('GENERATION_LLM_CONCURRENCY', default=2, cast=int)
+GENERATION_JOB_SLICE_SECONDS = config('GENERATION_JOB_SLICE_SECONDS', default=60, cast=int)
+
+# Multi-host workers: file exports larger than GENERATION_SHARD_ROWS are split into shards of that
+# many rows, leased (for GENERATION_JOB_LEASE_SECONDS, renewed while running) by workers on any host
+# sharing this database. Shard files go to GENERATION_SHARD_DIR, which must be on the shared volume
+# (defaults to output/shards). 0 disables sharding.
+GENERATION_SHARD_ROWS = config('GENERATION_SHARD_ROWS', default=200000, cast=int)
+GENERATION_SHARD_DIR = config('GENERATION_SHARD_DIR', default='') or os.path.join(BASE_DIR, 'output', 'shards')
+
+# Data preview: sample rows generated in the request. AI fields show up to PREVIEW_AI_POOL_SIZE values
+# already in the table, cached for PREVIEW_AI_POOL_SECONDS, instead of calling the LLM.
+PREVIEW_MAX_ROWS = config('PREVIEW_MAX_ROWS', default=50, cast=int)
+PREVIEW_AI_POOL_SIZE = config('PREVIEW_AI_POOL_SIZE', default=200, cast=int)
+PREVIEW_AI_POOL_SECONDS = config('PREVIEW_AI_POOL_SECONDS', default=300, cast=int)
+
+# Generation progress is kept in memory and written to the database at most this often
+PROGRESS_FLUSH_INTERVAL_MS = config('PROGRESS_FLUSH_INTERVAL_MS', default=500, cast=int)
+
+# Server-Sent Events progress stream (held open under ASGI; one snapshot per reconnect under WSGI)
+PROGRESS_STREAM_INTERVAL_SECONDS = config('PROGRESS_STREAM_INTERVAL_SECONDS', default=0.5, cast=float)
+PROGRESS_STREAM_MAX_SECONDS = config('PROGRESS_STREAM_MAX_SECONDS', default=300, cast=int)
+PROGRESS_STREAM_WSGI_RETRY_MS = config('PROGRESS_STREAM_WSGI_RETRY_MS', default=1000, cast=int)
+
 # Security Settings for Production
 SECURE_SSL_REDIRECT = config('DJANGO_SECURE_SSL_REDIRECT', default=False, cast=bool)
 SECURE_HSTS_SECONDS = config('DJANGO_SECURE_HSTS_SECONDS', default=0, cast=int)